@@ -4,38 +4,52 @@ import os
 import uuid
 import logging
 import json
+import time
 from datetime import datetime, date
 from flask_cors import CORS
-from twilio.rest import Client
 from flask_socketio import SocketIO, emit, join_room
 from database import ClientInteraction, Session as DatabaseSession, RAGDocument
 from sqlalchemy.orm import Session
 from app_socketio import get_or_create_conversation
-from otp_manager import send_otp
-from bedrock_client import generate_response, get_chat_summary, get_embedding, get_intent_from_text
-from intent_classifier import classify_intent
+from otp_manager import generate_otp, send_otp
+from bedrock_client import generate_response, generate_response_stream, get_intent_from_text
+from intent_classifier import classify_intent, extract_entities
+from response_templates import render_response
+from embedding_service import embedding_service
+from intent_model import intent_model
 from database import (
     fetch_customer_by_account,
     save_chat_interaction,
-    save_unresolved_chat,
     get_last_three_chats,
-    create_tables
+    create_tables,
+    transition_tasks
 )
 from rag_utils import fetch_data
 from db_migration import run_migration
 from config import (
-    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_CONVERSATIONS_SERVICE_SID, TWILIO_PHONE,
+    TWILIO_CONVERSATIONS_SERVICE_SID, TWILIO_PHONE,
     TWILIO_TASK_ROUTER_WORKSPACE_SID, TWILIO_TASK_ROUTER_WORKFLOW_SID,
-    REDIS_HOST, REDIS_PORT, REDIS_DB
+    REDIS_HOST, REDIS_PORT, REDIS_DB, CHAT_STREAMING_ENABLED,
+    CAMPAIGN_MAX_CONCURRENT_CALLS, CAMPAIGN_CALLS_PER_SECOND, CAMPAIGN_PACING, PACING_AGENTS
 )
-from twilio_chat import create_conversation, send_message_to_conversation, create_task_for_handoff
+from conversation_directory import conversation_directory
+from twilio_chat import make_twilio_client
 from twilio.twiml.messaging_response import MessagingResponse
 from session_manager import session_manager
+from summary_worker import rolling_summary_worker
+from escalation_queue import escalation_queue
+from outbox import outbox
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from functools import wraps
 from sqlalchemy import text
-import boto3
-from botocore.config import Config
+from bedrock_gateway import bedrock_gateway
+from bedrock_async import async_bedrock
+from voice_prompts import voice_prompts, LANG_CONFIG
+from call_flow import call_flow
+from call_task_store import call_task_store
+from campaign_dialer import campaign_dialer, CampaignAlreadyActive
+from predictive_pacer import ANSWERED_NO_OUTCOME
+from model_router import model_router
 
 # --- Outbound Call Configuration ---
 AGENT_PHONE_NUMBER = "+917983394461"
@@ -45,76 +59,127 @@ TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE')  # Get from the TWILIO_PHONE env
 
 # Or directly replace all instances of TWILIO_PHONE_NUMBER with TWILIO_PHONE
 
-# --- In-Memory Call Tasks Storage ---
-call_tasks = {}
+def _emit_escalation_progress(job: dict, event: dict):
+    """
+    Pushes escalation job progress to the customer's room and the agent dashboard.
+    WhatsApp customers have no socket, so they get the outcome as a WhatsApp message.
+    Registered as an escalation_queue listener; runs on the queue's worker.
+    """
+    socketio.emit('escalation_progress', event, room=f"customer_{job['customer_id']}")
+    socketio.emit('escalation_progress', event, room='agent_room')
+    whatsapp = job['channel'] == 'whatsapp' and event['step'] is None
+    if event['status'] == 'completed':
+        socketio.emit('new_escalated_chat', {
+            'customer_id': job['customer_id'],
+            'summary': job['results'].get('summary'),
+            'task_id': job['results'].get('task_sid'),
+            'channel': job['channel']
+        }, room='agent_room')
+        if whatsapp:
+            outbox.enqueue('whatsapp', job['session_identifier'],
+                           "An agent now has your request and will contact you shortly.",
+                           purpose='escalation_connected')
+    elif event['status'] == 'failed' and whatsapp:
+        # Let the customer ask again instead of waiting for a handoff that won't come
+        session_manager.update_session(job['session_identifier'], {'stage': 'feedback'}, 'whatsapp')
+        outbox.enqueue('whatsapp', job['session_identifier'],
+                       "Sorry, we couldn't connect you to an agent right now. "
+                       "Reply 👎 to try again, or call our support at 1800-123-4567.",
+                       purpose='escalation_failed')
+
+def _resolve_unclear_intent(user_message: str) -> str:
+    """
+    Second-stage intent classification for messages the rule-based classifier couldn't place.
+    The local model answers when it is confident; otherwise we still ask Bedrock.
+    """
+    intent = intent_model.confident_intent(user_message)
+    if intent:
+        return intent
+    return get_intent_from_text([{"sender": "user", "content": user_message}])
 
-LANG_CONFIG = {
-    '1': {'code': 'en-IN', 'name': 'English', 'voice': 'Polly.Raveena'},
-    '2': {'code': 'hi-IN', 'name': 'Hindi', 'voice': 'Polly.Raveena'},
-    '3': {'code': 'te-IN', 'name': 'Telugu', 'voice': 'Polly.Raveena'}
-}
+def _request_otp(user_identifier: str, account_id: str, channel: str = 'web'):
+    """
+    Looks up the account, stores the customer and a fresh OTP on the session and queues
+    the OTP SMS. Requests over the per-account or per-phone limit are refused before the
+    account lookup / SMS.
 
-def _handle_escalation(customer_id: str, phone_number: str, chat_history: list, channel: str = 'web'):
+    Returns:
+        tuple: (status, phone_number, retry_after) where status is 'sent', 'not_found',
+        'throttled' or 'send_failed'; retry_after is in seconds for 'throttled'
+    """
+    request_id = uuid.uuid4().hex
+    targets = [('account', account_id)]
+    if channel == 'whatsapp':
+        targets.append(('phone', user_identifier))
+    retry_after = session_manager.throttle_otp_request(request_id, *targets)
+    if retry_after:
+        return 'throttled', None, retry_after
+
+    customer_account = fetch_customer_by_account(account_id)
+    if not customer_account:
+        logging.warning(f"❌ OTP request failed: Account ID {account_id} not found.")
+        return 'not_found', None, 0
+
+    phone_number = customer_account['phone_number']
+    # WhatsApp senders were counted above; this limits SMS to the registered number. A refusal
+    # here also takes the request back out of the account's window.
+    if phone_number != user_identifier:
+        retry_after = session_manager.throttle_otp_request(request_id, *targets, ('phone', phone_number))
+        if retry_after:
+            return 'throttled', None, retry_after
+
+    session_manager.update_session(user_identifier, {
+        'customer_id': customer_account['customer_id'],
+        'account_id': account_id,
+        'phone_number': phone_number,
+        'stage': 'otp_requested'
+    }, channel)
+
+    # The OTP is valid as soon as it is stored; the SMS goes out through the outbox
+    otp = generate_otp()
+    session_manager.set_otp(user_identifier, otp, channel)
+    message_id = send_otp(phone_number, otp)
+    if not message_id:
+        logging.error(f"❌ Failed to queue OTP for {phone_number}")
+        session_manager.update_session(user_identifier, {'otp': None, 'otp_created_at': None}, channel)
+        return 'send_failed', phone_number, 0
+
+    session_manager.update_session(user_identifier, {'otp_message_id': message_id}, channel)
+    logging.info(f"🏆 OTP queued for {phone_number} for account_id={account_id}")
+    return 'sent', phone_number, 0
+
+def _throttled_reply(retry_after: float) -> str:
+    minutes = max(1, int(-(-retry_after // 60)))
+    return f"Too many OTP requests. Please try again in {minutes} minute{'s' if minutes > 1 else ''}."
+
+def _stream_chat_reply(stream_id: str, web_session_id: str, customer_id: str, query_type: str, data: dict, chat_history: list):
     """
-    Handles the full escalation process: summary, Twilio Task creation, and agent notification.
+    Streams the generated answer to the customer's Socket.IO room as text deltas arrive from Bedrock.
+    Runs as a Socket.IO background task so /chat can return immediately with the stream id.
     """
+    room = f'customer_{customer_id}'
+    parts = []
     try:
-        # 1. Generate a summary of the conversation
-        summary_text = get_chat_summary(chat_history)
-        
-        # 2. Create or get the Twilio Conversation
-        conversation_sid = create_conversation(str(customer_id))
-        if not conversation_sid:
-            logging.error(f"Escalation failed for {customer_id}: Could not create Twilio Conversation.")
-            return None, "Failed to create a chat channel for the agent."
-
-        # 3. Send context to the Twilio Conversation
-        send_message_to_conversation(conversation_sid, "System", f"Handoff from {channel} for user {customer_id}.\n\nSummary:\n{summary_text}")
-        send_message_to_conversation(conversation_sid, "System", "--- Recent Chat History ---")
-        for msg in chat_history[-5:]:
-            sender = msg.get('sender', 'Unknown')
-            message_text = msg.get('message', '(empty message)')
-            send_message_to_conversation(conversation_sid, sender.capitalize(), message_text)
-        send_message_to_conversation(conversation_sid, "System", "--- End of History ---")
-
-        # 4. Create a Task in Twilio TaskRouter
-        task_sid = create_task_for_handoff(
-            customer_id=customer_id,
-            phone_number=phone_number,
-            summary=summary_text,
-            recent_messages=chat_history[-5:],
-            conversation_sid=conversation_sid
-        )
-
-        if task_sid:
-            # 5. Save unresolved chat to DB
-            summary_embedding = get_embedding(summary_text)
-            if summary_embedding:
-                # FIX: Call save_unresolved_chat and pass the correct channel source
-                save_unresolved_chat(
-                    customer_id=customer_id,
-                    summary=summary_text,
-                    embedding=summary_embedding,
-                    task_id=task_sid,
-                    source=channel  # Use the channel ('web' or 'whatsapp')
-                )
-
-            # 6. Notify agent dashboard via Socket.IO
-            socketio.emit('new_escalated_chat', {
-                'customer_id': customer_id,
-                'summary': summary_text,
-                'task_id': task_sid,
-                'channel': channel
-            }, room='agent_room')
-            
-            logging.info(f"Successfully escalated chat for {customer_id}. Task SID: {task_sid}")
-            return task_sid, "Escalation successful."
-        else:
-            logging.error(f"Escalation failed for {customer_id}: Could not create Twilio Task.")
-            return None, "Failed to create an agent task."
+        socketio.emit('bot_stream_start', {'stream_id': stream_id}, room=room)
+        for index, delta in enumerate(generate_response_stream(query_type, data, chat_history)):
+            parts.append(delta)
+            socketio.emit('bot_stream_delta', {'stream_id': stream_id, 'index': index, 'delta': delta}, room=room)
+            socketio.sleep(0)  # Let the server flush each delta instead of batching them
+
+        reply = "".join(parts)
+        socketio.emit('bot_stream_end', {'stream_id': stream_id, 'reply': reply}, room=room)
+        session_manager.add_to_conversation_history(web_session_id, {
+            'sender': 'bot',
+            'message': reply,
+            'stage': 'query_resolved'
+        }, 'web')
     except Exception as e:
-        logging.error(f"Exception during escalation for {customer_id}: {e}")
-        return None, "An internal error occurred while connecting to an agent."
+        logging.error(f"Error streaming reply {stream_id} for {customer_id}: {e}")
+        socketio.emit('bot_stream_error', {
+            'stream_id': stream_id,
+            'partial': "".join(parts),
+            'message': "Sorry, I couldn't finish that answer."
+        }, room=room)
 
 load_dotenv()
 
@@ -128,12 +193,20 @@ CORS(app, supports_credentials=True)
 # Initialize Socket.IO with your Flask app
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Agent handoffs run on the escalation queue; its workers are Socket.IO background tasks
+escalation_queue.add_progress_listener(_emit_escalation_progress)
+escalation_queue.start(socketio.start_background_task, socketio.sleep)
+# Outbound SMS/WhatsApp/Conversations messages are sent by the outbox workers
+outbox.start(socketio.start_background_task, socketio.sleep)
+# Translate any voice prompts missing from the translation memory before calls need them
+socketio.start_background_task(voice_prompts.warm)
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+twilio_client = make_twilio_client()
 
 with app.app_context():
     create_tables()
@@ -204,10 +277,23 @@ def otp_request():
             'stage': 'account_id_entry'
         }, 'web')
 
-        # Fetch customer account
-        customer_account = fetch_customer_by_account(account_id_input)
-        if not customer_account:
-            logging.warning(f"❌ OTP request failed: Account ID {account_id_input} not found.")
+        # Accept "my account is CC11261684" as well as the bare ID
+        account_id_input = extract_entities(account_id_input)['account_id'] or account_id_input.strip()
+        status, phone_number, retry_after = _request_otp(web_session_id, account_id_input, 'web')
+        if status == 'throttled':
+            reply = _throttled_reply(retry_after)
+
+            session_manager.add_to_conversation_history(web_session_id, {
+                'sender': 'bot',
+                'message': reply,
+                'stage': 'otp_throttled'
+            }, 'web')
+
+            response = jsonify({"status": "error", "message": reply, "retry_after": int(retry_after)})
+            response.headers['Retry-After'] = str(int(retry_after))
+            return response, 429
+
+        if status == 'not_found':
             reply = "Account ID not found. Please try again or contact support."
             
             session_manager.add_to_conversation_history(web_session_id, {
@@ -218,24 +304,7 @@ def otp_request():
             
             return jsonify({"status": "error", "message": reply}), 404
 
-        customer_id = customer_account['customer_id']
-        phone_number = customer_account['phone_number']
-
-        # Update session with customer info
-        session_manager.update_session(web_session_id, {
-            'customer_id': customer_id,
-            'account_id': account_id_input,
-            'phone_number': phone_number,
-            'stage': 'otp_requested'
-        }, 'web')
-
-        # Send OTP
-        otp = send_otp(phone_number)
-        if otp:
-            # Store OTP in session
-            session_manager.set_otp(web_session_id, otp, 'web')
-            
-            logging.info(f"🏆 OTP sent to {phone_number} for account_id={account_id_input}")
+        if status == 'sent':
             reply = f"OTP sent to number ending with {phone_number[-4:]}"
             
             session_manager.add_to_conversation_history(web_session_id, {
@@ -246,7 +315,6 @@ def otp_request():
             
             return jsonify({"status": "success", "message": reply, "phone_number": phone_number})
         else:
-            logging.error(f"❌ Failed to send OTP to {phone_number}")
             reply = "Failed to send OTP. Please try again."
             
             session_manager.add_to_conversation_history(web_session_id, {
@@ -282,7 +350,8 @@ def otp_verification():
             'stage': 'otp_attempt'
         }, 'web')
 
-        # Validate OTP
+        # Validate OTP ("my otp is 123456" works too)
+        user_otp = extract_entities(user_otp)['otp'] or user_otp.strip()
         is_valid, message, should_regenerate = session_manager.validate_otp(web_session_id, user_otp, 'web')
         
         if is_valid:
@@ -350,20 +419,36 @@ def chat():
 
         # Handle unauthenticated users
         if not authenticated:
-            intent = classify_intent(user_message)
+            # One scan gives the intent and any Account ID, so "what's my EMI for CC11261684"
+            # goes straight to the OTP instead of asking for the Account ID first
+            entities = extract_entities(user_message)
+            intent = entities['intent']
             if intent == "unclear":
                 try:
-                    intent = get_intent_from_text([{"sender": "user", "content": user_message}])
+                    intent = _resolve_unclear_intent(user_message)
                 except Exception as e:
                     logging.error(f"Error with ML intent classification: {e}")
             
+            next_stage = 'initial_greeting'
             if intent in ['emi', 'balance', 'loan']:
                 reply = "Understood. To proceed, please enter your Account ID:"
+                next_stage = 'awaiting_account_id'
                 session_manager.update_session(web_session_id, {
                     'intent': intent,
                     'pending_message': user_message,
                     'stage': 'awaiting_account_id'
                 }, 'web')
+                if entities['account_id']:
+                    status, phone_number, retry_after = _request_otp(web_session_id, entities['account_id'], 'web')
+                    if status == 'sent':
+                        reply = f"OTP sent to number ending with {phone_number[-4:]}"
+                        next_stage = 'otp_sent'
+                    elif status == 'throttled':
+                        reply = _throttled_reply(retry_after)
+                    elif status == 'not_found':
+                        reply = f"Account ID {entities['account_id']} was not found. Please enter your Account ID:"
+                    else:
+                        reply = "We couldn't send the OTP. Please enter your Account ID to try again:"
             else:
                 reply = "Hello! I am your financial assistant. You can ask me about your EMI, account balance, or loan details. You can also select an option below."
                 session_manager.update_session(web_session_id, {
@@ -376,15 +461,17 @@ def chat():
                 'stage': session_data.get('stage', 'initial')
             }, 'web')
             
-            return jsonify({"status": "success", "reply": reply})
+            return jsonify({"status": "success", "reply": reply, "stage": next_stage})
 
         # Handle authenticated users
         pending_intent = session_data.get('intent')
         query_type = pending_intent if pending_intent else classify_intent(user_message)
+        # Questions the rule-based classifier couldn't place are answered by the LLM, not a template
+        free_form = query_type == 'unclear'
         
         if query_type == 'unclear':
             try:
-                query_type = get_intent_from_text([{"sender": "user", "content": user_message}])
+                query_type = _resolve_unclear_intent(user_message)
             except Exception as e:
                 logging.error(f"Error with ML intent classification: {e}")
 
@@ -433,7 +520,19 @@ def chat():
                     "content": msg.get('message')
                 })
 
-        reply = generate_response(query_type, data, formatted_history)
+        reply = None if free_form else render_response(query_type, data, session_data.get('language'))
+
+        # Streaming mode: answer is pushed to the customer's room, /chat only hands back the stream id
+        if reply is None and request.json.get("stream") and CHAT_STREAMING_ENABLED and customer_id:
+            stream_id = str(uuid.uuid4())
+            session_manager.update_session(web_session_id, {'intent': None}, 'web')
+            socketio.start_background_task(
+                _stream_chat_reply, stream_id, web_session_id, customer_id, query_type, data, formatted_history
+            )
+            return jsonify({"status": "success", "streaming": True, "stream_id": stream_id})
+
+        if reply is None:
+            reply = generate_response(query_type, data, formatted_history)
         
         session_manager.add_to_conversation_history(web_session_id, {
             'sender': 'bot',
@@ -459,6 +558,20 @@ def summarize_chat_route():
     logging.warning("Received request on deprecated /summarize_chat endpoint. Forwarding to /connect_agent.")
     return connect_agent()
 
+def _whatsapp_request_otp(whatsapp_phone_number: str, account_id: str) -> str:
+    """Sends the OTP for a WhatsApp session and returns the reply text."""
+    status, _, retry_after = _request_otp(whatsapp_phone_number, account_id, 'whatsapp')
+    if status == 'sent':
+        session_manager.update_session(whatsapp_phone_number, {'stage': 'otp'}, 'whatsapp')
+        return "OTP sent to your registered mobile number! Please enter the 6-digit OTP."
+    if status == 'throttled':
+        session_manager.update_session(whatsapp_phone_number, {'stage': 'account_id'}, 'whatsapp')
+        return _throttled_reply(retry_after)
+    if status == 'send_failed':
+        return "Failed to send OTP. Please try again later."
+    session_manager.update_session(whatsapp_phone_number, {'stage': 'account_id'}, 'whatsapp')
+    return "Invalid Account ID. Please try again."
+
 @app.route('/whatsapp/webhook', methods=['POST'])
 def whatsapp_webhook():
     try:
@@ -484,8 +597,21 @@ def whatsapp_webhook():
         current_stage = session_data.get('stage', 'greeting')
         logging.info(f"Current stage for {whatsapp_phone_number}: {current_stage}")
 
+        # Free text can carry the menu choice and the Account ID ("what's my EMI for CC11261684"),
+        # so those stages are skipped when their input is already present
+        entities = extract_entities(incoming_msg)
+        direct_intent = entities['intent'] if entities['intent'] in ('emi', 'balance', 'loan') else None
+
         # Handle different stages, assigning the reply to `response_text`
-        if current_stage == 'greeting' or incoming_msg.lower() in ['hi', 'hello', 'hey', 'start']:
+        if current_stage in ('greeting', 'menu') and direct_intent:
+            session_manager.update_session(whatsapp_phone_number, {'intent': direct_intent}, 'whatsapp')
+            if entities['account_id']:
+                response_text = _whatsapp_request_otp(whatsapp_phone_number, entities['account_id'])
+            else:
+                response_text = "Please enter your Account ID."
+                session_manager.update_session(whatsapp_phone_number, {'stage': 'account_id'}, 'whatsapp')
+
+        elif current_stage == 'greeting' or incoming_msg.lower() in ['hi', 'hello', 'hey', 'start']:
             response_text = "Welcome! How can I help you today?\n1. Know your EMI\n2. Account Balance\n3. Know your Loan Amount\n(Reply with the number of your choice)"
             session_manager.update_session(whatsapp_phone_number, {'stage': 'menu'}, 'whatsapp')
 
@@ -508,27 +634,10 @@ def whatsapp_webhook():
                 response_text = "Please select a valid option (1, 2, or 3):\n1. Know your EMI\n2. Account Balance\n3. Know your Loan Amount"
 
         elif current_stage == 'account_id':
-            account_info = fetch_customer_by_account(incoming_msg)
-            if account_info:
-                session_manager.update_session(whatsapp_phone_number, {
-                    'account_id': incoming_msg,
-                    'customer_id': account_info['customer_id'],
-                    'phone_number': account_info['phone_number'],
-                    'stage': 'otp_requested'
-                }, 'whatsapp')
-                
-                otp = send_otp(account_info['phone_number'])
-                if otp:
-                    session_manager.set_otp(whatsapp_phone_number, otp, 'whatsapp')
-                    response_text = "OTP sent to your registered mobile number! Please enter the 6-digit OTP."
-                    session_manager.update_session(whatsapp_phone_number, {'stage': 'otp'}, 'whatsapp')
-                else:
-                    response_text = "Failed to send OTP. Please try again later."
-            else:
-                response_text = "Invalid Account ID. Please try again."
+            response_text = _whatsapp_request_otp(whatsapp_phone_number, entities['account_id'] or incoming_msg)
 
         elif current_stage == 'otp':
-            is_valid, otp_message, should_regenerate = session_manager.validate_otp(whatsapp_phone_number, incoming_msg, 'whatsapp')
+            is_valid, otp_message, should_regenerate = session_manager.validate_otp(whatsapp_phone_number, entities['otp'] or incoming_msg, 'whatsapp')
             if is_valid:
                 session_data = session_manager.get_session(whatsapp_phone_number, 'whatsapp')
                 intent = session_data.get('intent')
@@ -536,7 +645,7 @@ def whatsapp_webhook():
                 
                 data = fetch_data(intent, account_id)
                 if data:
-                    answer = generate_response(intent, data, [])
+                    answer = render_response(intent, data, session_data.get('language')) or generate_response(intent, data, [])
                     response_text = f"{answer}\n\nPlease share your feedback: 👍 or 👎"
                     session_manager.update_session(whatsapp_phone_number, {'stage': 'feedback'}, 'whatsapp')
                 else:
@@ -558,18 +667,17 @@ def whatsapp_webhook():
                 chat_history = session_data.get('conversation_history', [])
 
                 if customer_id:
-                    # FIX: Call the escalation handler for WhatsApp
-                    task_sid, message = _handle_escalation(
+                    # The handoff runs in the background; the customer gets an answer right away
+                    escalation_queue.submit(
                         customer_id=customer_id,
                         phone_number=phone_number,
                         chat_history=chat_history,
-                        channel='whatsapp'  # Specify the channel
+                        channel='whatsapp',
+                        session_identifier=whatsapp_phone_number,
+                        reason='feedback'
                     )
-                    if task_sid:
-                        session_manager.escalate_session(whatsapp_phone_number, 'feedback', 'whatsapp')
-                        response_text = "Thank you for your feedback. We will have an agent contact you shortly."
-                    else:
-                        response_text = "Sorry, we are unable to connect you to an agent at this time."
+                    session_manager.update_session(whatsapp_phone_number, {'stage': 'escalated'}, 'whatsapp')
+                    response_text = "Thank you for your feedback. We will have an agent contact you shortly."
                 else:
                     # Handle case where customer_id is missing
                     response_text = "We couldn't identify your account to escalate. Please start over."
@@ -623,23 +731,35 @@ def connect_agent():
         if not customer_id:
             return jsonify({"status": "error", "message": "Cannot escalate without a customer ID. Please verify your account first."}), 400
 
-        task_sid, message = _handle_escalation(
+        job_id, _ = escalation_queue.submit(
             customer_id=customer_id,
             phone_number=customer_phone_number,
             chat_history=chat_history,
-            channel='web'
+            channel='web',
+            session_identifier=web_session_id,
+            reason='manual_request'
         )
 
-        if task_sid:
-            session_manager.escalate_session(web_session_id, 'manual_request', 'web')
-            return jsonify({"status": "success", "message": "You are being connected to an agent. They will have your chat history."})
-        else:
-            return jsonify({"status": "error", "message": message}), 500
+        # Progress arrives as escalation_progress events in the customer's room
+        return jsonify({
+            "status": "accepted",
+            "job_id": job_id,
+            "message": "You are being connected to an agent. They will have your chat history."
+        }), 202
             
     except Exception as e:
         logging.error(f"Error in connect_agent: {e}")
         return jsonify({"status": "error", "message": "An internal error occurred while connecting to an agent."}), 500
 
+@app.route("/escalation_status/<job_id>", methods=["GET"])
+def escalation_status(job_id):
+    web_session_id = session.get('web_session_id')
+    session_data = session_manager.get_session(web_session_id, 'web') if web_session_id else None
+    job = escalation_queue.status(job_id)
+    if not job or not session_data or job['customer_id'] != session_data.get('customer_id'):
+        return jsonify({"status": "error", "message": "Escalation not found."}), 404
+    return jsonify({"status": "success", "job": job})
+
 # Add session cleanup endpoint
 @app.route('/cleanup_sessions', methods=['POST'])
 def cleanup_sessions():
@@ -662,18 +782,90 @@ def session_status():
         if not session_data:
             return jsonify({"status": "error", "message": "Session expired"}), 400
         
+        # Delivery state of the last OTP SMS, as tracked by the outbox
+        otp_delivery = None
+        otp_message = outbox.status(session_data['otp_message_id']) if session_data.get('otp_message_id') else None
+        if otp_message:
+            otp_delivery = {
+                "status": otp_message['status'],
+                "delivery_status": otp_message['delivery_status'],
+                "attempts": otp_message['attempts'],
+                "updated_at": otp_message['updated_at']
+            }
+
         return jsonify({
             "status": "success",
             "session_id": session_data.get('session_id'),
             "authenticated": session_data.get('authenticated', False),
             "customer_id": session_data.get('customer_id'),
             "stage": session_data.get('stage'),
-            "escalated": session_data.get('escalated', False)
+            "escalated": session_data.get('escalated', False),
+            "otp_delivery": otp_delivery
         })
     except Exception as e:
         logging.error(f"Error getting session status: {e}")
         return jsonify({"status": "error", "message": "Internal server error"}), 500
 
+@app.route('/api/metrics/bedrock', methods=['GET'])
+def bedrock_metrics():
+    """Bedrock gateway state: concurrency limit, retry budget, breakers, per-call-type stats and hedging."""
+    return jsonify({**bedrock_gateway.metrics(), "hedging": async_bedrock.metrics()})
+
+@app.route('/api/metrics/models', methods=['GET'])
+def model_metrics():
+    """Model tier per call type, SLO state and per-tier latency/token histograms."""
+    return jsonify(model_router.snapshot())
+
+@app.route('/api/metrics/voice_prompts', methods=['GET'])
+def voice_prompt_metrics():
+    """Translation memory hits, live translations and prompts still missing."""
+    return jsonify(voice_prompts.stats())
+
+@app.route('/api/metrics/call_flow', methods=['GET'])
+def call_flow_metrics():
+    """Voice webhooks and server time per call, and whether stages are merged."""
+    return jsonify(call_flow.stats())
+
+@app.route('/api/metrics/call_tasks', methods=['GET'])
+def call_task_metrics():
+    """Outbound call tasks per status in the shared call task store."""
+    return jsonify(call_task_store.counts())
+
+@app.route('/call_trace/<task_id>', methods=['GET'])
+def call_trace(task_id):
+    """Webhook-by-webhook trace of the task's most recent call."""
+    trace = call_flow.traces.for_task(task_id)
+    if not trace:
+        return jsonify({"error": "No trace for this task"}), 404
+    return jsonify(trace)
+
+@app.route('/api/metrics/outbox', methods=['GET'])
+def outbox_metrics():
+    """Outbox queue depths and send/retry/failure counts."""
+    return jsonify(outbox.stats())
+
+@app.route('/outbox/<message_id>', methods=['GET'])
+def outbox_message_status(message_id):
+    """Send status of one outbox message (without its body)."""
+    message = outbox.status(message_id)
+    if not message:
+        return jsonify({"status": "error", "message": "Message not found."}), 404
+    return jsonify({"status": "success", "message": message})
+
+@app.route('/twilio/message_status', methods=['POST'])
+def twilio_message_status():
+    """Twilio status callback (OUTBOX_STATUS_CALLBACK_URL) for messages sent by the outbox."""
+    sid = request.values.get('MessageSid')
+    delivery_status = request.values.get('MessageStatus')
+    if sid and delivery_status:
+        outbox.record_delivery_status(sid, delivery_status, request.values.get('ErrorCode'))
+    return '', 204
+
+@app.route('/api/metrics/embeddings', methods=['GET'])
+def embedding_metrics():
+    """Embedding cache hit rate, throughput and queue depth."""
+    return jsonify(embedding_service.stats())
+
 # Keep your existing Socket.IO handlers and other routes...
 @socketio.on('connect')
 def handle_connect():
@@ -697,6 +889,11 @@ def handle_join_agent_room():
     join_room('agent_room')
     emit('room_joined', {'room': 'agent_room'})
 
+@socketio.on('join_campaign_room')
+def handle_join_campaign_room():
+    join_room('campaign_room')
+    emit('room_joined', {'room': 'campaign_room'})
+
 # Add your other existing routes here...
 # (agent dashboard, chat history, etc.)
 @app.route('/agent-dashboard')
@@ -871,7 +1068,7 @@ def get_or_create_conversation_route():
         if not customer_id:
             return jsonify({'success': False, 'error': 'Customer ID is required'}), 400
         
-        conversation_sid = create_conversation(customer_id)
+        conversation_sid = conversation_directory.get_or_create(customer_id)
         if conversation_sid:
             return jsonify({
                 'success': True,
@@ -957,7 +1154,8 @@ def fetch_high_risk_customers():
                 e.amount_due AS emi_amount,
                 TO_CHAR(e.due_date, 'DD Month') AS due_date,
                 ct.status,
-                ct.priority_level
+                ct.priority_level,
+                rs.risk_segment
             FROM 
                 collectiontask ct
             JOIN 
@@ -990,6 +1188,7 @@ def fetch_high_risk_customers():
                 'loan_last4': row.loan_last4,
                 'emi_amount': f'₹{row.emi_amount:,.0f}' if row.emi_amount else '₹0',
                 'due_date': row.due_date,
+                'risk_segment': row.risk_segment,
                 'status': row.status or 'pending',
                 'current_language': '1'
             })
@@ -1008,133 +1207,18 @@ def fetch_high_risk_customers():
         print(f"❌ Database error in fetch_high_risk_customers: {e}")
         return []
 
-def update_task_status_in_db(task_id, status):
-    """
-    Updates a task's status in the database.
-    """
-    try:
-        db = DatabaseSession()
-        update_query = text("""
-            UPDATE CollectionTask 
-            SET status = :status
-            WHERE task_id = :task_id
-            RETURNING task_id
-        """)
-        
-        result = db.execute(update_query, {
-            'task_id': task_id,
-            'status': status
-        })
-        
-        updated = result.rowcount > 0
-        db.commit()
-        db.close()
-        
-        if updated:
-            print(f"✅ Task {task_id} status updated to '{status}' in database")
-        else:
-            print(f"⚠️ Task {task_id} not found for status update")
-        
-        return updated
-    except Exception as e:
-        print(f"❌ Error updating task status: {e}")
-        return False
-
-def record_call_outcome(task_id, outcome_type, notes=None, ptp=False, ptp_date=None):
-    """
-    Records the outcome of a collection call in the CallOutcome table.
-    """
-    try:
-        db = DatabaseSession()
-        query = text("""
-            INSERT INTO CallOutcome 
-            (task_id, outcome_type, ptp, ptp_date, notes) 
-            VALUES 
-            (:task_id, :outcome_type, :ptp, :ptp_date, :notes)
-        """)
-        
-        db.execute(query, {
-            'task_id': task_id, 
-            'outcome_type': outcome_type, 
-            'ptp': ptp, 
-            'ptp_date': ptp_date,
-            'notes': notes
-        })
-        db.commit()
-        db.close()
-        print(f"✅ Call outcome recorded for task {task_id}: {outcome_type}")
-    except Exception as e:
-        print(f"❌ Database error recording call outcome: {e}")
-
-def translate_text(text, target_lang_key, target_lang_name):
-    """
-    Translates text to the target language using AWS Bedrock.
-    """
-    try:
-        # Return original text if target is English or if no translation needed
-        if target_lang_key == '1': 
-            return text
-            
-        # If Bedrock client isn't available, return with a note
-        if not bedrock_client:
-            print(f"⚠️ AWS Bedrock client unavailable for translation to {target_lang_name}")
-            return text + f" (Translation to {target_lang_name} unavailable)"
-            
-        prompt_map = {
-            '2': f"Translate the following English text to Hindi. Only provide the translated text. Do not include any conversational filler. Text: '{text}'",
-            '3': f"Translate the following English text to Telugu. Only provide the translated text. Do not include any conversational filler. Text: '{text}'"
-        }
-        
-        prompt_text = prompt_map.get(target_lang_key)
-        if not prompt_text: return text
-
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{"role": "user", "content": prompt_text}],
-            "max_tokens": 500, "temperature": 0.1,
-        })
-        
-        response = bedrock_client.invoke_model(
-            body=body, 
-            modelId=CLAUDE_MODEL_ID, 
-            accept="application/json", 
-            contentType="application/json"
-        )
-        
-        response_body = json.loads(response.get('body').read())
-        translated_text = response_body.get('content', [{'text': ''}])[0].get('text', '').strip()
-        
-        print(f"Translated to {target_lang_name}: {translated_text}")
-        return translated_text
-        
-    except Exception as e:
-        print(f"❌ Error during translation to {target_lang_name}: {e}")
-        
-        # Fallback responses based on language
-        fallbacks = {
-            '2': "मुझे खेद है, मैं अभी हिंदी में सेवा प्रदान करने में असमर्थ हूं। कृपया अंग्रेजी में बात करें।",
-            '3': "క్షమించండి, నేను ప్రస్తుతం తెలుగులో సేవలను అందించలేను. దయచేసి ఆంగ్లంలో మాట్లాడండి."
-        }
-        
-        return fallbacks.get(target_lang_key, "I am currently unable to provide service in the selected language.")
-
 def update_call_status_and_outcome(task_id, status, outcome):
     """
-    Updates the call status and outcome in memory and database.
+    Updates the call status and outcome in the call task store and database.
     """
-    if task_id in call_tasks:
-        call_tasks[task_id].update({
-            'status': status,
-            'call_outcome_notes': outcome,
-            'timestamp': datetime.now().isoformat()
-        })
+    if call_task_store.set_status(task_id, status, call_outcome_notes=outcome):
         print(f"✅ Task {task_id} updated to '{status}' with outcome: {outcome}.")
 
-        # Update the status in the database as well
-        update_task_status_in_db(task_id, status)
-        
-        # Record the call outcome in the database
-        record_call_outcome(task_id, outcome)
+        # Status and CallOutcome are written in one statement
+        try:
+            transition_tasks([task_id], status, outcome_type=outcome)
+        except Exception as e:
+            print(f"❌ Database error recording call outcome for task {task_id}: {e}")
     else:
         print(f"⚠️ Task ID {task_id} not found for status update.")
 
@@ -1171,7 +1255,8 @@ def require_task(f):
         task_id = request.values.get('task_id')
         print(f"-> Executing {f.__name__} for Task ID: {task_id}")
 
-        if not task_id or task_id not in call_tasks:
+        task_details = call_task_store.get(task_id) if task_id else None
+        if not task_details:
             response = VoiceResponse()
             # Enhanced error message with more specific information and guidance
             response.say(
@@ -1185,11 +1270,13 @@ def require_task(f):
             response.hangup()
             return str(response)
         
-        task_details = call_tasks[task_id]
         lang_code_key = task_details.get('current_language', '1')
         lang_info = LANG_CONFIG.get(lang_code_key, LANG_CONFIG['1'])
         
-        return f(task_id, task_details, lang_info, *args, **kwargs)
+        started = time.perf_counter()
+        result = f(task_id, task_details, lang_info, *args, **kwargs)
+        call_flow.record_webhook(request.values.get('CallSid'), task_id, f.__name__, started)
+        return result
     return decorated_function
 
 # --- TwiML Routes for Outbound Voice System ---
@@ -1213,9 +1300,10 @@ def voice_language_select_handler(task_id, task_details, lang_info):
     digit_pressed = request.form.get('Digits')
     response = VoiceResponse()
     if digit_pressed in LANG_CONFIG:
-        call_tasks[task_id]['current_language'] = digit_pressed
+        call_task_store.update(task_id, current_language=digit_pressed)
+        task_details['current_language'] = digit_pressed
         print(f"Language for Task {task_id} set to: {LANG_CONFIG[digit_pressed]['name']}")
-        response.redirect(f'{NGROK_URL}/voice-confirm-identity?task_id={task_id}')
+        call_flow.go('confirm_identity', task_id, task_details, response)
     else:
         response.say("Invalid selection. Goodbye.", voice="Polly.Raveena", language="en-IN")
         response.hangup()
@@ -1224,134 +1312,80 @@ def voice_language_select_handler(task_id, task_details, lang_info):
 @app.route("/voice-confirm-identity", methods=['POST', 'GET'])
 @require_task
 def voice_confirm_identity(task_id, task_details, lang_info):
-    response = VoiceResponse()
-    customer_name = task_details.get("customer_name", "Valued Customer")
-    prompt_english = f"Hello, this is south india finvest Bank AI Assistant calling. Am I speaking with {customer_name}?"
-    prompt_translated = translate_text(prompt_english, task_details['current_language'], lang_info['name'])
-    
-    action_url = f"{NGROK_URL}/voice-handle-identity-confirmation?task_id={task_id}"
-    gather = Gather(input="speech", timeout="5", action=action_url, method="POST")
-    gather.say(prompt_translated, voice=lang_info['voice'], language=lang_info['code'])
-    response.append(gather)
-    
-    # Enhanced fallback message
-    fallback_prompt = translate_text(
-        "I'm sorry, I didn't hear your response. This call is regarding your loan account. "
-        "If this is a convenient time to talk, please say 'yes'. Otherwise, we'll try to reach you later.", 
-        task_details['current_language'], lang_info['name']
-    )
-    response.say(fallback_prompt, voice=lang_info['voice'], language=lang_info['code'])
-    response.hangup()
-    return str(response)
+    return str(call_flow.respond('confirm_identity', task_id, task_details))
 
 @app.route("/voice-handle-identity-confirmation", methods=['POST'])
 @require_task
 def voice_handle_identity_confirmation(task_id, task_details, lang_info):
     speech_result = request.form.get('SpeechResult', '').lower()
-    response = VoiceResponse()
     
     affirmative = ["yes", "yeah", "ok", "haan", "ha", "sari", "avunu", "hūdu"]
     negative = ["no", "nope", "nahi", "nahee", "ledu", "illa"]
 
     if any(keyword in speech_result for keyword in affirmative):
-        response.redirect(f'{NGROK_URL}/voice-emi-details?task_id={task_id}')
+        # EMI details, impact and the support offer go out in this one response
+        response = call_flow.go('emi_details', task_id, task_details)
     elif any(keyword in speech_result for keyword in negative):
-        prompt = translate_text("I understand. For security, I cannot proceed. Goodbye.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
         update_call_status_and_outcome(task_id, 'completed', 'Identity_Not_Confirmed')
-        response.hangup()
+        response = call_flow.respond('identity_not_confirmed', task_id, task_details)
     else:
-        prompt = translate_text("I didn't understand. Please say 'yes' or 'no'.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
-        response.redirect(f'{NGROK_URL}/voice-confirm-identity?task_id={task_id}')
+        response = call_flow.respond('identity_unclear', task_id, task_details)
     return str(response)
 
 @app.route("/voice-emi-details", methods=['POST', 'GET'])
 @require_task
 def voice_emi_details(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = f"Thank you. I'm calling about your loan ending in {task_details.get('loan_last4', 'XXXX')}, which has an outstanding EMI of {task_details.get('emi_amount', 'a certain amount')} due on {task_details.get('due_date', 'a recent date')}."
-    prompt2_english = "I understand payments can be delayed — I'm here to help you avoid any further impact."
-
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.pause(length=1)
-    response.say(translate_text(prompt2_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.redirect(f'{NGROK_URL}/voice-explain-impact?task_id={task_id}')
-    return str(response)
+    return str(call_flow.respond('emi_details', task_id, task_details))
 
 @app.route("/voice-explain-impact", methods=['POST', 'GET'])
 @require_task
 def voice_explain_impact(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = "Please note: if this EMI remains unpaid, it may be reported to the credit bureau, which can affect your credit score."
-    prompt2_english = "Continued delay may also classify your account as delinquent, leading to penalty charges or collection notices."
-
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.pause(length=2)
-    response.say(translate_text(prompt2_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.redirect(f'{NGROK_URL}/voice-offer-support?task_id={task_id}')
-    return str(response)
+    return str(call_flow.respond('explain_impact', task_id, task_details))
 
 @app.route("/voice-offer-support", methods=['POST', 'GET'])
 @require_task
 def voice_offer_support(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = "If you're facing difficulties, we have options like part payments or revised EMI plans. Would you like me to connect to one of our agent,to assist you better ?"
-    
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    confirm_assistance_english = ""
-    confirm_assistance_translated = translate_text(confirm_assistance_english, task_details['current_language'], lang_info['name'])
-
-    action_url = f"{NGROK_URL}/voice-handle-support-choice?task_id={task_id}"
-    gather = Gather(input="speech", timeout="7", action=action_url, method="POST")
-    gather.say(confirm_assistance_translated, voice=lang_info['voice'], language=lang_info['code'])
-    response.append(gather)
-    
-    fallback_prompt = translate_text("We did not receive a clear response. Goodbye.", task_details['current_language'], lang_info['name'])
-    response.say(fallback_prompt, voice=lang_info['voice'], language=lang_info['code'])
-    response.hangup()
-    return str(response)
+    return str(call_flow.respond('offer_support', task_id, task_details))
 
 @app.route("/voice-handle-support-choice", methods=['POST'])
 @require_task
 def voice_handle_support_choice(task_id, task_details, lang_info):
     speech_result = request.form.get('SpeechResult', '').lower()
-    response = VoiceResponse()
 
     affirmative_keywords = ["yes", "yeah", "ok", "yep", "haan", "ha", "sari", "sare", "avunu", "hūdu", "pay", "payment", "help", "agent", "support"]
     
     if any(keyword in speech_result for keyword in affirmative_keywords):
-        response.redirect(f'{NGROK_URL}/voice-connect-to-agent?task_id={task_id}&outcome=Customer_Agreed_Assistance')
+        response = call_flow.go('connect_to_agent', task_id, task_details, outcome='Customer_Agreed_Assistance')
     else:
-        prompt = translate_text("I understand. If you change your mind, please call us back. Thank you. Goodbye.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
         update_call_status_and_outcome(task_id, 'completed', 'No_Agreement_For_Assistance')
-        response.hangup()
+        response = call_flow.respond('support_declined', task_id, task_details)
     return str(response)
 
-@app.route("/voice-connect-to-agent", methods=['POST', 'GET'])
-@require_task
-def voice_connect_to_agent(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    call_outcome_notes = request.args.get('outcome', 'Agent_Requested')
-    update_call_status_and_outcome(task_id, 'agent_handoff', call_outcome_notes)
+@call_flow.stage('connect_to_agent', path='/voice-connect-to-agent')
+def connect_to_agent(task_id, task_details, lang_info, response, outcome='Agent_Requested'):
+    """
+    Hands the call to an agent: records the outcome, sends the WhatsApp summary, creates
+    the TaskRouter task and dials the agent.
+    """
+    update_call_status_and_outcome(task_id, 'agent_handoff', outcome)
+    campaign_dialer.record_handoff(task_details.get('campaign_id'), task_id)
     
     send_whatsapp_summary(
         task_id, task_details['customer_phone_number'], task_details['customer_name'],
-        task_details['loan_id_full'], task_details['emi_amount'], call_outcome_notes
+        task_details['loan_id_full'], task_details['emi_amount'], outcome
     )
 
-    create_task_router_task(task_id, task_details, call_outcome_notes, request.values.get('CallSid'))
+    create_task_router_task(task_id, task_details, outcome, request.values.get('CallSid'))
 
-    prompt = translate_text("Please wait while I connect you to an agent.", task_details['current_language'], lang_info['name'])
+    prompt = voice_prompts.render('connecting_agent', task_details['current_language'])
     response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
     response.dial(AGENT_PHONE_NUMBER)
-    
-    return str(response)
+
+@app.route("/voice-connect-to-agent", methods=['POST', 'GET'])
+@require_task
+def voice_connect_to_agent(task_id, task_details, lang_info):
+    call_outcome_notes = request.args.get('outcome', 'Agent_Requested')
+    return str(call_flow.respond('connect_to_agent', task_id, task_details, outcome=call_outcome_notes))
 
 # --- Outbound Campaign Management Routes ---
 @app.route("/trigger-call", methods=['POST'])
@@ -1385,7 +1419,7 @@ def trigger_call():
         task_id = str(result.fetchone()[0])
         db.commit()
         
-        # Fetch complete customer details to populate call_tasks
+        # Fetch complete customer details for the call task store
         details_query = text("""
             SELECT 
                 c.full_name AS customer_name, 
@@ -1414,7 +1448,7 @@ def trigger_call():
         db.close()
         
         if customer_details:
-            call_tasks[task_id] = {
+            call_task_store.put(task_id, {
                 'status': 'pending',
                 'customer_id': customer_id,
                 'customer_name': customer_details.customer_name,
@@ -1424,10 +1458,10 @@ def trigger_call():
                 'emi_amount': f'₹{customer_details.emi_amount:,.0f}' if customer_details.emi_amount else '₹0',
                 'due_date': customer_details.due_date,
                 'current_language': '1'
-            }
+            })
         else:
             # Fall back to manually provided data if database doesn't return details
-            call_tasks[task_id] = {
+            call_task_store.put(task_id, {
                 'status': 'pending',
                 'customer_id': customer_id,
                 'customer_name': data.get('customer_name', 'Valued Customer'),
@@ -1437,7 +1471,7 @@ def trigger_call():
                 'emi_amount': data.get('emi_amount', '₹0'),
                 'due_date': data.get('due_date', 'upcoming'),
                 'current_language': '1'
-            }
+            })
         
         return jsonify({
             "message": "Task created in database. Use /start-campaign to initiate calls.", 
@@ -1448,15 +1482,50 @@ def trigger_call():
         print(f"❌ Error creating task: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/start-campaign", methods=['GET'])
+def _dial_campaign_call(task_id, task_details):
+    """
+    Places one campaign call. Run by the campaign dialer on a background task.
+
+    Returns:
+        str: The Twilio Call SID
+    """
+    call_task_store.set_status(task_id, 'dialing')
+    call = twilio_client.calls.create(
+        url=f'{NGROK_URL}/voice-language-select?task_id={task_id}',
+        to=task_details['customer_phone_number'],
+        from_=TWILIO_PHONE_NUMBER,
+        status_callback=f"{NGROK_URL}/voice-call-status?task_id={task_id}&campaign_id={task_details['campaign_id']}",
+        status_callback_event=['answered', 'completed']
+    )
+    call_task_store.update(task_id, call_sid=call.sid)
+    return call.sid
+
+def _release_campaign_tasks(task_ids):
+    """Returns the tasks of a cancelled campaign that were never dialed to 'pending'."""
+    released = transition_tasks(task_ids, 'pending', from_statuses=('in-progress',))
+    print(f"🔄 Returned {len(released)} undialed campaign tasks to 'pending'")
+
+def _emit_campaign_progress(status):
+    """Pushes campaign progress to the outbound dashboard. Registered as a campaign_dialer listener."""
+    socketio.emit('campaign_progress', status, room='campaign_room')
+
+# Campaign calls are placed by the dialer's background task, within the campaign's limits
+campaign_dialer.add_progress_listener(_emit_campaign_progress)
+campaign_dialer.start(_dial_campaign_call, socketio.start_background_task, socketio.sleep,
+                      release=_release_campaign_tasks)
+
+@app.route("/start-campaign", methods=['GET', 'POST'])
 def start_campaign():
     """
-    Initiates outbound calls for high-risk customers.
+    Queues outbound calls for high-risk customers on the campaign dialer and returns at
+    once (202). Progress is pushed as 'campaign_progress' Socket.IO events.
+    Query parameters: reset, max_concurrent, calls_per_second, pacing (predictive|fixed), agents.
     """
     try:
-        # Clear the existing call_tasks to start fresh
-        call_tasks.clear()
-        
+        active = campaign_dialer.active()
+        if active:
+            return jsonify({"error": "A campaign is already active", "campaign": active}), 409
+
         # Check if we should reset tasks (defaults to False)
         reset_tasks = request.args.get('reset', 'false').lower() == 'true'
         
@@ -1480,44 +1549,78 @@ def start_campaign():
         # Fetch high-risk customers from the database
         customers_to_call = fetch_high_risk_customers()
         
-        # Populate the call_tasks dictionary for easy lookup
-        for customer in customers_to_call:
-            task_id = customer['task_id']
-            call_tasks[task_id] = customer
+        # Claim the tasks in bulk; any that another worker already took are left out
+        claimed = set(transition_tasks([customer['task_id'] for customer in customers_to_call],
+                                       'in-progress', from_statuses=('pending',)))
+        customers_to_call = [customer for customer in customers_to_call if customer['task_id'] in claimed]
+
+        # Store the tasks in Redis so whichever worker receives a call's webhooks can serve it
+        call_task_store.put_many(customers_to_call)
         
         print(f"📞 Found {len(customers_to_call)} customers to call.")
 
-        calls_initiated_details = []
-        for customer in customers_to_call:
-            task_id = customer['task_id']
-            customer_phone_number = customer['customer_phone_number']
-            call_tasks[task_id]['status'] = 'dialing'
-            
-            # Update the task status in the database
-            update_task_status_in_db(task_id, 'in-progress')
-
-            call = twilio_client.calls.create(
-                url=f'{NGROK_URL}/voice-language-select?task_id={task_id}',
-                to=customer_phone_number,
-                from_=TWILIO_PHONE_NUMBER
-            )
-            calls_initiated_details.append({
-                'task_id': task_id,
-                'customer_name': customer['customer_name'],
-                'phone_number': customer_phone_number,
-                'call_sid': call.sid
-            })
-            print(f"✅ Call initiated to {customer_phone_number} for Task ID {task_id}. Call SID: {call.sid}")
+        campaign_id = campaign_dialer.create(
+            customers_to_call,
+            max_concurrent=request.args.get('max_concurrent', CAMPAIGN_MAX_CONCURRENT_CALLS, type=int),
+            calls_per_second=request.args.get('calls_per_second', CAMPAIGN_CALLS_PER_SECOND, type=float),
+            pacing=request.args.get('pacing', CAMPAIGN_PACING),
+            agents=request.args.get('agents', PACING_AGENTS, type=int)
+        )
 
         return jsonify({
-            "message": f"Campaign started. Calls initiated for {len(customers_to_call)} customers.",
-            "calls_initiated": calls_initiated_details,
+            "message": f"Campaign started. {len(customers_to_call)} calls will be placed in the background.",
+            "campaign": campaign_dialer.status(campaign_id),
             "tasks_reset": reset_tasks_list
-        }), 200
+        }), 202
+    except CampaignAlreadyActive as e:
+        return jsonify({"error": str(e), "campaign": campaign_dialer.status(e.campaign_id)}), 409
     except Exception as e:
         print(f"Error starting campaign: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/campaign/active", methods=['GET'])
+def active_campaign():
+    """The campaign that is running or paused, if any."""
+    return jsonify({"campaign": campaign_dialer.active()})
+
+@app.route("/campaign/<campaign_id>", methods=['GET'])
+def campaign_status(campaign_id):
+    status = campaign_dialer.status(campaign_id)
+    if not status:
+        return jsonify({"error": "Campaign not found"}), 404
+    return jsonify(status)
+
+@app.route("/campaign/<campaign_id>/<action>", methods=['POST'])
+def control_campaign(campaign_id, action):
+    """Pauses, resumes or cancels a campaign. Calls already in progress are not affected."""
+    controls = {'pause': campaign_dialer.pause, 'resume': campaign_dialer.resume, 'cancel': campaign_dialer.cancel}
+    status = campaign_dialer.status(campaign_id)
+    if action not in controls or not status:
+        return jsonify({"error": "Campaign or action not found"}), 404
+    if not controls[action](campaign_id):
+        return jsonify({"error": f"Cannot {action} a {status['status']} campaign", "campaign": status}), 409
+    return jsonify(campaign_dialer.status(campaign_id))
+
+@app.route("/voice-call-status", methods=['POST'])
+def voice_call_status():
+    """
+    Twilio status callback for campaign calls. An ended call frees its dialer slot; calls
+    that were never answered are marked failed so /reset-tasks can requeue them, and their
+    CallOutcome (Call_no-answer, Call_busy, ...) feeds the predictive pacer's answer rates.
+    Answered calls that hung up before the flow recorded an outcome get ANSWERED_NO_OUTCOME,
+    so every ended call has exactly one CallOutcome.
+    """
+    task_id = request.values.get('task_id')
+    call_status = request.values.get('CallStatus')
+    ended = campaign_dialer.record_call_status(request.values.get('campaign_id'), task_id, call_status)
+    if ended and call_status != 'completed':
+        update_call_status_and_outcome(task_id, 'failed', f"Call_{call_status}")
+    elif ended:
+        task_details = call_task_store.get(task_id)
+        if task_details and not task_details.get('call_outcome_notes'):
+            update_call_status_and_outcome(task_id, 'completed', ANSWERED_NO_OUTCOME)
+    return '', 204
+
 @app.route("/reset-tasks", methods=['POST'])
 def reset_tasks():
     """
@@ -1783,14 +1886,10 @@ def send_whatsapp_summary(task_id, to_number, customer_name, loan_id, emi_amount
         f"Thank you for banking with us."
     )
     try:
-        message = twilio_client.messages.create(
-            from_=f'whatsapp:{TWILIO_PHONE_NUMBER}',
-            body=summary_message,
-            to=f'whatsapp:{formatted_number}'
-        )
-        print(f"✅ WhatsApp summary sent to customer at {formatted_number}. SID: {message.sid}")
+        message_id = outbox.enqueue('whatsapp', formatted_number, summary_message, purpose='call_summary')
+        print(f"✅ WhatsApp summary for task {task_id} queued for {formatted_number}. Outbox ID: {message_id}")
     except Exception as e:
-        print(f"❌ Failed to send WhatsApp summary to customer: {e}")
+        print(f"❌ Failed to queue WhatsApp summary to customer: {e}")
 @app.route("/api/debug", methods=['GET'])
 def debug_info():
     """
@@ -1895,32 +1994,6 @@ def outbound_campaign():
         <p>Make sure the file exists at: {os.path.join(app.template_folder, 'outbound.html')}</p>
         """, 500
 
-def get_bedrock_client():
-    """
-    Creates and returns an AWS Bedrock client
-    """
-    try:
-        config = Config(
-            retries={"max_attempts": 3, "mode": "standard"},
-            region_name="us-east-1"  # Use your AWS region
-        )
-        
-        # Create the Bedrock Runtime client
-        bedrock_client = boto3.client(
-            service_name="bedrock-runtime",
-            config=config
-        )
-        
-        return bedrock_client
-    except Exception as e:
-        print(f"❌ Error creating Bedrock client: {e}")
-        return None
-
-# Initialize the Bedrock client
-bedrock_client = get_bedrock_client()
-
-# Define the Claude model ID
-CLAUDE_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
 if __name__ == "__main__":
     # Start the Flask app using socketio.run
     socketio.run(app, debug=True, host='0.0.0.0', port=5504)
@@ -1,12 +1,13 @@
 from flask import request, jsonify
 from flask_socketio import SocketIO
 # from database import SessionLocal, RAGDocument, Customer
-from database import Session as SessionLocal, RAGDocument, Customer
+from database import RAGDocument, Customer
 from database import ClientInteraction
 from twilio.rest import Client as TwilioClient
 from twilio.base.exceptions import TwilioException
 import os
 import logging
+from conversation_directory import conversation_directory
 
 # Setup logging
 logging.basicConfig(
@@ -41,40 +42,16 @@ def get_twilio_client():
 
 # ✅ Get or create Twilio Conversation for a customer
 def get_or_create_conversation(customer_id):
-    """Get existing conversation or create a new one for the customer"""
+    """
+    Get existing conversation or create a new one for the customer.
+    Uses the cached customer -> conversation mapping, so Twilio is only asked on a true miss.
+    """
     if not customer_id:
         logging.error("❌ Cannot create conversation: customer_id is required")
         return None
-        
-    # Use proper session management for thread safety
-    db = SessionLocal()
+
     try:
-        client = get_twilio_client()
-        
-        # Log the customer ID for debugging
-        logging.info(f"🔍 Looking for conversation with friendly_name: {customer_id}")
-        
-        # First try to find an existing conversation
-        conversations = client.conversations.conversations.list(limit=20)
-        for convo in conversations:
-            logging.debug(f"Checking conversation: {convo.sid} with friendly_name: {convo.friendly_name}")
-            if convo.friendly_name == customer_id:
-                logging.info(f"✅ Found existing conversation: {convo.sid}")
-                return convo.sid
-                
-        # Create a new conversation if none exists
-        logging.info(f"🏆 Creating new conversation for customer: {customer_id}")
-        new_convo = client.conversations.conversations.create(friendly_name=customer_id)
-        logging.info(f"✅ Created new conversation: {new_convo.sid}")
-        
-        # Track this in the database if needed
-        # db.add(ClientInteraction(...))
-        # db.commit()
-        
-        return new_convo.sid
+        return conversation_directory.get_or_create(customer_id)
     except Exception as e:
-        db.rollback()
         logging.error(f"❌ Error in get_or_create_conversation: {e}")
         return None
-    finally:
-        db.close()
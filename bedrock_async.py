@@ -0,0 +1,263 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from bedrock_gateway import (
+    bedrock_gateway, BedrockUnavailableError, CircuitOpenError, ConcurrencyLimitError, RetryBudget
+)
+from config import (
+    AWS_REGION, BEDROCK_STUB, BEDROCK_ENDPOINT_URL, BEDROCK_HEDGE_ENABLED, BEDROCK_HEDGE_CALL_TYPES, BEDROCK_HEDGE_PERCENTILE,
+    BEDROCK_HEDGE_MIN_DELAY_MS, BEDROCK_HEDGE_DEFAULT_DELAY_MS, BEDROCK_HEDGE_BUDGET_RATIO
+)
+
+try:
+    from aiobotocore.session import get_session
+    from aiobotocore.config import AioConfig
+except ImportError:  # aiobotocore is optional; the blocking client then runs on worker threads
+    get_session = None
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Recent single-attempt latencies per call type; the hedge delay is their percentile."""
+
+    def __init__(self, percentile=BEDROCK_HEDGE_PERCENTILE, min_samples=20, window=200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_type: str, latency_ms: float):
+        with self._lock:
+            self._samples.setdefault(call_type, deque(maxlen=self.window)).append(latency_ms)
+
+    def hedge_delay_ms(self, call_type: str) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(call_type, ()))
+        if len(samples) < self.min_samples:
+            return BEDROCK_HEDGE_DEFAULT_DELAY_MS
+        index = min(len(samples) - 1, int(len(samples) * self.percentile))
+        return max(BEDROCK_HEDGE_MIN_DELAY_MS, samples[index])
+
+
+class AsyncBedrockClient:
+    """
+    asyncio Bedrock client sharing the gateway's concurrency limit, breakers and metrics.
+
+    Call types listed in BEDROCK_HEDGE_CALL_TYPES (short, idempotent prompts) send a
+    second request when the first is slower than the recent latency percentile and take
+    whichever answers first. Hedges are paid from a budget refilled by a fraction of
+    calls, so duplicate traffic stays bounded when Bedrock is slow across the board.
+    """
+
+    def __init__(self, gateway=bedrock_gateway):
+        self.gateway = gateway
+        self.latency = LatencyTracker()
+        self.hedge_budget = RetryBudget(ratio=BEDROCK_HEDGE_BUDGET_RATIO)
+        self.counters = {"hedges": 0, "hedge_wins": 0, "hedge_budget_denied": 0, "hedge_no_capacity": 0}
+        self._aio_session = get_session() if get_session and not BEDROCK_STUB else None
+        self._aio_clients = {}
+        self._client_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    async def _aio_client(self, call_type: str, region: str):
+        key = (call_type, region)
+        async with self._client_lock:
+            if key not in self._aio_clients:
+                context = self._aio_session.create_client(
+                    "bedrock-runtime",
+                    region_name=region,
+                    endpoint_url=BEDROCK_ENDPOINT_URL,
+                    config=AioConfig(
+                        connect_timeout=2,
+                        read_timeout=self.gateway.deadline(call_type),
+                        retries={"max_attempts": 1, "mode": "standard"},
+                    )
+                )
+                # Clients live as long as the process, like the gateway's boto3 clients
+                self._aio_clients[key] = await context.__aenter__()
+            return self._aio_clients[key]
+
+    async def _acquire_slot(self, slot_timeout: float) -> bool:
+        limiter = self.gateway.limiter
+        if slot_timeout <= 0:
+            return limiter.acquire(0)
+        waiting = asyncio.get_running_loop().run_in_executor(None, limiter.acquire, slot_timeout)
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # The worker thread may still get the slot after we stop waiting; give it back then
+            def release_if_acquired(future):
+                if not future.cancelled() and future.exception() is None and future.result():
+                    limiter.release("cancelled")
+            waiting.add_done_callback(release_if_acquired)
+            raise
+
+    def _invoke_blocking(self, client, request: dict, call_type: str) -> bytes:
+        """
+        invoke_model on a worker thread for the boto3 fallback. The slot is released here,
+        when the request really ends: cancelling the awaiting coroutine does not stop the
+        thread, so releasing earlier would let more requests run than the limit allows.
+        """
+        started = time.monotonic()
+        outcome = "cancelled"
+        try:
+            response = client.invoke_model(**request)
+            payload = response["body"].read()
+            outcome = "success"
+            self.latency.record(call_type, (time.monotonic() - started) * 1000)
+            return payload
+        except Exception as e:
+            outcome = self.gateway.classify_error(e)
+            raise
+        finally:
+            self.gateway.limiter.release(outcome)
+
+    async def _send(self, call_type: str, body: dict, model_id: str, region: str, slot_timeout: float) -> dict:
+        """One attempt under the shared concurrency limit; returns the parsed response body."""
+        if not await self._acquire_slot(slot_timeout):
+            raise ConcurrencyLimitError(f"Bedrock concurrency limit reached for {call_type}")
+
+        request = dict(body=json.dumps(body), modelId=model_id,
+                       contentType="application/json", accept="application/json")
+        if not self._aio_session:
+            client = self.gateway.client(call_type, region)
+            return json.loads(await asyncio.to_thread(self._invoke_blocking, client, request, call_type))
+
+        limiter = self.gateway.limiter
+        started = time.monotonic()
+        outcome = "cancelled"
+        try:
+            client = await self._aio_client(call_type, region)
+            response = await client.invoke_model(**request)
+            payload = await response["body"].read()
+            outcome = "success"
+            self.latency.record(call_type, (time.monotonic() - started) * 1000)
+            return json.loads(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            outcome = self.gateway.classify_error(e)
+            raise
+        finally:
+            limiter.release(outcome)
+
+    async def _hedged(self, call_type: str, body: dict, model_id: str, region: str, deadline: float) -> dict:
+        primary = asyncio.ensure_future(self._send(call_type, body, model_id, region, deadline))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.latency.hedge_delay_ms(call_type) / 1000)
+            if done:
+                return primary.result()
+
+            if not self.hedge_budget.withdraw():
+                self.counters["hedge_budget_denied"] += 1
+                return await primary
+
+            hedge = asyncio.ensure_future(self._send(call_type, body, model_id, region, 0))
+            tasks.add(hedge)
+            self.counters["hedges"] += 1
+
+            pending, first_error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    if isinstance(error, ConcurrencyLimitError) and task is hedge:
+                        # No free slot for the duplicate; keep waiting on the primary
+                        self.counters["hedge_no_capacity"] += 1
+                        continue
+                    first_error = first_error or error
+            raise first_error or primary.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def invoke(self, call_type: str, body: dict, model_id: str, region: str = AWS_REGION) -> dict:
+        """
+        invoke_model on the event loop, hedged for the configured call types.
+
+        Returns:
+            dict: The parsed response body
+
+        Raises:
+            BedrockUnavailableError: On open circuit, no capacity, deadline or throttling;
+                                     other (request) errors are re-raised unchanged.
+        """
+        breaker = self.gateway.breaker(call_type)
+        self.gateway.count(call_type, "calls")
+        if not breaker.allow():
+            self.gateway.count(call_type, "short_circuited")
+            raise CircuitOpenError(f"Bedrock circuit open for {call_type}")
+
+        self.hedge_budget.deposit()
+        deadline = self.gateway.deadline(call_type)
+        started = time.monotonic()
+        try:
+            if BEDROCK_HEDGE_ENABLED and call_type in BEDROCK_HEDGE_CALL_TYPES:
+                call = self._hedged(call_type, body, model_id, region, deadline)
+            else:
+                call = self._send(call_type, body, model_id, region, deadline)
+            result = await asyncio.wait_for(call, timeout=deadline)
+        except ConcurrencyLimitError:
+            self.gateway.count(call_type, "rejected")
+            breaker.record_neutral()
+            raise
+        except asyncio.TimeoutError as e:
+            self.gateway.count(call_type, "timeouts")
+            breaker.record_failure()
+            raise BedrockUnavailableError(f"Bedrock {call_type} exceeded its {deadline}s deadline") from e
+        except Exception as e:
+            outcome = self.gateway.classify_error(e)
+            logger.error(f"❌ Async Bedrock {call_type} call failed: {e}")
+            if outcome == "fatal":
+                self.gateway.count(call_type, "failure")
+                breaker.record_neutral()
+                raise
+            self.gateway.count(call_type, "throttled" if outcome == "overload" else "timeouts")
+            breaker.record_failure()
+            raise BedrockUnavailableError(f"Bedrock {call_type} unavailable: {e}") from e
+
+        breaker.record_success()
+        self.gateway.count(call_type, "success")
+        self.gateway.record_latency(call_type, (time.monotonic() - started) * 1000)
+        return result
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="bedrock-async", daemon=True).start()
+            return self._loop
+
+    def invoke_sync(self, call_type: str, body: dict, model_id: str, region: str = AWS_REGION) -> dict:
+        """Runs invoke() on the shared background event loop for callers on Flask request threads."""
+        future = asyncio.run_coroutine_threadsafe(self.invoke(call_type, body, model_id, region), self._event_loop())
+        return future.result()
+
+    def metrics(self) -> dict:
+        return {
+            "backend": "aiobotocore" if self._aio_session else "thread",
+            "hedged_call_types": list(BEDROCK_HEDGE_CALL_TYPES) if BEDROCK_HEDGE_ENABLED else [],
+            "hedge_budget_tokens": round(self.hedge_budget.tokens, 2),
+            "hedge_delay_ms": {
+                call_type: round(self.latency.hedge_delay_ms(call_type), 1) for call_type in BEDROCK_HEDGE_CALL_TYPES
+            },
+            **self.counters,
+        }
+
+
+# Initialize global async Bedrock client
+async_bedrock = AsyncBedrockClient()
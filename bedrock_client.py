@@ -1,14 +1,14 @@
-import boto3
-import os
-import json
-from datetime import datetime, date
-
-# Initialize the Bedrock runtime client globally in this module
-# Ensure the region_name matches your AWS Bedrock setup
-bedrock_runtime = boto3.client(
-    service_name='bedrock-runtime',
-    region_name='eu-north-1' # Make sure this matches your Bedrock region
-)
+import logging
+from datetime import date
+from bedrock_gateway import BedrockUnavailableError
+from llm_provider import llm
+from response_templates import render_response
+from prompt_builder import fit_history, compact_json
+
+# All LLM calls go through llm_provider (model per call type, Bedrock access via
+# bedrock_gateway's concurrency limit, deadlines, retry budget and circuit breaker).
+# BedrockUnavailableError means the gateway gave up or short-circuited, and the
+# local fallbacks below take over.
 
 def parse_chat_history(chat_history_list):
     """
@@ -34,41 +34,60 @@ def parse_chat_history(chat_history_list):
     # For intent classification and summarization, we append a user message so it should be fine.
     return messages
 
-def invoke_claude_model(messages, model_id="arn:aws:bedrock:eu-north-1:844605843483:inference-profile/eu.anthropic.claude-3-7-sonnet-20250219-v1:0"):
+def invoke_claude_model(messages, call_type="chat"):
     """
     Helper function to invoke the Claude model with a given set of messages.
+    The model serving each call type comes from config.MODEL_ROUTES (see model_router.py).
     """
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 4096, # Adjust max_tokens as needed for your responses/summaries
-        "messages": messages
-    }
-
     try:
-        response = bedrock_runtime.invoke_model(
-            body=json.dumps(body),
-            modelId=model_id,
-            contentType="application/json",
-            accept="application/json"
-        )
-        response_body = json.loads(response.get('body').read())
-
-        # Claude 3 models return content as a list of content blocks
-        generated_text = ""
-        for content_block in response_body.get('content', []):
-            if content_block.get('type') == 'text':
-                generated_text += content_block['text']
-        return generated_text
-
+        return llm.complete(call_type, messages).text
     except Exception as e:
         print(f"❌ Error invoking Claude model: {e}")
         raise # Re-raise the exception to be handled by the calling function
 
+def invoke_claude_model_stream(messages, call_type="chat_stream"):
+    """
+    Streaming variant of invoke_claude_model. Yields text deltas as Bedrock produces them.
+    """
+    try:
+        yield from llm.stream(call_type, messages)
+    except Exception as e:
+        print(f"❌ Error streaming from Claude model: {e}")
+        raise
+
 def generate_response(query_type, data, chat_history):
     """
     Generates a natural language response based on the query type and data retrieved.
+    Falls back to the local templates when Bedrock is unavailable.
+    """
+    try:
+        return invoke_claude_model(build_response_messages(query_type, data, chat_history))
+    except BedrockUnavailableError:
+        fallback = render_response(query_type, data, force=True)
+        if fallback is None:
+            raise
+        logging.warning(f"Bedrock unavailable, answered {query_type} from template")
+        return fallback
+
+def generate_response_stream(query_type, data, chat_history):
     """
-    messages = parse_chat_history(chat_history)
+    Same prompt as generate_response, but yields the answer in text deltas.
+    """
+    try:
+        yield from invoke_claude_model_stream(build_response_messages(query_type, data, chat_history))
+    except BedrockUnavailableError:
+        fallback = render_response(query_type, data, force=True)
+        if fallback is None:
+            raise
+        logging.warning(f"Bedrock unavailable, streamed {query_type} answer from template")
+        yield fallback
+
+def build_response_messages(query_type, data, chat_history):
+    """
+    Builds the Messages API payload used to answer an emi/balance/loan query.
+    History is trimmed to the chat token budget and account data is sent as compact JSON.
+    """
+    messages = fit_history(parse_chat_history(chat_history), "chat")
     prompt_text = ""
 
     serializable_data = data.copy()
@@ -128,7 +147,7 @@ def generate_response(query_type, data, chat_history):
         prompt_text = f"""The user has asked about their {query_type} details.
 Here is the raw account information relevant to their {query_type} query:
 <account_data>
-{json.dumps(serializable_data, indent=2)}
+{compact_json(serializable_data)}
 </account_data>
 
 Please provide a clear and concise response based on the provided data, specifically in the following structured format.
@@ -150,7 +169,7 @@ If the next_due_date is "N/A", say "No upcoming EMI scheduled" instead.
         prompt_text = f"""The user has asked about their account balance.
 Here is the raw account information:
 <account_data>
-{json.dumps(serializable_data, indent=2)}
+{compact_json(serializable_data)}
 </account_data>
 
 Please provide a clear and concise response stating their current account balance. Emphasize the balance amount using bold text.
@@ -164,22 +183,22 @@ Example: "Your current account balance is **₹50,000.00**."
         prompt_text = f"""The user has asked about their loan details.
 Here is the raw account information:
 <account_data>
-{json.dumps(serializable_data, indent=2)}
+{compact_json(serializable_data)}
 </account_data>
 
 Please provide a clear and concise response summarizing their loan details. Include loan type, principal amount, and interest rate. Emphasize key figures like amounts and rates using bold text.
 Example: "Your **{loan_type}** has a principal amount of **₹{principal_amount}** with an interest rate of **{interest_rate}%**."
 """
     else:
-        prompt_text = f"""The user has asked about their {query_type}. Here are the details from their account:\n<account_data>\n{json.dumps(serializable_data, indent=2)}\n</account_data>\nPlease provide a helpful response based on this information.
+        prompt_text = f"""The user has asked about their {query_type}. Here are the details from their account:\n<account_data>\n{compact_json(serializable_data)}\n</account_data>\nPlease provide a helpful response based on this information.
 """
 
     messages.append({"role": "user", "content": [{"type": "text", "text": prompt_text}]})
-    return invoke_claude_model(messages)
+    return messages
 
 
 def get_chat_summary(chat_history):
-    messages = parse_chat_history(chat_history)
+    messages = fit_history(parse_chat_history(chat_history), "summary")
     messages.append({
         "role": "user",
         "content": [{
@@ -206,7 +225,65 @@ Keep the response under 1000 tokens and easy for humans to read."""
 }]
     })
 
-    return invoke_claude_model(messages)
+    try:
+        return invoke_claude_model(messages, call_type="summary")
+    except BedrockUnavailableError:
+        logging.warning("Bedrock unavailable, using extractive chat summary")
+        return _fallback_summary(chat_history)
+
+
+def update_chat_summary(previous_summary, new_messages):
+    """
+    Incrementally updates a rolling summary with the messages exchanged since it was written.
+    Only the new turns are sent, so the prompt stays small however long the chat gets.
+    """
+    transcript = "\n".join(
+        f"{entry.get('sender', 'unknown')}: {entry.get('content') or entry.get('message', '')}"
+        for entry in new_messages
+        if (entry.get('content') or entry.get('message'))
+    )
+    prompt_text = f"""You maintain a running summary of a customer support chat.
+
+<current_summary>
+{previous_summary or "(no summary yet)"}
+</current_summary>
+
+<new_messages>
+{transcript}
+</new_messages>
+
+Update the summary to include the new messages. Use exactly this format:
+
+**Summary**
+- Intent: ...
+- User Info: ...
+- Bot Response: ...
+- Issue: ...
+- Escalation Required: ...
+
+Keep it short and easy for humans to read."""
+
+    messages = [{"role": "user", "content": [{"type": "text", "text": prompt_text}]}]
+    return invoke_claude_model(messages, call_type="summary")
+
+
+def _fallback_summary(chat_history):
+    """
+    Bedrock-free summary in the same shape as the LLM one: the latest user requests verbatim.
+    """
+    user_messages = [
+        (entry.get("content") or entry.get("message") or "").strip()
+        for entry in chat_history if entry.get("sender") == "user"
+    ]
+    user_messages = [m for m in user_messages if m]
+    return (
+        "**Summary**\n"
+        f"- Intent: {user_messages[0] if user_messages else 'Unknown'}\n"
+        f"- User Info: {len(chat_history)} messages exchanged\n"
+        f"- Bot Response: (automatic summary unavailable)\n"
+        f"- Issue: Latest user messages: {' | '.join(user_messages[-3:]) or 'None'}\n"
+        "- Escalation Required: Yes"
+    )
 
 
 def get_intent_from_text(chat_history_list):
@@ -217,8 +294,8 @@ def get_intent_from_text(chat_history_list):
     last_user_message = ""
     for message in reversed(chat_history_list):
         if message.get("sender") == "user":
-            # Correctly get the message text from the 'message' key
-            last_user_message = message.get("message", "")
+            # Web callers send 'content', session history uses 'message'
+            last_user_message = message.get("content") or message.get("message", "")
             break
     
     # If no user message found, return unclear
@@ -246,55 +323,39 @@ Respond with only one word: 'emi', 'balance', 'loan', or 'unclear'."""
         }
     ]
 
-    body = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 10, # Max 10 tokens for a single intent word
-        "temperature": 0.0, # Set to 0 for deterministic classification
-        "messages": messages,
-        "system": "You are an expert financial assistant that classifies user queries into specific categories." # System prompt goes here
-    }
-
     try:
-        response = bedrock_runtime.invoke_model(
-            body=json.dumps(body),
-            modelId="arn:aws:bedrock:eu-north-1:844605843483:inference-profile/eu.anthropic.claude-3-7-sonnet-20250219-v1:0",
-            contentType="application/json",
-            accept="application/json"
+        # Hedged: a duplicate request goes out if the first is slower than recent p95
+        response = llm.complete(
+            "intent", messages, temperature=0.0,  # Set to 0 for deterministic classification
+            system="You are an expert financial assistant that classifies user queries into specific categories."
         )
-        response_body = json.loads(response.get('body').read())
-        intent = "unclear"
-        for content_block in response_body.get('content', []):
-            if content_block.get('type') == 'text':
-                text = content_block['text'].strip().lower()
-                # Extract just the category word
-                if 'emi' in text:
-                    intent = 'emi'
-                elif 'balance' in text:
-                    intent = 'balance'
-                elif 'loan' in text:
-                    intent = 'loan'
-                else:
-                    intent = 'unclear'
-                break
+        text = response.text.strip().lower()
+        # Extract just the category word
+        if 'emi' in text:
+            intent = 'emi'
+        elif 'balance' in text:
+            intent = 'balance'
+        elif 'loan' in text:
+            intent = 'loan'
+        else:
+            intent = 'unclear'
 
         print(f"Classified intent: {intent} from message: {last_user_message[:30]}...")
         return intent
 
+    except BedrockUnavailableError:
+        # Circuit open or limit reached: take the local model's best guess regardless of confidence
+        from intent_model import intent_model
+        intent, confidence = intent_model.predict(last_user_message)
+        logging.warning(f"Bedrock unavailable, local intent {intent} ({confidence:.2f})")
+        return intent
     except Exception as e:
         print(f"Error classifying intent: {e}")
         return "unclear"
 def get_embedding(text):
     try:
-        response = bedrock_runtime.invoke_model(
-            modelId="amazon.titan-embed-text-v2:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({"inputText": text})
-        )
-        result = json.loads(response['body'].read())
-
         # ✅ Titan v2 returns flat list as "embedding"
-        embedding_vector = result.get("embedding")
+        embedding_vector = llm.embed(text)
         if isinstance(embedding_vector, list) and len(embedding_vector) == 1024:
             return embedding_vector
         else:
@@ -0,0 +1,332 @@
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Dict
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError
+
+from config import (
+    AWS_REGION, BEDROCK_STUB, BEDROCK_ENDPOINT_URL, BEDROCK_STUB_DELTA_DELAY_MS, BEDROCK_DEADLINES,
+    BEDROCK_CONCURRENCY_INITIAL, BEDROCK_CONCURRENCY_MIN, BEDROCK_CONCURRENCY_MAX,
+    BEDROCK_MAX_ATTEMPTS, BEDROCK_RETRY_BUDGET_RATIO,
+    BEDROCK_BREAKER_FAILURES, BEDROCK_BREAKER_COOLDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+# Bedrock error codes that mean "back off", as opposed to a bad request
+OVERLOAD_ERROR_CODES = {
+    "ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException",
+    "ModelTimeoutException", "InternalServerException", "TooManyRequestsException",
+}
+
+
+class BedrockUnavailableError(Exception):
+    """Raised when a call is not attempted or gives up; callers should use their local fallback."""
+
+
+class CircuitOpenError(BedrockUnavailableError):
+    pass
+
+
+class ConcurrencyLimitError(BedrockUnavailableError):
+    pass
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on Bedrock calls in flight: +1 per limit's worth of successes,
+    halved on throttling or timeouts.
+    """
+
+    def __init__(self, initial=BEDROCK_CONCURRENCY_INITIAL, minimum=BEDROCK_CONCURRENCY_MIN,
+                 maximum=BEDROCK_CONCURRENCY_MAX, backoff_ratio=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: str):
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "overload":
+                self.limit = max(self.minimum, self.limit * self.backoff_ratio)
+            self._condition.notify_all()
+
+
+class RetryBudget:
+    """
+    Retries are paid for by first attempts: each call deposits `ratio` tokens,
+    each retry withdraws one, so retries stay within ~ratio of total traffic.
+    """
+
+    def __init__(self, ratio=BEDROCK_RETRY_BUDGET_RATIO, min_tokens=5.0, max_tokens=50.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            self.exhausted += 1
+            return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, short-circuits for `cooldown`
+    seconds, then lets a single probe through (half-open) before closing again.
+    """
+
+    def __init__(self, failure_threshold=BEDROCK_BREAKER_FAILURES, cooldown=BEDROCK_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_neutral(self):
+        """
+        The allowed call says nothing about Bedrock's health (it never reached Bedrock, or
+        Bedrock rejected the request itself); free the half-open probe slot and leave the
+        failure count as it is.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"⚠️ Bedrock circuit opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class _CallStats:
+    def __init__(self):
+        self.counters = {"calls": 0, "success": 0, "failure": 0, "retries": 0, "throttled": 0,
+                         "timeouts": 0, "short_circuited": 0, "rejected": 0}
+        self.latencies_ms = deque(maxlen=500)
+
+    def snapshot(self):
+        data = dict(self.counters)
+        latencies = sorted(self.latencies_ms)
+        if latencies:
+            data["p50_ms"] = round(latencies[len(latencies) // 2], 1)
+            data["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+        return data
+
+
+class BedrockGateway:
+    """
+    Single entry point for bedrock-runtime calls. Every call type shares one adaptive
+    concurrency limit and retry budget, and has its own deadline and circuit breaker.
+    """
+
+    def __init__(self, deadlines: Dict[str, float] = BEDROCK_DEADLINES, max_attempts=BEDROCK_MAX_ATTEMPTS):
+        self.deadlines = deadlines
+        self.max_attempts = max_attempts
+        self.limiter = AdaptiveConcurrencyLimiter()
+        self.retry_budget = RetryBudget()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, _CallStats] = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def deadline(self, call_type: str) -> float:
+        return self.deadlines.get(call_type, self.deadlines["default"])
+
+    def client(self, call_type: str, region: str):
+        key = (call_type, region)
+        with self._lock:
+            if key not in self._clients:
+                if BEDROCK_STUB:
+                    from bedrock_stub import StubBedrockRuntime
+                    self._clients[key] = StubBedrockRuntime(delta_delay_ms=BEDROCK_STUB_DELTA_DELAY_MS)
+                else:
+                    # Retries are handled here, so botocore must not retry on its own
+                    self._clients[key] = boto3.client(
+                        service_name="bedrock-runtime",
+                        region_name=region,
+                        endpoint_url=BEDROCK_ENDPOINT_URL,
+                        config=Config(
+                            connect_timeout=2,
+                            read_timeout=self.deadline(call_type),
+                            retries={"max_attempts": 1, "mode": "standard"},
+                        )
+                    )
+            return self._clients[key]
+
+    def breaker(self, call_type: str) -> CircuitBreaker:
+        with self._lock:
+            if call_type not in self.breakers:
+                self.breakers[call_type] = CircuitBreaker()
+                self.stats[call_type] = _CallStats()
+            return self.breakers[call_type]
+
+    def count(self, call_type: str, counter: str):
+        with self._lock:
+            self.stats[call_type].counters[counter] += 1
+
+    def record_latency(self, call_type: str, latency_ms: float):
+        with self._lock:
+            self.stats[call_type].latencies_ms.append(latency_ms)
+
+    @staticmethod
+    def classify_error(error: Exception) -> str:
+        """'overload' (retry, shrink limit), 'timeout' (retry, shrink limit) or 'fatal'."""
+        if isinstance(error, (ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError)):
+            return "timeout"
+        if isinstance(error, ClientError):
+            code = error.response.get("Error", {}).get("Code", "")
+            return "overload" if code in OVERLOAD_ERROR_CODES else "fatal"
+        return "fatal"
+
+    def is_open(self, call_type: str) -> bool:
+        breaker = self.breakers.get(call_type)
+        return breaker is not None and breaker.state == "open"
+
+    def _call(self, call_type: str, region: str, operation: str, body: dict, model_id: str):
+        breaker = self.breaker(call_type)
+        self.count(call_type, "calls")
+        if not breaker.allow():
+            self.count(call_type, "short_circuited")
+            raise CircuitOpenError(f"Bedrock circuit open for {call_type}")
+
+        self.retry_budget.deposit()
+        client = self.client(call_type, region)
+        started = time.monotonic()
+        deadline = started + self.deadline(call_type)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if not self.limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self.count(call_type, "rejected")
+                breaker.record_neutral()
+                raise ConcurrencyLimitError(f"Bedrock concurrency limit reached for {call_type}")
+
+            outcome = "fatal"
+            try:
+                response = getattr(client, operation)(
+                    body=json.dumps(body),
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json"
+                )
+                outcome = "success"
+                return response
+            except Exception as e:
+                outcome = self.classify_error(e)
+                self.count(call_type, "throttled" if outcome == "overload" else
+                            "timeouts" if outcome == "timeout" else "failure")
+                backoff = min(2.0, 0.1 * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+                retryable = (
+                    outcome != "fatal"
+                    and attempt < self.max_attempts
+                    and time.monotonic() + backoff < deadline
+                    and self.retry_budget.withdraw()
+                )
+                if not retryable:
+                    # A rejected request (validation etc.) neither opens nor closes the circuit
+                    if outcome == "fatal":
+                        breaker.record_neutral()
+                    else:
+                        breaker.record_failure()
+                    logger.error(f"❌ Bedrock {call_type} call failed after {attempt} attempt(s): {e}")
+                    if outcome == "fatal":
+                        raise
+                    raise BedrockUnavailableError(f"Bedrock {call_type} unavailable: {e}") from e
+                self.count(call_type, "retries")
+            finally:
+                self.limiter.release(outcome)
+                if outcome == "success":
+                    breaker.record_success()
+                    self.count(call_type, "success")
+                    self.record_latency(call_type, (time.monotonic() - started) * 1000)
+
+            time.sleep(backoff)
+
+    def invoke(self, call_type: str, body: dict, model_id: str, region: str = AWS_REGION) -> dict:
+        """invoke_model through the limiter/retry/breaker stack; returns the parsed response body."""
+        response = self._call(call_type, region, "invoke_model", body, model_id)
+        return json.loads(response["body"].read())
+
+    def invoke_stream(self, call_type: str, body: dict, model_id: str, region: str = AWS_REGION):
+        """
+        invoke_model_with_response_stream; retries only cover opening the stream.
+        Yields the raw event stream items.
+        """
+        response = self._call(call_type, region, "invoke_model_with_response_stream", body, model_id)
+        for event in response["body"]:
+            yield event
+
+    def metrics(self) -> dict:
+        with self._lock:
+            per_call = {name: stats.snapshot() for name, stats in self.stats.items()}
+            breakers = {name: breaker.state for name, breaker in self.breakers.items()}
+        return {
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "limiter_rejections": self.limiter.rejected,
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            "retry_budget_exhausted": self.retry_budget.exhausted,
+            "breakers": breakers,
+            "calls": per_call,
+        }
+
+
+# Initialize global Bedrock gateway
+bedrock_gateway = BedrockGateway()
@@ -0,0 +1,126 @@
+import io
+import json
+import time
+import hashlib
+import logging
+
+# Local stand-in for the bedrock-runtime client so the chat flow (including
+# streaming) can be exercised without AWS credentials. Enable with BEDROCK_STUB=true.
+
+CANNED_REPLY = (
+    "Thanks for verifying! Here's a breakdown of your **EMI details**:\n\n"
+    "* Your **monthly EMI amount** is **₹12,500.00**.\n\n"
+    "Do you have any other questions about your EMI or loan?"
+)
+
+
+def _last_user_text(body):
+    """Returns the text of the last user message in an Anthropic Messages request body."""
+    for message in reversed(body.get("messages", [])):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        return "".join(block.get("text", "") for block in content if block.get("type") == "text")
+    return ""
+
+
+def prompt_class(body, model_id=""):
+    """
+    Classifies a request into 'embedding', 'intent', 'summary', 'translate' or 'chat'.
+    """
+    if "titan-embed" in model_id or "inputText" in body:
+        return "embedding"
+    prompt = _last_user_text(body).lower()
+    if body.get("max_tokens", 0) <= 10 and "classify" in prompt:
+        return "intent"
+    if "summarize this chat" in prompt or "<current_summary>" in prompt:
+        return "summary"
+    if "translate" in prompt:
+        return "translate"
+    return "chat"
+
+
+def canned_text(body):
+    """
+    Picks a canned completion for a request body, based on the kind of prompt it carries.
+    """
+    prompt = _last_user_text(body).lower()
+    kind = prompt_class(body)
+    if kind == "intent":
+        user_message = prompt.split("user message:")[-1].strip().split("\n")[0]
+        for intent in ("emi", "balance", "loan"):
+            if intent in user_message:
+                return intent
+        return "unclear"
+    if kind == "summary":
+        return (
+            "**Summary**\n- Intent: EMI details\n- User Info: Verified customer\n"
+            "- Bot Response: Shared EMI breakdown\n- Issue: Customer wants to talk to an agent\n"
+            "- Escalation Required: Yes"
+        )
+    if kind == "translate":
+        return prompt.split("text:")[-1].strip(" '\"")
+    return CANNED_REPLY
+
+
+def stub_embedding(text, dimensions=1024):
+    """Deterministic pseudo-embedding derived from the text hash (Titan v2 shape)."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((seed[i % len(seed)] + i) % 256) / 255.0 - 0.5 for i in range(dimensions)]
+
+
+class StubBedrockRuntime:
+    """
+    Implements the subset of the boto3 bedrock-runtime client used in this project:
+    invoke_model and invoke_model_with_response_stream.
+    """
+
+    def __init__(self, delta_delay_ms=40, words_per_delta=3):
+        self.delta_delay = delta_delay_ms / 1000.0
+        self.words_per_delta = words_per_delta
+
+    def invoke_model(self, body, modelId, contentType="application/json", accept="application/json"):
+        request = json.loads(body)
+        if "titan-embed" in modelId:
+            payload = {"embedding": stub_embedding(request.get("inputText", "")),
+                       "inputTextTokenCount": len(request.get("inputText", "").split())}
+        else:
+            text = canned_text(request)
+            payload = {
+                "id": "msg_stub",
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": len(json.dumps(request)) // 4, "output_tokens": len(text) // 4},
+            }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, body, modelId, contentType="application/json", accept="application/json"):
+        request = json.loads(body)
+        text = canned_text(request)
+        return {"body": self._event_stream(text, request)}
+
+    def _event_stream(self, text, request):
+        started = time.time()
+
+        def chunk(event):
+            return {"chunk": {"bytes": json.dumps(event).encode("utf-8")}}
+
+        yield chunk({"type": "message_start", "message": {"id": "msg_stub", "role": "assistant", "content": [],
+                                                           "usage": {"input_tokens": len(json.dumps(request)) // 4}}})
+        yield chunk({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        words = text.split(" ")
+        for i in range(0, len(words), self.words_per_delta):
+            time.sleep(self.delta_delay)
+            piece = " ".join(words[i:i + self.words_per_delta])
+            if i + self.words_per_delta < len(words):
+                piece += " "
+            yield chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}})
+        yield chunk({"type": "content_block_stop", "index": 0})
+        yield chunk({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": len(text) // 4}})
+        yield chunk({"type": "message_stop", "amazon-bedrock-invocationMetrics": {
+            "invocationLatency": int((time.time() - started) * 1000)}})
+        logging.info(f"Stub Bedrock stream finished ({len(text)} chars)")
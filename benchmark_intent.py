@@ -0,0 +1,117 @@
+import re
+import csv
+import time
+import argparse
+import statistics
+
+from intent_classifier import classify_intent, INTENT_PATTERNS, BUTTON_PHRASES
+
+# Compares the current two-stage intent path (regex -> Bedrock) with
+# regex -> local model -> Bedrock (only below the confidence threshold).
+# --matcher only times the rule matcher: one re.search per pattern vs the single-pass scanner.
+
+
+def legacy_classify_intent(message):
+    """The previous classifier: re.search per pattern, first match in priority order wins."""
+    if not message:
+        return "unclear"
+    message = message.lower()
+    for intent in ('agent', 'emi', 'balance', 'loan'):
+        for pattern in INTENT_PATTERNS[intent]:
+            if re.search(pattern, message):
+                return "unclear" if intent == 'agent' else intent
+    for phrase, intent in BUTTON_PHRASES:
+        if phrase in message:
+            return intent
+    return "unclear"
+
+
+def benchmark_matcher(messages, repeat=5):
+    for name, fn in (("legacy re.search loop", legacy_classify_intent), ("single-pass matcher", classify_intent)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for message in messages:
+                fn(message)
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:<28} {best / len(messages) * 1e6:.2f} us/message  ({len(messages) / best:,.0f} messages/s)")
+
+    changed = sum(legacy_classify_intent(m) != classify_intent(m) for m in messages)
+    print(f"label changes vs legacy (score ranking instead of first match): {changed}/{len(messages)}")
+
+
+def bedrock_intent(message):
+    from bedrock_client import get_intent_from_text
+    return get_intent_from_text([{"sender": "user", "message": message}])
+
+
+def two_stage(message, use_bedrock):
+    intent = classify_intent(message)
+    if intent == "unclear" and use_bedrock:
+        return bedrock_intent(message), True
+    return intent, False
+
+
+def three_stage(message, use_bedrock):
+    intent = classify_intent(message)
+    if intent != "unclear":
+        return intent, False
+    from intent_model import intent_model
+    local = intent_model.confident_intent(message)
+    if local:
+        return local, False
+    if use_bedrock:
+        return bedrock_intent(message), True
+    return "unclear", False
+
+
+def run(name, fn, rows, use_bedrock):
+    latencies, correct, llm_calls = [], 0, 0
+    for message, label in rows:
+        started = time.perf_counter()
+        predicted, called_llm = fn(message, use_bedrock)
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += predicted == label
+        llm_calls += called_llm
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    print(f"{name:<28} accuracy={correct / len(rows):.3f}  bedrock_calls={llm_calls:<5} "
+          f"mean={statistics.mean(latencies):.2f}ms  p50={pct(0.5):.2f}ms  p95={pct(0.95):.2f}ms  p99={pct(0.99):.2f}ms")
+
+
+def load_rows(csv_path, limit):
+    if csv_path:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = [(r["message"], r["intent"].strip().lower()) for r in csv.DictReader(f)]
+    else:
+        from train_intent_model import load_labelled_interactions
+        texts, labels = load_labelled_interactions(limit)
+        rows = list(zip(texts, labels))
+    return rows[:limit] if limit else rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark intent classification paths.")
+    parser.add_argument("--csv", help="CSV with 'message' and 'intent' columns (defaults to client_interaction rows)")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--bedrock", action="store_true", help="Actually call Bedrock for the LLM stage")
+    parser.add_argument("--matcher", action="store_true", help="Only micro-benchmark the rule matcher")
+    args = parser.parse_args()
+
+    rows = load_rows(args.csv, args.limit)
+    if args.matcher:
+        print(f"Rule matcher over {len(rows)} messages")
+        benchmark_matcher([message for message, _ in rows])
+        raise SystemExit(0)
+
+    print(f"Benchmarking {len(rows)} labelled messages (Bedrock {'on' if args.bedrock else 'off'})")
+    run("regex -> bedrock", two_stage, rows, args.bedrock)
+    run("regex -> local -> bedrock", three_stage, rows, args.bedrock)
+
+    from intent_model import intent_model
+    messages = [message for message, _ in rows]
+    started = time.perf_counter()
+    intent_model.predict_batch(messages)
+    elapsed = time.perf_counter() - started
+    print(f"local model batch inference: {len(messages) / elapsed:,.0f} messages/s")
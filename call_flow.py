@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+from flask import g, has_request_context
+from twilio.twiml.voice_response import VoiceResponse, Gather
+
+from session_manager import session_manager
+from voice_prompts import voice_prompts, LANG_CONFIG
+from config import CALL_FLOW_MERGE_STAGES, CALL_TRACE_MAX_CALLS, CALL_TRACE_TTL
+
+logger = logging.getLogger(__name__)
+
+RECENT_TRACES_KEY = "call_traces:recent"  # sorted set of CallSids by last webhook time
+
+# The outbound collections call after language selection. A stage says its prompts (keys
+# of voice_prompts.VOICE_PROMPTS; numbers are pauses in seconds), then either
+#   - continues into `next` without waiting on the caller,
+#   - <Gather>s the caller's answer for `gather['action']`, saying `no_input` and hanging
+#     up if none comes, or
+#   - hangs up.
+# Stages with a `path` can also be requested as a webhook on their own.
+CALL_FLOW = {
+    "confirm_identity": {
+        "path": "/voice-confirm-identity",
+        "gather": {"input": "speech", "timeout": "5", "action": "/voice-handle-identity-confirmation",
+                   "say": ["confirm_identity"]},
+        "no_input": ["confirm_identity_no_input"],
+    },
+    "identity_unclear": {"say": ["identity_unclear"], "next": "confirm_identity"},
+    "identity_not_confirmed": {"say": ["identity_not_confirmed"], "hangup": True},
+    "emi_details": {
+        "path": "/voice-emi-details",
+        "say": ["emi_details", 1, "emi_reassurance"],
+        "next": "explain_impact",
+    },
+    "explain_impact": {
+        "path": "/voice-explain-impact",
+        "say": ["impact_credit_bureau", 2, "impact_delinquency"],
+        "next": "offer_support",
+    },
+    "offer_support": {
+        "path": "/voice-offer-support",
+        "say": ["offer_support"],
+        "gather": {"input": "speech", "timeout": "7", "action": "/voice-handle-support-choice"},
+        "no_input": ["offer_support_no_input"],
+    },
+    "support_declined": {"say": ["support_declined"], "hangup": True},
+}
+
+
+def _prompt_slots(task_details: Dict) -> Dict:
+    return {
+        "customer_name": task_details.get("customer_name", "Valued Customer"),
+        "loan_last4": task_details.get("loan_last4", "XXXX"),
+        "emi_amount": task_details.get("emi_amount", "a certain amount"),
+        "due_date": task_details.get("due_date", "a recent date"),
+    }
+
+
+class CallTraceLog:
+    """
+    Per-call record of the voice webhooks Twilio made (endpoint, server time and the
+    stages each response contained), keyed by CallSid. Kept in Redis (call_trace:{sid},
+    a list with one JSON entry per webhook) so a call served by several workers has one
+    trace; the most recent CALL_TRACE_MAX_CALLS calls are indexed for stats.
+    """
+
+    def __init__(self, redis_client=None, max_calls=CALL_TRACE_MAX_CALLS, ttl=CALL_TRACE_TTL):
+        self.redis = redis_client or session_manager.redis_client
+        self.max_calls = max_calls
+        self.ttl = ttl
+
+    def record(self, call_sid: str, task_id: str, webhook: str, server_ms: float, stages: List[str],
+               merge_stages: bool = None):
+        entry = {"webhook": webhook, "ms": round(server_ms, 1), "stages": stages,
+                 "task_id": task_id, "merge_stages": merge_stages}
+        try:
+            pipe = self.redis.pipeline()
+            pipe.rpush(f"call_trace:{call_sid}", json.dumps(entry))
+            pipe.expire(f"call_trace:{call_sid}", self.ttl)
+            pipe.setex(f"call_trace:task:{task_id}", self.ttl, call_sid)
+            pipe.zadd(RECENT_TRACES_KEY, {call_sid: time.time()})
+            pipe.zremrangebyrank(RECENT_TRACES_KEY, 0, -self.max_calls - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record call trace for {call_sid}: {e}")
+
+    def get(self, call_sid: str) -> Optional[Dict]:
+        entries = [json.loads(entry) for entry in self.redis.lrange(f"call_trace:{call_sid}", 0, -1)]
+        if not entries:
+            return None
+        return {
+            "call_sid": call_sid,
+            "task_id": entries[0]["task_id"],
+            "merge_stages": entries[0]["merge_stages"],
+            "webhooks": [{k: entry[k] for k in ("webhook", "ms", "stages")} for entry in entries],
+            "webhook_count": len(entries),
+            "server_ms": round(sum(entry["ms"] for entry in entries), 1),
+        }
+
+    def for_task(self, task_id: str) -> Optional[Dict]:
+        """The trace of the most recent call for a task."""
+        call_sid = self.redis.get(f"call_trace:task:{task_id}")
+        return self.get(call_sid) if call_sid else None
+
+    def stats(self) -> Dict:
+        traces = [trace for trace in (self.get(sid) for sid in self.redis.zrange(RECENT_TRACES_KEY, 0, -1)) if trace]
+        if not traces:
+            return {"calls": 0, "webhooks_per_call": 0, "server_ms_per_call": 0}
+        return {
+            "calls": len(traces),
+            "webhooks_per_call": round(sum(t["webhook_count"] for t in traces) / len(traces), 2),
+            "server_ms_per_call": round(sum(t["server_ms"] for t in traces) / len(traces), 1),
+        }
+
+
+class CallFlow:
+    """
+    Renders CALL_FLOW stages to TwiML. Stages that don't wait on the caller are rendered
+    into the same response as the stage before them, so Twilio only comes back to the
+    server at a <Gather> (or once the call is handed off). With merge_stages off every
+    `next` becomes a <Redirect> to that stage's path, one webhook per stage, as the flow
+    used to run.
+    """
+
+    def __init__(self, flow=CALL_FLOW, base_url=None, merge_stages=CALL_FLOW_MERGE_STAGES):
+        self.flow = dict(flow)
+        self.base_url = base_url if base_url is not None else os.getenv('NGROK_URL')
+        self.merge_stages = merge_stages
+        self.renderers: Dict[str, Callable] = {}
+        self.traces = CallTraceLog()
+
+    def stage(self, name: str, path: str = None):
+        """
+        Registers a stage rendered by Python code instead of a CALL_FLOW entry, for stages
+        with side effects (e.g. handing the call to an agent). The function is called as
+        fn(task_id, task_details, lang_info, response, **params) and adds its TwiML to
+        `response`.
+        """
+        def decorator(fn):
+            self.flow[name] = {"path": path}
+            self.renderers[name] = fn
+            return fn
+        return decorator
+
+    def url(self, path: str, task_id: str, **params) -> str:
+        return f"{self.base_url}{path}?{urlencode({'task_id': task_id, **params})}"
+
+    def respond(self, stage: str, task_id: str, task_details: Dict, response: VoiceResponse = None,
+                **params) -> VoiceResponse:
+        """
+        Renders `stage` and, if merging, every non-interactive stage after it.
+
+        Args:
+            stage (str): Stage name in the flow
+            task_id (str): The call task
+            task_details (dict): The task, including 'current_language'
+            response (VoiceResponse): Response to append to (a new one if omitted)
+            **params: Extra values for a registered stage (e.g. outcome)
+
+        Returns:
+            VoiceResponse: The TwiML for this webhook
+        """
+        response = response if response is not None else VoiceResponse()
+        lang_key = task_details.get('current_language', '1')
+        lang_info = LANG_CONFIG.get(lang_key, LANG_CONFIG['1'])
+        slots = _prompt_slots(task_details)
+        rendered = []
+
+        while stage:
+            rendered.append(stage)
+            if stage in self.renderers:
+                self.renderers[stage](task_id, task_details, lang_info, response, **params)
+                break
+            spec = self.flow[stage]
+            self._say(response, spec.get("say", []), lang_key, lang_info, slots)
+            if "gather" in spec:
+                gather_spec = spec["gather"]
+                gather = Gather(input=gather_spec["input"], timeout=gather_spec["timeout"],
+                                action=self.url(gather_spec["action"], task_id), method="POST")
+                self._say(gather, gather_spec.get("say", []), lang_key, lang_info, slots)
+                response.append(gather)
+                self._say(response, spec.get("no_input", []), lang_key, lang_info, slots)
+                response.hangup()
+                break
+            if spec.get("hangup"):
+                response.hangup()
+                break
+            stage = spec.get("next")
+            if stage and not self.merge_stages:
+                response.redirect(self.url(self.flow[stage]["path"], task_id))
+                break
+
+        if has_request_context():
+            g.call_flow_stages = getattr(g, 'call_flow_stages', []) + rendered
+        return response
+
+    def go(self, stage: str, task_id: str, task_details: Dict, response: VoiceResponse = None,
+           **params) -> VoiceResponse:
+        """
+        Moves the call to `stage` from a webhook handler: rendered in place when merging,
+        otherwise a <Redirect> to the stage's own webhook.
+        """
+        response = response if response is not None else VoiceResponse()
+        path = self.flow[stage].get("path")
+        if self.merge_stages or not path:
+            return self.respond(stage, task_id, task_details, response, **params)
+        response.redirect(self.url(path, task_id, **params))
+        return response
+
+    def _say(self, verb, steps, lang_key, lang_info, slots):
+        for step in steps:
+            if isinstance(step, (int, float)):
+                verb.pause(length=step)
+            else:
+                verb.say(voice_prompts.render(step, lang_key, **slots),
+                         voice=lang_info['voice'], language=lang_info['code'])
+
+    def record_webhook(self, call_sid: str, task_id: str, webhook: str, started: float):
+        """Adds the current webhook (timed from `started`, a perf_counter value) to the call's trace."""
+        server_ms = (time.perf_counter() - started) * 1000
+        stages = getattr(g, 'call_flow_stages', []) if has_request_context() else []
+        self.traces.record(call_sid or task_id, task_id, webhook, server_ms, stages, self.merge_stages)
+
+    def stats(self) -> Dict:
+        return {"merge_stages": self.merge_stages, **self.traces.stats()}
+
+
+# Initialize global call flow
+call_flow = CallFlow()
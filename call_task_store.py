@@ -0,0 +1,155 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from session_manager import session_manager
+from config import CALL_TASK_TTL, TASK_TRANSITION_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+STATUS_INDEX_PREFIX = "call_tasks:status:"  # one set of task ids per status
+
+
+class CallTaskStore:
+    """
+    Outbound call tasks in Redis, so any worker can serve any TwiML callback and campaign
+    state survives a restart. Each task is a hash (call_task:{task_id}) that expires
+    CALL_TASK_TTL after its last write, and its id is kept in the set for its current
+    status. Index entries whose hash has expired are dropped when the index is read.
+    """
+
+    def __init__(self, redis_client=None, ttl=CALL_TASK_TTL):
+        self.redis = redis_client or session_manager.redis_client
+        self.ttl = ttl
+
+    def _key(self, task_id: str) -> str:
+        return f"call_task:{task_id}"
+
+    def _status_key(self, status: str) -> str:
+        return f"{STATUS_INDEX_PREFIX}{status}"
+
+    @staticmethod
+    def _encode(fields: Dict) -> Dict:
+        # Hash values are strings; None means "not set" and is left out
+        return {name: str(value) for name, value in fields.items() if value is not None}
+
+    def put(self, task_id: str, details: Dict):
+        """
+        Stores a task, replacing any previous state for the same id.
+
+        Args:
+            task_id (str): CollectionTask id
+            details (dict): Task fields (customer, loan, EMI, status, current_language, ...)
+        """
+        task_id = str(task_id)
+        key = self._key(task_id)
+        details = {**details, 'task_id': task_id, 'status': details.get('status') or 'pending'}
+
+        def apply(pipe):
+            old_status = pipe.hget(key, 'status')
+            pipe.multi()
+            if old_status:
+                pipe.srem(self._status_key(old_status), task_id)
+            pipe.delete(key)
+            pipe.hset(key, mapping=self._encode(details))
+            pipe.expire(key, self.ttl)
+            pipe.sadd(self._status_key(details['status']), task_id)
+            pipe.expire(self._status_key(details['status']), self.ttl)
+
+        self.redis.transaction(apply, key)
+
+    def put_many(self, tasks: List[Dict], batch_size: int = TASK_TRANSITION_BATCH_SIZE):
+        """Stores many tasks (each with 'task_id') as put() does, one transaction per batch."""
+        for start in range(0, len(tasks), batch_size):
+            batch = [{**task, 'task_id': str(task['task_id']), 'status': task.get('status') or 'pending'}
+                     for task in tasks[start:start + batch_size]]
+            keys = [self._key(task['task_id']) for task in batch]
+
+            def apply(pipe):
+                # The keys are already WATCHed, so reading them in one round trip elsewhere is safe
+                reads = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    reads.hget(key, 'status')
+                old_statuses = reads.execute()
+                pipe.multi()
+                for key, task, old_status in zip(keys, batch, old_statuses):
+                    if old_status:
+                        pipe.srem(self._status_key(old_status), task['task_id'])
+                    pipe.delete(key)
+                    pipe.hset(key, mapping=self._encode(task))
+                    pipe.expire(key, self.ttl)
+                    pipe.sadd(self._status_key(task['status']), task['task_id'])
+                for status in {task['status'] for task in batch}:
+                    pipe.expire(self._status_key(status), self.ttl)
+
+            self.redis.transaction(apply, *keys)
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        details = self.redis.hgetall(self._key(str(task_id)))
+        return details or None
+
+    def exists(self, task_id: str) -> bool:
+        return bool(task_id) and bool(self.redis.exists(self._key(str(task_id))))
+
+    def update(self, task_id: str, **fields) -> bool:
+        """
+        Updates some fields of a task, moving it between status indexes if 'status' changes.
+
+        Returns:
+            bool: False if the task does not exist (or has expired)
+        """
+        task_id = str(task_id)
+        key = self._key(task_id)
+
+        def apply(pipe):
+            if not pipe.exists(key):
+                return False
+            old_status = pipe.hget(key, 'status')
+            pipe.multi()
+            pipe.hset(key, mapping=self._encode(fields))
+            pipe.expire(key, self.ttl)
+            new_status = fields.get('status')
+            if new_status and new_status != old_status:
+                if old_status:
+                    pipe.srem(self._status_key(old_status), task_id)
+                pipe.sadd(self._status_key(new_status), task_id)
+                pipe.expire(self._status_key(new_status), self.ttl)
+            return True
+
+        # Retried if another worker changes the task between the read and the write
+        return self.redis.transaction(apply, key, value_from_callable=True)
+
+    def set_status(self, task_id: str, status: str, **fields) -> bool:
+        return self.update(task_id, status=status, timestamp=datetime.now().isoformat(), **fields)
+
+    def ids_with_status(self, status: str) -> List[str]:
+        task_ids = sorted(self.redis.smembers(self._status_key(status)))
+        if not task_ids:
+            return []
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.exists(self._key(task_id))
+        alive = pipe.execute()
+        expired = [task_id for task_id, exists in zip(task_ids, alive) if not exists]
+        if expired:
+            self.redis.srem(self._status_key(status), *expired)
+        return [task_id for task_id, exists in zip(task_ids, alive) if exists]
+
+    def with_status(self, status: str) -> List[Dict]:
+        """Every live task currently in `status`."""
+        task_ids = self.ids_with_status(status)
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.hgetall(self._key(task_id))
+        return [details for details in pipe.execute() if details]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks per status (index sizes; may include a few expired tasks)."""
+        counts = {}
+        for key in self.redis.scan_iter(match=f"{STATUS_INDEX_PREFIX}*", count=100):
+            counts[key[len(STATUS_INDEX_PREFIX):]] = self.redis.scard(key)
+        return counts
+
+
+# Initialize global call task store
+call_task_store = CallTaskStore()
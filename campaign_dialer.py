@@ -0,0 +1,456 @@
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from session_manager import session_manager
+from call_task_store import call_task_store
+from predictive_pacer import predictive_pacer
+from config import (
+    CAMPAIGN_MAX_CONCURRENT_CALLS, CAMPAIGN_CALLS_PER_SECOND, CAMPAIGN_POLL_SECONDS,
+    CAMPAIGN_CALL_TIMEOUT_SECONDS, CAMPAIGN_TTL, CAMPAIGN_PACING, PACING_AGENTS,
+    PACING_HANDLE_SECONDS, PACING_TIME_TO_HANDOFF_SECONDS, PACING_TIMING_ALPHA
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_KEY = "campaign:active"    # id of the campaign that is running or paused
+LEADER_KEY = "campaign:dialer"    # the worker currently allowed to dial
+TIMING_KEY = "pacing:timing"      # learned handle_seconds and time_to_handoff, shared by campaigns
+
+ACTIVE_STATUSES = ('running', 'paused')
+# Twilio CallStatus values for a call that has ended
+ENDED_CALL_STATUSES = ('completed', 'busy', 'no-answer', 'failed', 'canceled')
+
+
+class CampaignAlreadyActive(Exception):
+    """Another campaign is still running or paused."""
+
+    def __init__(self, campaign_id: str):
+        super().__init__(f"Campaign {campaign_id} is still active")
+        self.campaign_id = campaign_id
+
+
+def _start_thread(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+class CampaignDialer:
+    """
+    Places a campaign's outbound calls in the background, so /start-campaign returns
+    straight away.
+
+    Campaign state lives in Redis: counters and settings in the campaign:{id} hash, task
+    ids still to dial in campaign:{id}:pending and calls in progress in the
+    campaign:{id}:in_flight sorted set (scored by dial time). One worker at a time holds
+    the dialer lease. It starts a call when fewer than max_concurrent are in flight, at
+    most calls_per_second per second. A call's slot is freed by its Twilio status
+    callback, or after CAMPAIGN_CALL_TIMEOUT_SECONDS if that never arrives. Progress
+    goes to the registered listeners (app.py pushes it over Socket.IO).
+
+    With predictive pacing, a call is also held back until predictive_pacer expects its
+    handoff to find a free agent. Each dialed call's handoff probability is kept in
+    campaign:{id}:handoff_p until it reaches an agent or ends, and agents on a handed-off
+    call in campaign:{id}:agents_busy (scored by handoff time).
+    """
+
+    def __init__(self, redis_client=None, poll_seconds=CAMPAIGN_POLL_SECONDS,
+                 call_timeout_seconds=CAMPAIGN_CALL_TIMEOUT_SECONDS, ttl=CAMPAIGN_TTL):
+        self.redis = redis_client or session_manager.redis_client
+        self.poll_seconds = poll_seconds
+        self.call_timeout_seconds = call_timeout_seconds
+        self.ttl = ttl
+        self.worker_id = str(uuid.uuid4())
+        self._listeners = []
+        self._dial = None
+        self._release = None
+        self._spawn = _start_thread
+        self._sleep = time.sleep
+        self._started = False
+        self._next_dial_at = 0.0
+
+    # --- Public API ---
+
+    def start(self, dial: Callable[[str, Dict], str], spawn=_start_thread, sleep=time.sleep,
+              release: Callable[[List[str]], None] = None):
+        """
+        Starts the dialer loop.
+
+        Args:
+            dial (callable): dial(task_id, task_details) places the call and returns its SID
+            spawn (callable): Runs a function in the background (socketio.start_background_task)
+            sleep (callable): Sleep that cooperates with spawn (socketio.sleep)
+            release (callable): release(task_ids) is given the tasks a cancelled campaign never dialed
+        """
+        if self._started:
+            return
+        self._started = True
+        self._dial = dial
+        self._release = release
+        self._spawn = spawn
+        self._sleep = sleep
+        spawn(self._run)
+        logger.info("✅ Campaign dialer started")
+
+    def add_progress_listener(self, callback) -> None:
+        """Register a callback(status) invoked whenever a campaign's progress changes."""
+        self._listeners.append(callback)
+
+    def create(self, tasks: List[Dict], max_concurrent: int = CAMPAIGN_MAX_CONCURRENT_CALLS,
+               calls_per_second: float = CAMPAIGN_CALLS_PER_SECOND, pacing: str = CAMPAIGN_PACING,
+               agents: int = PACING_AGENTS) -> str:
+        """
+        Queues a campaign for dialing. The tasks must already be in the call task store.
+
+        Args:
+            tasks (list): Call tasks in dialing order (each with 'task_id')
+            max_concurrent (int): Most calls in progress at once
+            calls_per_second (float): Most calls started per second
+            pacing (str): 'predictive' to pace calls to the agents' capacity, 'fixed' for only the limits above
+            agents (int): Agents taking this campaign's handoffs
+
+        Returns:
+            str: The campaign id
+
+        Raises:
+            CampaignAlreadyActive: if another campaign is running or paused
+        """
+        campaign_id = str(uuid.uuid4())
+        if not self.redis.set(ACTIVE_KEY, campaign_id, nx=True):
+            existing = self.redis.get(ACTIVE_KEY)
+            if existing and self._field(existing, 'status') in ACTIVE_STATUSES:
+                raise CampaignAlreadyActive(existing)
+            self.redis.set(ACTIVE_KEY, campaign_id)
+
+        now = datetime.now().isoformat()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(campaign_id), mapping={
+            'campaign_id': campaign_id,
+            'status': 'running',
+            'total': len(tasks),
+            'dialed': 0,
+            'dial_failed': 0,
+            'answered': 0,
+            'unanswered': 0,
+            'max_concurrent': max(1, int(max_concurrent)),
+            'calls_per_second': max(0.01, float(calls_per_second)),
+            'pacing': 'fixed' if pacing == 'fixed' else 'predictive',
+            'agents': max(1, int(agents)),
+            'handoffs': 0,
+            'abandoned_handoffs': 0,
+            'agent_busy_seconds': 0,
+            'created_at': now,
+            'updated_at': now,
+        })
+        pipe.expire(self._key(campaign_id), self.ttl)
+        if tasks:
+            pipe.rpush(self._pending_key(campaign_id), *[task['task_id'] for task in tasks])
+            pipe.expire(self._pending_key(campaign_id), self.ttl)
+        pipe.execute()
+        logger.info(f"📞 Campaign {campaign_id} queued with {len(tasks)} calls "
+                    f"(max {max_concurrent} concurrent, {calls_per_second}/s, {pacing} pacing)")
+        self._notify(campaign_id)
+        return campaign_id
+
+    def status(self, campaign_id: str) -> Optional[Dict]:
+        """Campaign settings, counters and how many calls are pending and in flight."""
+        campaign = self.redis.hgetall(self._key(campaign_id))
+        if not campaign:
+            return None
+        for field in ('total', 'dialed', 'dial_failed', 'answered', 'unanswered', 'max_concurrent',
+                      'handoffs', 'abandoned_handoffs'):
+            campaign[field] = int(campaign.get(field, 0))
+        campaign['calls_per_second'] = float(campaign['calls_per_second'])
+        campaign['pacing'] = campaign.get('pacing', 'fixed')
+        campaign['agents'] = int(campaign.get('agents', PACING_AGENTS))
+        campaign['pending'] = self.redis.llen(self._pending_key(campaign_id))
+        campaign['in_flight'] = self.redis.zcard(self._in_flight_key(campaign_id))
+        campaign['agents_busy'] = self.redis.zcard(self._agents_busy_key(campaign_id))
+
+        # Share of the agents' time spent on handed-off calls since the campaign started
+        busy_seconds = float(campaign.pop('agent_busy_seconds', 0))
+        busy_seconds += sum(time.time() - started for _, started in
+                            self.redis.zrange(self._agents_busy_key(campaign_id), 0, -1, withscores=True))
+        ended_at = datetime.now() if campaign['status'] in ACTIVE_STATUSES else datetime.fromisoformat(campaign['updated_at'])
+        elapsed = (ended_at - datetime.fromisoformat(campaign['created_at'])).total_seconds()
+        campaign['agent_utilization'] = round(min(1.0, busy_seconds / (elapsed * campaign['agents'])), 3) if elapsed > 0 else 0.0
+        return campaign
+
+    def active(self) -> Optional[Dict]:
+        """Status of the campaign that is running or paused, or None."""
+        campaign_id = self.redis.get(ACTIVE_KEY)
+        campaign = self.status(campaign_id) if campaign_id else None
+        return campaign if campaign and campaign['status'] in ACTIVE_STATUSES else None
+
+    def pause(self, campaign_id: str) -> bool:
+        """Stops starting new calls; calls in progress carry on."""
+        return self._transition(campaign_id, 'paused', from_statuses=('running',))
+
+    def resume(self, campaign_id: str) -> bool:
+        return self._transition(campaign_id, 'running', from_statuses=('paused',))
+
+    def cancel(self, campaign_id: str) -> bool:
+        """Drops the calls not yet dialed (handing their tasks to `release`); calls in progress carry on."""
+        if not self._transition(campaign_id, 'cancelled', from_statuses=ACTIVE_STATUSES):
+            return False
+        pipe = self.redis.pipeline()
+        pipe.lrange(self._pending_key(campaign_id), 0, -1)
+        pipe.delete(self._pending_key(campaign_id))
+        dropped = pipe.execute()[0]
+        self._release_active(campaign_id)
+        if dropped and self._release:
+            try:
+                self._release(dropped)
+            except Exception as e:
+                logger.error(f"❌ Campaign {campaign_id}: could not release {len(dropped)} undialed tasks: {e}")
+        return True
+
+    def record_call_status(self, campaign_id: str, task_id: str, call_status: str) -> bool:
+        """
+        Applies a Twilio call status callback. An ended call frees its slot; an answered one
+        is more likely to reach an agent, which predictive pacing takes into account.
+
+        Returns:
+            bool: True if this ended a call the campaign was waiting on
+        """
+        if call_status == 'in-progress':
+            self._mark_answered(campaign_id, task_id)
+            return False
+        if call_status not in ENDED_CALL_STATUSES:
+            return False
+        if not self.redis.zrem(self._in_flight_key(campaign_id), task_id):
+            return False
+        self.redis.hincrby(self._key(campaign_id), 'answered' if call_status == 'completed' else 'unanswered', 1)
+        self.redis.hdel(self._handoff_p_key(campaign_id), task_id)
+        self._free_agent(campaign_id, task_id)
+        self._notify(campaign_id)
+        return True
+
+    def record_handoff(self, campaign_id: Optional[str], task_id: str) -> bool:
+        """
+        Records that a campaign call is being handed to an agent. If every agent is already
+        on a call, the handoff counts as abandoned.
+
+        Returns:
+            bool: True if an agent was free
+        """
+        if not campaign_id:
+            return False
+        dialed_at = self.redis.zscore(self._in_flight_key(campaign_id), task_id)
+        if dialed_at is None:
+            return False
+        self.redis.hdel(self._handoff_p_key(campaign_id), task_id)
+        self._learn('time_to_handoff', time.time() - dialed_at)
+        self.redis.hincrby(self._key(campaign_id), 'handoffs', 1)
+
+        agents = int(self._field(campaign_id, 'agents') or PACING_AGENTS)
+        if self.redis.zcard(self._agents_busy_key(campaign_id)) >= agents:
+            self.redis.hincrby(self._key(campaign_id), 'abandoned_handoffs', 1)
+            logger.warning(f"⚠️ Campaign {campaign_id}: no free agent for task {task_id}")
+            self._notify(campaign_id)
+            return False
+        self.redis.zadd(self._agents_busy_key(campaign_id), {task_id: time.time()})
+        self.redis.expire(self._agents_busy_key(campaign_id), self.ttl)
+        self._notify(campaign_id)
+        return True
+
+    def timing(self) -> Dict[str, float]:
+        """Learned average agent handle time and time from dialing to handoff, in seconds."""
+        timing = self.redis.hgetall(TIMING_KEY)
+        return {
+            'handle_seconds': float(timing.get('handle_seconds', PACING_HANDLE_SECONDS)),
+            'time_to_handoff': float(timing.get('time_to_handoff', PACING_TIME_TO_HANDOFF_SECONDS)),
+        }
+
+    # --- Dialer loop ---
+
+    def _run(self):
+        while True:
+            try:
+                if not self._hold_lease():
+                    self._sleep(self.poll_seconds)
+                    continue
+                self._sleep(self._tick())
+            except Exception as e:
+                logger.error(f"❌ Campaign dialer error: {e}")
+                self._sleep(self.poll_seconds)
+
+    def _tick(self) -> float:
+        """Dials at most one call; returns how long to wait before the next tick."""
+        campaign_id = self.redis.get(ACTIVE_KEY)
+        campaign = self.status(campaign_id) if campaign_id else None
+        if not campaign or campaign['status'] != 'running':
+            return self.poll_seconds
+
+        self._expire_stalled_calls(campaign_id)
+        if campaign['pending'] == 0:
+            if campaign['in_flight'] == 0:
+                self._transition(campaign_id, 'completed', from_statuses=('running',))
+                self._release_active(campaign_id)
+            return self.poll_seconds
+
+        wait = self._dial_wait(campaign)
+        if wait > 0:
+            return wait
+
+        handoff_p = None
+        if campaign['pacing'] == 'predictive':
+            handoff_p = self._next_handoff_probability(campaign_id)
+            if not self._agents_can_take(campaign_id, campaign, handoff_p):
+                return self.poll_seconds
+
+        task_id = self.redis.lpop(self._pending_key(campaign_id))
+        if not task_id:
+            return 0
+        # The slot is taken before the call is placed, so concurrency never overshoots
+        self.redis.zadd(self._in_flight_key(campaign_id), {task_id: time.time()})
+        self.redis.expire(self._in_flight_key(campaign_id), self.ttl)
+        if handoff_p is not None:
+            self.redis.hset(self._handoff_p_key(campaign_id), task_id, handoff_p)
+            self.redis.expire(self._handoff_p_key(campaign_id), self.ttl)
+        self._next_dial_at = time.time() + 1.0 / campaign['calls_per_second']
+        self._spawn(self._place_call, campaign_id, task_id)
+        return 0
+
+    def _dial_wait(self, campaign: Dict) -> float:
+        """Seconds until another call may be started (0 if one may start now)."""
+        if campaign['in_flight'] >= campaign['max_concurrent']:
+            return self.poll_seconds
+        return max(0.0, min(self._next_dial_at - time.time(), self.poll_seconds))
+
+    def _next_handoff_probability(self, campaign_id: str) -> float:
+        """Chance that the next pending call ends up with an agent, from its risk segment and the hour."""
+        task_id = self.redis.lindex(self._pending_key(campaign_id), 0)
+        task = call_task_store.get(task_id) if task_id else None
+        return predictive_pacer.handoff_probability((task or {}).get('risk_segment'))
+
+    def _mark_answered(self, campaign_id: str, task_id: str):
+        if not self.redis.hexists(self._handoff_p_key(campaign_id), task_id):
+            return
+        task = call_task_store.get(task_id) or {}
+        handoff_p = predictive_pacer.handoff_probability(task.get('risk_segment'), answered=True)
+        self.redis.hset(self._handoff_p_key(campaign_id), task_id, handoff_p)
+
+    def _agents_can_take(self, campaign_id: str, campaign: Dict, handoff_p: float) -> bool:
+        """Whether the agents are expected to have room for one more call's handoff."""
+        now = time.time()
+        dialed_at = dict(self.redis.zrange(self._in_flight_key(campaign_id), 0, -1, withscores=True))
+        in_flight = [(float(p), now - dialed_at[task_id])
+                     for task_id, p in self.redis.hgetall(self._handoff_p_key(campaign_id)).items()
+                     if task_id in dialed_at]
+        decision = predictive_pacer.assess(in_flight, handoff_p, campaign['agents_busy'],
+                                           agents=campaign['agents'], **self.timing())
+        if not decision['may_dial']:
+            logger.debug(f"Campaign {campaign_id}: holding dial, expected abandon rate {decision['abandon_rate']}")
+        return decision['may_dial']
+
+    def _place_call(self, campaign_id: str, task_id: str):
+        task = call_task_store.get(task_id)
+        try:
+            if not task:
+                raise LookupError(f"call task {task_id} not found")
+            call_task_store.update(task_id, campaign_id=campaign_id)
+            call_sid = self._dial(task_id, {**task, 'campaign_id': campaign_id})
+            self.redis.hincrby(self._key(campaign_id), 'dialed', 1)
+            logger.info(f"✅ Campaign {campaign_id}: called task {task_id}. Call SID: {call_sid}")
+        except Exception as e:
+            self.redis.zrem(self._in_flight_key(campaign_id), task_id)
+            self.redis.hdel(self._handoff_p_key(campaign_id), task_id)
+            self.redis.hincrby(self._key(campaign_id), 'dial_failed', 1)
+            call_task_store.set_status(task_id, 'failed', call_outcome_notes=f"Dial_Failed: {e}")
+            logger.error(f"❌ Campaign {campaign_id}: could not call task {task_id}: {e}")
+        self._notify(campaign_id)
+
+    def _expire_stalled_calls(self, campaign_id: str):
+        """Frees slots of calls whose status callback never arrived."""
+        cutoff = time.time() - self.call_timeout_seconds
+        stalled = self.redis.zrangebyscore(self._in_flight_key(campaign_id), 0, cutoff)
+        for task_id in stalled:
+            if self.redis.zrem(self._in_flight_key(campaign_id), task_id):
+                logger.warning(f"⚠️ Campaign {campaign_id}: no status callback for task {task_id}; freeing its slot")
+                self.redis.hincrby(self._key(campaign_id), 'unanswered', 1)
+                self.redis.hdel(self._handoff_p_key(campaign_id), task_id)
+                self.redis.zrem(self._agents_busy_key(campaign_id), task_id)
+        if stalled:
+            self._notify(campaign_id)
+
+    def _hold_lease(self) -> bool:
+        lease = max(5, int(self.poll_seconds * 10))
+        if self.redis.set(LEADER_KEY, self.worker_id, nx=True, ex=lease):
+            return True
+        if self.redis.get(LEADER_KEY) == self.worker_id:
+            self.redis.expire(LEADER_KEY, lease)
+            return True
+        return False
+
+    # --- State ---
+
+    def _key(self, campaign_id: str) -> str:
+        return f"campaign:{campaign_id}"
+
+    def _pending_key(self, campaign_id: str) -> str:
+        return f"campaign:{campaign_id}:pending"
+
+    def _in_flight_key(self, campaign_id: str) -> str:
+        return f"campaign:{campaign_id}:in_flight"
+
+    def _handoff_p_key(self, campaign_id: str) -> str:
+        return f"campaign:{campaign_id}:handoff_p"
+
+    def _agents_busy_key(self, campaign_id: str) -> str:
+        return f"campaign:{campaign_id}:agents_busy"
+
+    def _free_agent(self, campaign_id: str, task_id: str):
+        """Ends the agent's handoff for a call, adding its length to the campaign and the learned handle time."""
+        handed_off_at = self.redis.zscore(self._agents_busy_key(campaign_id), task_id)
+        if handed_off_at is None or not self.redis.zrem(self._agents_busy_key(campaign_id), task_id):
+            return
+        handle_seconds = time.time() - handed_off_at
+        self.redis.hincrbyfloat(self._key(campaign_id), 'agent_busy_seconds', handle_seconds)
+        self._learn('handle_seconds', handle_seconds)
+
+    def _learn(self, field: str, seconds: float):
+        """Moves a learned time toward a new observation (exponentially weighted average)."""
+        current = self.timing()[field]
+        self.redis.hset(TIMING_KEY, field, round(current + PACING_TIMING_ALPHA * (seconds - current), 2))
+
+    def _field(self, campaign_id: str, field: str) -> Optional[str]:
+        return self.redis.hget(self._key(campaign_id), field)
+
+    def _transition(self, campaign_id: str, status: str, from_statuses: Tuple[str, ...]) -> bool:
+        key = self._key(campaign_id)
+
+        def apply(pipe):
+            if pipe.hget(key, 'status') not in from_statuses:
+                return False
+            pipe.multi()
+            pipe.hset(key, mapping={'status': status, 'updated_at': datetime.now().isoformat()})
+            return True
+
+        changed = self.redis.transaction(apply, key, value_from_callable=True)
+        if changed:
+            logger.info(f"Campaign {campaign_id} {status}")
+            self._notify(campaign_id)
+        return changed
+
+    def _release_active(self, campaign_id: str):
+        if self.redis.get(ACTIVE_KEY) == campaign_id:
+            self.redis.delete(ACTIVE_KEY)
+
+    def _notify(self, campaign_id: str):
+        if not self._listeners:
+            return
+        status = self.status(campaign_id)
+        if not status:
+            return
+        for callback in self._listeners:
+            try:
+                callback(status)
+            except Exception as e:
+                logger.warning(f"⚠️ Campaign progress listener failed: {e}")
+
+
+# Initialize global campaign dialer (started by app.py / final2.py)
+campaign_dialer = CampaignDialer()
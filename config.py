@@ -20,6 +20,8 @@ TWILIO_CONVERSATIONS_SERVICE_SID = os.getenv("TWILIO_CONVERSATIONS_SERVICE_SID")
 TWILIO_PHONE = os.getenv("TWILIO_PHONE")
 TWILIO_TASK_ROUTER_WORKSPACE_SID = os.getenv("TWILIO_TASK_ROUTER_WORKSPACE_SID")
 TWILIO_TASK_ROUTER_WORKFLOW_SID = os.getenv("TWILIO_TASK_ROUTER_WORKFLOW_SID")
+# Base URL of twilio_stub_server.py; when set, Twilio REST calls go there instead of *.twilio.com
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL", "").strip() or None
 
 # --- Database Configuration ---
 DB_HOST = os.getenv("DB_HOST", "finance-db.cv8igmo4w3fe.eu-north-1.rds.amazonaws.com").strip()
@@ -32,6 +34,7 @@ DATABASE_URL = os.getenv(
     "DATABASE_URL", 
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 ).strip()
+TASK_TRANSITION_BATCH_SIZE = int(os.getenv("TASK_TRANSITION_BATCH_SIZE", 1000))  # task ids per bulk status UPDATE
 
 # --- AWS Configuration ---
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "").strip()
@@ -43,4 +46,195 @@ AWS_REGION = AWS_DEFAULT_REGION
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash-latest").strip()
 CLAUDE_MODEL_ID = os.getenv("CLAUDE_MODEL_ID", "").strip()
-CLAUDE_INTENT_MODEL_ID = os.getenv("CLAUDE_INTENT_MODEL_ID", "").strip()
\ No newline at end of file
+
+# --- Bedrock Streaming Configuration ---
+# BEDROCK_STUB swaps the real bedrock-runtime client for the local stand-in in bedrock_stub.py
+BEDROCK_STUB = os.getenv("BEDROCK_STUB", "false").strip().lower() == "true"
+BEDROCK_STUB_DELTA_DELAY_MS = int(os.getenv("BEDROCK_STUB_DELTA_DELAY_MS", 40))
+CHAT_STREAMING_ENABLED = os.getenv("CHAT_STREAMING_ENABLED", "true").strip().lower() == "true"
+
+# --- Templated Answer Configuration ---
+# When enabled, emi/balance/loan answers are rendered locally by response_templates.py;
+# the LLM is only used for free-form questions whose intent needed the Bedrock classifier.
+TEMPLATE_RESPONSES_ENABLED = os.getenv("TEMPLATE_RESPONSES_ENABLED", "true").strip().lower() == "true"
+RESPONSE_LANGUAGE = os.getenv("RESPONSE_LANGUAGE", "en").strip()
+
+# --- Embedding Cache Configuration ---
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3").strip()
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 30 * 24 * 3600))  # Redis copy, 30 days
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+EMBEDDING_BATCH_WAIT_MS = int(os.getenv("EMBEDDING_BATCH_WAIT_MS", 20))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+
+# --- Local Intent Model Configuration ---
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "models/intent_model.joblib").strip()
+INTENT_MODEL_THRESHOLD = float(os.getenv("INTENT_MODEL_THRESHOLD", 0.75))  # Below this, defer to Bedrock
+
+# --- Intent Relabeling Configuration ---
+# relabel_intents.py: rows per server-side cursor fetch / bulk UPDATE, and where it records progress
+RELABEL_BATCH_SIZE = int(os.getenv("RELABEL_BATCH_SIZE", 2000))
+RELABEL_CHECKPOINT_PATH = os.getenv("RELABEL_CHECKPOINT_PATH", ".cache/relabel_intents.json").strip()
+
+# --- Entity Extraction Configuration ---
+ACCOUNT_ID_PATTERN = os.getenv("ACCOUNT_ID_PATTERN", r"[A-Z]{2}\d{8}").strip()  # e.g. CC11261684; must contain a digit
+
+# --- Bedrock Gateway Configuration ---
+# Per-call-type deadlines (seconds) covering all attempts, including backoff
+BEDROCK_DEADLINES = {
+    "chat": float(os.getenv("BEDROCK_DEADLINE_CHAT", 30)),
+    "chat_stream": float(os.getenv("BEDROCK_DEADLINE_CHAT_STREAM", 10)),  # time to open the stream
+    "summary": float(os.getenv("BEDROCK_DEADLINE_SUMMARY", 30)),
+    "intent": float(os.getenv("BEDROCK_DEADLINE_INTENT", 4)),
+    "translate": float(os.getenv("BEDROCK_DEADLINE_TRANSLATE", 6)),
+    "embedding": float(os.getenv("BEDROCK_DEADLINE_EMBEDDING", 5)),
+    "default": float(os.getenv("BEDROCK_DEADLINE_DEFAULT", 15)),
+}
+BEDROCK_CONCURRENCY_INITIAL = int(os.getenv("BEDROCK_CONCURRENCY_INITIAL", 8))
+BEDROCK_CONCURRENCY_MIN = int(os.getenv("BEDROCK_CONCURRENCY_MIN", 1))
+BEDROCK_CONCURRENCY_MAX = int(os.getenv("BEDROCK_CONCURRENCY_MAX", 64))
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", 3))
+BEDROCK_RETRY_BUDGET_RATIO = float(os.getenv("BEDROCK_RETRY_BUDGET_RATIO", 0.1))  # retries <= ~10% of calls
+BEDROCK_BREAKER_FAILURES = int(os.getenv("BEDROCK_BREAKER_FAILURES", 5))
+BEDROCK_BREAKER_COOLDOWN = float(os.getenv("BEDROCK_BREAKER_COOLDOWN", 30))
+
+# --- Prompt Budget Configuration ---
+# Per-call-type token budgets: "history" caps prior chat turns sent with the prompt
+# (approximate tokens, see prompt_builder.estimate_tokens), "max_tokens" caps the output.
+PROMPT_BUDGETS = {
+    "chat": {"history": int(os.getenv("PROMPT_HISTORY_CHAT", 1200)), "max_tokens": int(os.getenv("MAX_TOKENS_CHAT", 700))},
+    "chat_stream": {"history": int(os.getenv("PROMPT_HISTORY_CHAT", 1200)), "max_tokens": int(os.getenv("MAX_TOKENS_CHAT", 700))},
+    "summary": {"history": int(os.getenv("PROMPT_HISTORY_SUMMARY", 3000)), "max_tokens": int(os.getenv("MAX_TOKENS_SUMMARY", 1000))},
+    "intent": {"history": 0, "max_tokens": 10},
+    "translate": {"history": 0, "max_tokens": int(os.getenv("MAX_TOKENS_TRANSLATE", 300))},
+    "default": {"history": 1500, "max_tokens": 1024},
+}
+
+# --- Rolling Summary Configuration ---
+# Summaries are refreshed in the background after each bot turn so escalation can hand off immediately
+ROLLING_SUMMARY_ENABLED = os.getenv("ROLLING_SUMMARY_ENABLED", "true").lower() == "true"
+ROLLING_SUMMARY_WORKERS = int(os.getenv("ROLLING_SUMMARY_WORKERS", 2))
+
+# --- Escalation Queue Configuration ---
+# Agent handoffs run as background jobs stored in Redis; each step is retried on its own
+ESCALATION_WORKERS = int(os.getenv("ESCALATION_WORKERS", 2))
+ESCALATION_STEP_MAX_ATTEMPTS = int(os.getenv("ESCALATION_STEP_MAX_ATTEMPTS", 4))
+ESCALATION_RETRY_BASE_SECONDS = float(os.getenv("ESCALATION_RETRY_BASE_SECONDS", 1.0))  # doubles per attempt
+ESCALATION_POLL_SECONDS = float(os.getenv("ESCALATION_POLL_SECONDS", 0.5))
+ESCALATION_JOB_LEASE_SECONDS = int(os.getenv("ESCALATION_JOB_LEASE_SECONDS", 120))  # requeue jobs idle this long
+ESCALATION_JOB_TTL = int(os.getenv("ESCALATION_JOB_TTL", 24 * 3600))
+
+# --- Conversation Directory Configuration ---
+# customer -> Twilio Conversation SID is kept in Postgres (customer_conversation) and cached in Redis
+CONVERSATION_CACHE_TTL = int(os.getenv("CONVERSATION_CACHE_TTL", 7 * 24 * 3600))
+
+# --- Handoff Context Configuration ---
+# The transcript goes to the agent's Twilio Conversation as one message; longer ones are
+# split into parts of at most HANDOFF_CONTEXT_MAX_CHARS, posted concurrently
+HANDOFF_CONTEXT_MAX_CHARS = int(os.getenv("HANDOFF_CONTEXT_MAX_CHARS", 1600))
+HANDOFF_CONTEXT_CONCURRENCY = int(os.getenv("HANDOFF_CONTEXT_CONCURRENCY", 4))
+
+# --- OTP Throttling Configuration ---
+# Sliding-window limits on OTP requests, checked in Redis before the account lookup and the SMS
+OTP_THROTTLE_WINDOW_SECONDS = int(os.getenv("OTP_THROTTLE_WINDOW_SECONDS", 900))
+OTP_THROTTLE_LIMITS = {
+    "account": int(os.getenv("OTP_MAX_PER_ACCOUNT", 3)),  # per account ID
+    "phone": int(os.getenv("OTP_MAX_PER_PHONE", 5)),      # per destination number and WhatsApp sender
+}
+
+# --- Voice Prompt Translation Memory ---
+# Voice-call prompts translated once per language (python voice_prompts.py, or at boot) and stored here
+VOICE_PROMPT_MEMORY_PATH = os.getenv("VOICE_PROMPT_MEMORY_PATH", ".cache/voice_prompts.json").strip()
+VOICE_PROMPT_BUILD_CONCURRENCY = int(os.getenv("VOICE_PROMPT_BUILD_CONCURRENCY", 4))
+
+# --- Call Task Store Configuration ---
+# Outbound call tasks live in Redis hashes (shared by every worker); a task expires this long after its last update
+CALL_TASK_TTL = int(os.getenv("CALL_TASK_TTL", 7 * 24 * 3600))
+
+# --- Campaign Dialer Configuration ---
+# /start-campaign queues the calls; a background dialer places them within these limits
+CAMPAIGN_MAX_CONCURRENT_CALLS = int(os.getenv("CAMPAIGN_MAX_CONCURRENT_CALLS", 10))
+CAMPAIGN_CALLS_PER_SECOND = float(os.getenv("CAMPAIGN_CALLS_PER_SECOND", 1.0))
+CAMPAIGN_POLL_SECONDS = float(os.getenv("CAMPAIGN_POLL_SECONDS", 0.5))
+CAMPAIGN_CALL_TIMEOUT_SECONDS = int(os.getenv("CAMPAIGN_CALL_TIMEOUT_SECONDS", 1800))  # free a slot with no status callback
+CAMPAIGN_TTL = int(os.getenv("CAMPAIGN_TTL", 7 * 24 * 3600))
+
+# --- Predictive Pacing Configuration ---
+# "predictive" paces campaign calls to the agents' capacity using CallOutcome history; "fixed" uses only the limits above
+CAMPAIGN_PACING = os.getenv("CAMPAIGN_PACING", "predictive").strip().lower()
+PACING_AGENTS = int(os.getenv("PACING_AGENTS", 1))  # agents reachable on AGENT_PHONE_NUMBER
+PACING_MAX_ABANDON_RATE = float(os.getenv("PACING_MAX_ABANDON_RATE", 0.03))  # share of handoffs allowed to find no free agent
+PACING_HISTORY_DAYS = int(os.getenv("PACING_HISTORY_DAYS", 30))
+PACING_PRIOR_WEIGHT = float(os.getenv("PACING_PRIOR_WEIGHT", 20))  # calls' worth of smoothing toward broader rates
+PACING_REFRESH_SECONDS = int(os.getenv("PACING_REFRESH_SECONDS", 600))
+PACING_DEFAULT_ANSWER_RATE = float(os.getenv("PACING_DEFAULT_ANSWER_RATE", 0.45))  # used until there is history
+PACING_DEFAULT_HANDOFF_RATE = float(os.getenv("PACING_DEFAULT_HANDOFF_RATE", 0.3))  # per answered call
+PACING_HANDLE_SECONDS = float(os.getenv("PACING_HANDLE_SECONDS", 300))  # starting point; learned from handoffs
+PACING_TIME_TO_HANDOFF_SECONDS = float(os.getenv("PACING_TIME_TO_HANDOFF_SECONDS", 75))  # dial to agent; learned too
+PACING_TIMING_ALPHA = float(os.getenv("PACING_TIMING_ALPHA", 0.2))  # weight of each new observation in the learned times
+
+# --- Call Flow Configuration ---
+# Render non-interactive voice stages into one TwiML response (false: one webhook per stage, for comparison)
+CALL_FLOW_MERGE_STAGES = os.getenv("CALL_FLOW_MERGE_STAGES", "true").lower() == "true"
+CALL_TRACE_MAX_CALLS = int(os.getenv("CALL_TRACE_MAX_CALLS", 500))  # most recent calls kept for /api/metrics/call_flow
+CALL_TRACE_TTL = int(os.getenv("CALL_TRACE_TTL", 24 * 3600))
+
+# --- Outbox Configuration ---
+# OTPs, WhatsApp summaries and Conversations messages are queued in Redis and sent by a worker pool
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 4))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 2.0))  # doubles per attempt
+OUTBOX_DESTINATION_INTERVAL_SECONDS = float(os.getenv("OUTBOX_DESTINATION_INTERVAL_SECONDS", 1.0))  # min gap per recipient
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 0.2))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 60))  # requeue messages claimed this long ago
+OUTBOX_MESSAGE_TTL = int(os.getenv("OUTBOX_MESSAGE_TTL", 3 * 24 * 3600))
+# Public URL of /twilio/message_status; when set Twilio reports delivery status for each SID
+OUTBOX_STATUS_CALLBACK_URL = os.getenv("OUTBOX_STATUS_CALLBACK_URL", "").strip() or None
+
+# --- Async Bedrock / Hedging Configuration ---
+# Short idempotent calls send a duplicate request once the first one is slower than the
+# recent latency percentile; duplicates are capped at a fraction of total calls.
+BEDROCK_HEDGE_ENABLED = os.getenv("BEDROCK_HEDGE_ENABLED", "true").lower() == "true"
+BEDROCK_HEDGE_CALL_TYPES = tuple(os.getenv("BEDROCK_HEDGE_CALL_TYPES", "intent,translate").split(","))
+BEDROCK_HEDGE_PERCENTILE = float(os.getenv("BEDROCK_HEDGE_PERCENTILE", 0.95))
+BEDROCK_HEDGE_MIN_DELAY_MS = float(os.getenv("BEDROCK_HEDGE_MIN_DELAY_MS", 50))
+BEDROCK_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("BEDROCK_HEDGE_DEFAULT_DELAY_MS", 800))  # until enough samples
+BEDROCK_HEDGE_BUDGET_RATIO = float(os.getenv("BEDROCK_HEDGE_BUDGET_RATIO", 0.05))  # hedges <= ~5% of calls
+
+# --- LLM Provider Configuration ---
+# All LLM calls go through llm_provider.py; the model per call type comes from MODEL_ROUTES below.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "bedrock").strip().lower()
+# Point the bedrock-runtime clients at llm_stub_server.py (e.g. http://localhost:8787) to run offline
+BEDROCK_ENDPOINT_URL = os.getenv("BEDROCK_ENDPOINT_URL", "").strip() or None
+DEFAULT_CLAUDE_MODEL_ID = CLAUDE_MODEL_ID or "arn:aws:bedrock:eu-north-1:844605843483:inference-profile/eu.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# --- Model Routing Configuration ---
+# Model tiers, fastest/cheapest last. Each call type routes to the first tier in its list and
+# moves one step down when its p95 latency misses the SLO (see model_router.py). Tiers run in
+# AWS_REGION; a tier in another region is only used if its *_MODEL_CROSS_REGION flag is set,
+# since customer text would leave the deployment's region.
+MODEL_TIERS = {
+    "premium": {"model_id": DEFAULT_CLAUDE_MODEL_ID, "region": AWS_REGION},
+    "standard": {
+        "model_id": os.getenv("STANDARD_MODEL_ID", "eu.anthropic.claude-3-5-sonnet-20240620-v1:0").strip(),
+        "region": os.getenv("STANDARD_MODEL_REGION", AWS_REGION).strip(),
+        "allow_cross_region": os.getenv("STANDARD_MODEL_CROSS_REGION", "false").strip().lower() == "true",
+    },
+    "fast": {
+        "model_id": os.getenv("FAST_MODEL_ID", "eu.anthropic.claude-3-haiku-20240307-v1:0").strip(),
+        "region": os.getenv("FAST_MODEL_REGION", AWS_REGION).strip(),
+        "allow_cross_region": os.getenv("FAST_MODEL_CROSS_REGION", "false").strip().lower() == "true",
+    },
+    "embedding": {"model_id": "amazon.titan-embed-text-v2:0", "region": AWS_REGION},
+}
+# slo_p95_ms is measured per call (time to first token for chat_stream); None disables downgrades
+MODEL_ROUTES = {
+    "chat": {"tiers": ["premium", "standard", "fast"], "slo_p95_ms": int(os.getenv("SLO_CHAT_MS", 6000))},
+    "chat_stream": {"tiers": ["premium", "standard", "fast"], "slo_p95_ms": int(os.getenv("SLO_CHAT_STREAM_TTFT_MS", 2000))},
+    "summary": {"tiers": ["premium", "fast"], "slo_p95_ms": int(os.getenv("SLO_SUMMARY_MS", 10000))},
+    "intent": {"tiers": [os.getenv("INTENT_MODEL_TIER", "fast").strip()], "slo_p95_ms": None},
+    "translate": {"tiers": ["standard", "fast"], "slo_p95_ms": int(os.getenv("SLO_TRANSLATE_MS", 1500))},
+    "embedding": {"tiers": ["embedding"], "slo_p95_ms": None},
+}
+MODEL_ROUTING_WINDOW = int(os.getenv("MODEL_ROUTING_WINDOW", 50))  # calls per SLO evaluation window
+MODEL_ROUTING_MIN_SAMPLES = int(os.getenv("MODEL_ROUTING_MIN_SAMPLES", 20))
+MODEL_ROUTING_RECOVERY_SECONDS = float(os.getenv("MODEL_ROUTING_RECOVERY_SECONDS", 300))  # before a downgraded route retries the tier above
@@ -0,0 +1,93 @@
+import logging
+from typing import Dict, Optional
+
+from database import get_conversation_sid, save_conversation_sid, delete_conversation_sid
+from session_manager import session_manager
+from twilio_chat import create_conversation
+from config import CONVERSATION_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationDirectory:
+    """
+    Maps customers to their Twilio Conversation SID. Lookups read through Redis, then the
+    customer_conversation table; Twilio is only contacted (fetch by unique name, else create)
+    when neither has the customer. Concurrent misses for the same customer are serialized
+    with a Redis lock so only one of them talks to Twilio.
+    """
+
+    def __init__(self, redis_client=None, ttl=CONVERSATION_CACHE_TTL):
+        self.redis = redis_client or session_manager.redis_client
+        self.ttl = ttl
+        self._counters = {"redis_hits": 0, "db_hits": 0, "twilio_lookups": 0}
+
+    def _cache_key(self, customer_id: str) -> str:
+        return f"conversation_sid:{customer_id}"
+
+    def _cached(self, customer_id: str) -> Optional[str]:
+        try:
+            return self.redis.get(self._cache_key(customer_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Conversation cache read failed: {e}")
+            return None
+
+    def _cache(self, customer_id: str, conversation_sid: str):
+        try:
+            self.redis.setex(self._cache_key(customer_id), self.ttl, conversation_sid)
+        except Exception as e:
+            logger.warning(f"⚠️ Conversation cache write failed: {e}")
+
+    def _lookup(self, customer_id: str) -> Optional[str]:
+        conversation_sid = self._cached(customer_id)
+        if conversation_sid:
+            self._counters["redis_hits"] += 1
+            return conversation_sid
+        conversation_sid = get_conversation_sid(customer_id)
+        if conversation_sid:
+            self._counters["db_hits"] += 1
+            self._cache(customer_id, conversation_sid)
+        return conversation_sid
+
+    def get_or_create(self, customer_id: str) -> Optional[str]:
+        """
+        Returns the customer's Conversation SID, creating the conversation on a true miss.
+
+        Args:
+            customer_id (str): The customer the conversation belongs to
+
+        Returns:
+            str: The Conversation SID, or None if Twilio could not provide one
+        """
+        customer_id = str(customer_id)
+        conversation_sid = self._lookup(customer_id)
+        if conversation_sid:
+            return conversation_sid
+
+        with self.redis.lock(f"conversation_lock:{customer_id}", timeout=30, blocking_timeout=30):
+            # Another worker may have filled it in while we waited
+            conversation_sid = self._lookup(customer_id)
+            if conversation_sid:
+                return conversation_sid
+            self._counters["twilio_lookups"] += 1
+            conversation_sid = create_conversation(customer_id)
+            if conversation_sid:
+                save_conversation_sid(customer_id, conversation_sid)
+                self._cache(customer_id, conversation_sid)
+            return conversation_sid
+
+    def invalidate(self, customer_id: str):
+        """Forgets the mapping, e.g. after the conversation was closed or deleted in Twilio."""
+        customer_id = str(customer_id)
+        try:
+            self.redis.delete(self._cache_key(customer_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Conversation cache delete failed: {e}")
+        delete_conversation_sid(customer_id)
+
+    def stats(self) -> Dict:
+        return dict(self._counters)
+
+
+# Initialize global conversation directory
+conversation_directory = ConversationDirectory()
@@ -1,6 +1,6 @@
 # database.py
 from sqlalchemy import create_engine, Column, String, DateTime, Text, Boolean, DECIMAL, ForeignKey, Integer, text, UUID
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,6 +9,8 @@ import logging
 import os
 import uuid
 
+from config import TASK_TRANSITION_BATCH_SIZE
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -109,6 +111,14 @@ class ClientInteraction(Base):
     is_escalated = Column(Boolean)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class CustomerConversation(Base):
+    __tablename__ = 'customer_conversation'
+    # One Twilio Conversation per customer, so handoffs don't have to look it up in Twilio
+    customer_id = Column(String(50), primary_key=True)
+    conversation_sid = Column(String(34), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class RAGDocument(Base):
     __tablename__ = 'rag_document'
     # FIX: Change the data type from String(36) to UUID(as_uuid=True)
@@ -184,6 +194,7 @@ def save_chat_interaction(session_id: uuid.UUID, sender: str, message_text: str,
 def save_unresolved_chat(customer_id: str, summary: str, embedding: list, task_id: str, source: str = 'web'):
     """
     Saves a summarized, unresolved chat session to the RAG documents table.
+    Returns True once the document is stored (or already was), False on error.
     """
     db = Session()
     try:
@@ -191,7 +202,7 @@ def save_unresolved_chat(customer_id: str, summary: str, embedding: list, task_i
         existing_doc = db.query(RAGDocument).filter(RAGDocument.task_id == task_id).first()
         if existing_doc:
             logging.warning(f"Document with task_id {task_id} already exists. Skipping save.")
-            return
+            return True
 
         new_document = RAGDocument(
             customer_id=customer_id,
@@ -204,9 +215,167 @@ def save_unresolved_chat(customer_id: str, summary: str, embedding: list, task_i
         db.add(new_document)
         db.commit()
         logging.info(f"✅ Saved unresolved chat for customer {customer_id} with task_id {task_id} from source {source}")
+        return True
     except Exception as e:
         db.rollback()
         logging.error(f"❌ Error saving unresolved chat: {e}")
+        return False
+    finally:
+        db.close()
+
+def get_conversation_sid(customer_id: str):
+    """
+    Returns the stored Twilio Conversation SID for a customer, or None.
+    """
+    db = Session()
+    try:
+        mapping = db.get(CustomerConversation, customer_id)
+        return mapping.conversation_sid if mapping else None
+    except Exception as e:
+        logging.error(f"❌ Error fetching conversation SID for customer {customer_id}: {e}")
+        return None
+    finally:
+        db.close()
+
+def save_conversation_sid(customer_id: str, conversation_sid: str):
+    """
+    Stores (or replaces) the Twilio Conversation SID for a customer.
+    """
+    db = Session()
+    try:
+        now = datetime.utcnow()
+        db.execute(
+            pg_insert(CustomerConversation)
+            .values(customer_id=customer_id, conversation_sid=conversation_sid, created_at=now, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[CustomerConversation.customer_id],
+                set_={'conversation_sid': conversation_sid, 'updated_at': now}
+            )
+        )
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logging.error(f"❌ Error saving conversation SID for customer {customer_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+def delete_conversation_sid(customer_id: str):
+    db = Session()
+    try:
+        db.query(CustomerConversation).filter(CustomerConversation.customer_id == customer_id).delete()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"❌ Error deleting conversation SID for customer {customer_id}: {e}")
+    finally:
+        db.close()
+
+def _pg_array(values) -> str:
+    # Postgres array literal. Sent as an untyped string, so `column = ANY(:param)` takes the
+    # column's type (uuid, int or text) and can still use its index.
+    return "{" + ",".join('"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values) + "}"
+
+def transition_tasks(task_ids, status: str, from_statuses=None, outcome_type: str = None, notes: str = None):
+    """
+    Moves a batch of CollectionTasks to `status` with one UPDATE per TASK_TRANSITION_BATCH_SIZE
+    ids and, if `outcome_type` is given, records a CallOutcome for each moved task in the
+    same statement, so a task never has its status without its outcome or the reverse.
+
+    Args:
+        task_ids: Task ids to move
+        status: New status
+        from_statuses: Only move tasks currently in one of these statuses (all if None)
+        outcome_type: CallOutcome.outcome_type to record for every moved task
+        notes: CallOutcome.notes for the recorded outcomes
+
+    Returns:
+        list: Ids of the tasks that were moved (as strings)
+    """
+    task_ids = [str(task_id) for task_id in task_ids]
+    moved = []
+    if not task_ids:
+        return moved
+    status_filter = "AND status = ANY(:from_statuses)" if from_statuses else ""
+    outcome_insert = """
+        , recorded AS (
+            INSERT INTO calloutcome (task_id, outcome_type, ptp, notes)
+            SELECT task_id, :outcome_type, FALSE, :notes FROM moved
+        )""" if outcome_type else ""
+    query = text(f"""
+        WITH moved AS (
+            UPDATE collectiontask
+            SET status = :status
+            WHERE task_id = ANY(:task_ids) {status_filter}
+            RETURNING task_id
+        ){outcome_insert}
+        SELECT task_id FROM moved
+    """)
+    db = Session()
+    try:
+        for start in range(0, len(task_ids), TASK_TRANSITION_BATCH_SIZE):
+            result = db.execute(query, {
+                'task_ids': _pg_array(task_ids[start:start + TASK_TRANSITION_BATCH_SIZE]),
+                'status': status,
+                'from_statuses': _pg_array(from_statuses or []),
+                'outcome_type': outcome_type,
+                'notes': notes,
+            })
+            moved.extend(str(row[0]) for row in result)
+        db.commit()
+        return moved
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def fetch_call_outcome_stats(days: int = 30):
+    """
+    Summarizes recent CallOutcome history for predictive pacing: calls, answered calls and
+    agent handoffs per risk segment and hour of day.
+
+    Outcomes are placed by calloutcome.recorded_at (added by db_migration.py). Without that
+    column, the task's scheduled time stands in for the call time.
+
+    Raises:
+        SQLAlchemyError: the history could not be read (the pacer keeps its previous rates)
+    """
+    db = Session()
+    try:
+        has_recorded_at = db.execute(text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'calloutcome' AND column_name = 'recorded_at'
+        """)).first()
+        if has_recorded_at:
+            called_at = "COALESCE(co.recorded_at, ct.scheduled_for)"
+        else:
+            logging.error("❌ calloutcome.recorded_at is missing (run db_migration.run_migration); "
+                          "pacing uses each task's scheduled time as its call hour")
+            called_at = "ct.scheduled_for"
+        result = db.execute(text(f"""
+            WITH latest_risk AS (
+                SELECT customer_id, risk_segment,
+                    ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY risk_date DESC) AS rn
+                FROM riskscore
+            )
+            SELECT
+                COALESCE(rs.risk_segment, 'Unknown') AS risk_segment,
+                EXTRACT(HOUR FROM {called_at})::int AS hour,
+                COUNT(*) AS calls,
+                COUNT(*) FILTER (WHERE co.outcome_type NOT LIKE 'Call\\_%') AS answered,
+                COUNT(*) FILTER (WHERE co.outcome_type IN ('Customer_Agreed_Assistance', 'Agent_Requested')) AS handoffs
+            FROM calloutcome co
+            JOIN collectiontask ct ON ct.task_id = co.task_id
+            LEFT JOIN latest_risk rs ON rs.customer_id = ct.customer_id AND rs.rn = 1
+            WHERE {called_at} >= NOW() - make_interval(days => :days)
+            GROUP BY 1, 2
+        """), {'days': days})
+        return [dict(row._mapping) for row in result]
+    except Exception as e:
+        logging.error(f"❌ Error fetching call outcome history: {e}")
+        raise
     finally:
         db.close()
 
@@ -31,6 +31,20 @@ def run_migration():
             logging.info("Adding embedding column to rag_document table...")
             cursor.execute("ALTER TABLE rag_document ADD COLUMN embedding vector(1024)")
         
+        # CallOutcome rows need the time of the call for predictive pacing (hour of day).
+        # Existing rows are left NULL; pacing falls back to the task's scheduled time for them.
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'calloutcome'
+        """)
+        outcome_columns = [row[0] for row in cursor.fetchall()]
+        
+        if outcome_columns and 'recorded_at' not in outcome_columns:
+            logging.info("Adding recorded_at column to calloutcome table...")
+            cursor.execute("ALTER TABLE calloutcome ADD COLUMN recorded_at TIMESTAMP")
+            cursor.execute("ALTER TABLE calloutcome ALTER COLUMN recorded_at SET DEFAULT NOW()")
+        
         # Check if we have any EMI records
         cursor.execute("SELECT COUNT(*) FROM emi")
         emi_count = cursor.fetchone()[0]
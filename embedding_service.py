@@ -0,0 +1,235 @@
+import os
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import redis
+
+from bedrock_client import get_embedding
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB,
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_TTL, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_MS, EMBEDDING_MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "titan-embed-text-v2"
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalizes and collapses whitespace so equivalent texts share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def content_key(text: str) -> str:
+    """Content address of an already-normalized text."""
+    return hashlib.sha256(f"{EMBEDDING_MODEL}:{text}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingService:
+    """
+    Content-addressed embedding cache (Redis, then an on-disk SQLite store) in front of
+    Titan. Concurrent requests for the same text share one call, and cache misses are
+    grouped into batches that run with a bounded number of Bedrock calls in flight.
+    """
+
+    def __init__(self, cache_path=EMBEDDING_CACHE_PATH, batch_size=EMBEDDING_BATCH_SIZE,
+                 batch_wait_ms=EMBEDDING_BATCH_WAIT_MS, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                 embed_fn=get_embedding):
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.redis_client = self._connect_redis()
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._disk = sqlite3.connect(cache_path, check_same_thread=False)
+        self._disk.execute("CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._disk.commit()
+        self._disk_lock = threading.Lock()
+
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._calls = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed-call")
+        self._batches = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed-batch")
+
+        self._stats_lock = threading.Lock()
+        self._counters = {"requests": 0, "redis_hits": 0, "disk_hits": 0, "deduplicated": 0,
+                          "misses": 0, "embedded": 0, "failures": 0, "batches": 0}
+        self._completions = deque()
+
+        threading.Thread(target=self._dispatch_loop, name="embed-dispatcher", daemon=True).start()
+
+    def _connect_redis(self):
+        try:
+            client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+            client.ping()
+            return client
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding cache running without Redis: {e}")
+            return None
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._stats_lock:
+            self._counters[counter] += amount
+
+    # --- Cache layers ---
+
+    def _cache_get(self, key: str) -> Optional[List[float]]:
+        if self.redis_client is not None:
+            try:
+                blob = self.redis_client.get(f"emb:{key}")
+                if blob:
+                    self._count("redis_hits")
+                    return _unpack(blob)
+            except Exception as e:
+                logger.warning(f"Redis embedding lookup failed: {e}")
+
+        with self._disk_lock:
+            row = self._disk.execute("SELECT vector FROM embedding WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._count("disk_hits")
+            vector = _unpack(row[0])
+            self._redis_put({key: vector})
+            return vector
+        return None
+
+    def _redis_put(self, vectors: Dict[str, List[float]]):
+        if self.redis_client is None or not vectors:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.setex(f"emb:{key}", EMBEDDING_CACHE_TTL, _pack(vector))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis embedding write failed: {e}")
+
+    def _cache_put(self, vectors: Dict[str, List[float]]):
+        self._redis_put(vectors)
+        with self._disk_lock:
+            self._disk.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)",
+                [(key, _pack(vector)) for key, vector in vectors.items()]
+            )
+            self._disk.commit()
+
+    # --- Public API ---
+
+    def submit(self, text: str) -> Future:
+        """Returns a future resolving to the embedding (or None on failure)."""
+        self._count("requests")
+        normalized = normalize_text(text)
+        key = content_key(normalized)
+
+        cached = self._cache_get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        with self._inflight_lock:
+            existing = self._inflight.get(key)
+            if existing is not None:
+                self._count("deduplicated")
+                return existing
+            future = Future()
+            self._inflight[key] = future
+
+        self._count("misses")
+        self._pending.put((key, normalized, future))
+        return future
+
+    def embed(self, text: str, timeout: float = 30.0) -> Optional[List[float]]:
+        """Blocking single-text embedding through the cache."""
+        return self.submit(text).result(timeout=timeout)
+
+    def embed_many(self, texts: List[str], timeout: float = 300.0) -> List[Optional[List[float]]]:
+        """Embeds a list of texts (e.g. a backfill chunk); results keep the input order."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            counters = dict(self._counters)
+            now = time.monotonic()
+            while self._completions and now - self._completions[0] > 60:
+                self._completions.popleft()
+            recent = len(self._completions)
+        hits = counters["redis_hits"] + counters["disk_hits"] + counters["deduplicated"]
+        counters["hit_rate"] = round(hits / counters["requests"], 4) if counters["requests"] else 0.0
+        counters["embeddings_per_second"] = round(recent / 60.0, 2)
+        counters["pending"] = self._pending.qsize()
+        return counters
+
+    # --- Batching ---
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._batches.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        self._count("batches")
+        results = list(self._calls.map(lambda item: self._embed_remote(item[1]), batch))
+
+        fresh = {key: vector for (key, _, _), vector in zip(batch, results) if vector}
+        if fresh:
+            try:
+                self._cache_put(fresh)
+            except Exception as e:
+                logger.error(f"❌ Failed to persist {len(fresh)} embeddings: {e}")
+
+        for (key, _, future), vector in zip(batch, results):
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            future.set_result(vector)
+
+    def _embed_remote(self, text: str) -> Optional[List[float]]:
+        try:
+            vector = self.embed_fn(text)
+        except Exception as e:
+            logger.error(f"❌ Embedding call failed: {e}")
+            vector = None
+        if vector:
+            self._count("embedded")
+            with self._stats_lock:
+                now = time.monotonic()
+                self._completions.append(now)
+                while now - self._completions[0] > 60:
+                    self._completions.popleft()
+        else:
+            self._count("failures")
+        return vector
+
+
+# Initialize global embedding service
+embedding_service = EmbeddingService()
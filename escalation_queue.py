@@ -0,0 +1,337 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from bedrock_client import get_chat_summary, update_chat_summary
+from embedding_service import embedding_service
+from database import save_unresolved_chat
+from session_manager import session_manager
+from twilio_chat import post_handoff_context, create_task_for_handoff, ConversationNotFoundError
+from conversation_directory import conversation_directory
+from config import (
+    ESCALATION_WORKERS, ESCALATION_STEP_MAX_ATTEMPTS, ESCALATION_RETRY_BASE_SECONDS,
+    ESCALATION_POLL_SECONDS, ESCALATION_JOB_LEASE_SECONDS, ESCALATION_JOB_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "escalation:queue"
+PROCESSING_KEY = "escalation:processing"
+
+
+class EscalationStepError(Exception):
+    """A handoff step failed and should be retried."""
+
+
+def _start_thread(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+class EscalationQueue:
+    """
+    Runs agent handoffs in the background so /connect_agent and the WhatsApp feedback
+    branch can reply immediately.
+
+    Job state lives in Redis (escalation:job:{id}) and job ids move from QUEUE_KEY to
+    PROCESSING_KEY while a worker owns them, so queued and interrupted jobs survive a
+    restart. Each step stores its result as it finishes and is retried on its own with
+    backoff; a retried job skips the steps it already completed. Progress events go to
+    the registered listeners (app.py pushes them over Socket.IO).
+    """
+
+    STEPS = ('summary', 'conversation', 'context', 'task', 'record')
+    # Without these there is no handoff; the other steps fall back or are skipped
+    CRITICAL_STEPS = ('conversation', 'task')
+
+    def __init__(self, redis_client=None, max_attempts=ESCALATION_STEP_MAX_ATTEMPTS,
+                 retry_base_seconds=ESCALATION_RETRY_BASE_SECONDS, poll_seconds=ESCALATION_POLL_SECONDS,
+                 lease_seconds=ESCALATION_JOB_LEASE_SECONDS, job_ttl=ESCALATION_JOB_TTL):
+        self.redis = redis_client or session_manager.redis_client
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.job_ttl = job_ttl
+        self._listeners = []
+        self._sleep = time.sleep
+        self._started = False
+
+    # --- Public API ---
+
+    def start(self, spawn=_start_thread, sleep=time.sleep, workers=ESCALATION_WORKERS):
+        """
+        Starts the workers. app.py passes socketio.start_background_task / socketio.sleep so
+        progress can be emitted from them safely under every Socket.IO async mode.
+        """
+        if self._started:
+            return
+        self._started = True
+        self._sleep = sleep
+        for _ in range(workers):
+            spawn(self._run)
+        logger.info(f"✅ Escalation queue started with {workers} workers")
+
+    def add_progress_listener(self, callback) -> None:
+        """
+        Register a callback(job, event) invoked on every step transition. `event` has
+        job_id, step, status ('running', 'done', 'retrying', 'failed', 'completed') and
+        attempt/error where relevant. Callbacks run on the worker.
+        """
+        self._listeners.append(callback)
+
+    def submit(self, customer_id: str, phone_number: str, chat_history: list, channel: str = 'web',
+               session_identifier: str = None, reason: str = 'manual_request') -> Tuple[str, bool]:
+        """
+        Queues a handoff. A customer with a handoff already in flight gets that job back.
+
+        Returns:
+            tuple: (job_id, created)
+        """
+        job_id = str(uuid.uuid4())
+        active_key = f"escalation:active:{channel}:{customer_id}"
+        if not self.redis.set(active_key, job_id, nx=True, ex=self.lease_seconds * 2):
+            existing = self.redis.get(active_key)
+            existing_job = self.get(existing) if existing else None
+            if existing_job and existing_job['status'] not in ('completed', 'failed'):
+                logger.info(f"Escalation for {customer_id} already in progress: {existing}")
+                return existing, False
+            self.redis.set(active_key, job_id, ex=self.lease_seconds * 2)
+
+        now = datetime.now().isoformat()
+        job = {
+            'job_id': job_id,
+            'customer_id': customer_id,
+            'phone_number': phone_number,
+            'chat_history': chat_history,
+            'channel': channel,
+            'session_identifier': session_identifier,
+            'reason': reason,
+            'status': 'queued',
+            'steps': {step: {'status': 'pending', 'attempts': 0} for step in self.STEPS},
+            'results': {},
+            'created_at': now,
+            'updated_at': now,
+            'heartbeat': time.time(),
+        }
+        self._save(job)
+        self.redis.lpush(QUEUE_KEY, job_id)
+        logger.info(f"🏆 Escalation job {job_id} queued for {customer_id} ({channel})")
+        return job_id, True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        data = self.redis.get(f"escalation:job:{job_id}")
+        return json.loads(data) if data else None
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Job state without the chat history, for status endpoints."""
+        job = self.get(job_id)
+        if not job:
+            return None
+        job.pop('chat_history', None)
+        return job
+
+    def run_job(self, job_id: str) -> Optional[Dict]:
+        """Runs (or resumes) one job to completion; returns the final job state."""
+        job = self.get(job_id)
+        if not job or job['status'] in ('completed', 'failed'):
+            return job
+
+        job['status'] = 'running'
+        self._save(job)
+        for step in self.STEPS:
+            if job['steps'][step]['status'] in ('done', 'skipped'):
+                continue
+            if not self._run_step(job, step) and step in self.CRITICAL_STEPS:
+                return self._finish(job, 'failed')
+        return self._finish(job, 'completed')
+
+    # --- Worker loop ---
+
+    def _run(self):
+        while True:
+            try:
+                job_id = self._claim_next()
+                if not job_id:
+                    self._requeue_stalled()
+                    self._sleep(self.poll_seconds)
+                    continue
+                try:
+                    self.run_job(job_id)
+                finally:
+                    self.redis.lrem(PROCESSING_KEY, 1, job_id)
+                    self.redis.delete(f"escalation:claim:{job_id}")
+            except Exception as e:
+                logger.error(f"❌ Escalation worker error: {e}")
+                self._sleep(self.poll_seconds)
+
+    def _claim_next(self) -> Optional[str]:
+        """
+        Moves the oldest queued job to PROCESSING_KEY and claims it in one transaction. A job
+        that waited in the backlog still carries its old heartbeat, and the claim keeps
+        _requeue_stalled away from it until run_job saves a fresh one.
+        """
+        def claim(pipe):
+            job_id = pipe.lindex(QUEUE_KEY, -1)
+            if job_id:
+                pipe.multi()
+                pipe.rpoplpush(QUEUE_KEY, PROCESSING_KEY)
+                pipe.setex(f"escalation:claim:{job_id}", self.lease_seconds, 1)
+            return job_id
+
+        return self.redis.transaction(claim, QUEUE_KEY, value_from_callable=True)
+
+    def _requeue_stalled(self):
+        """Puts back jobs whose worker stopped heartbeating (e.g. the process was restarted)."""
+        for job_id in self.redis.lrange(PROCESSING_KEY, 0, -1):
+            if self.redis.exists(f"escalation:claim:{job_id}"):
+                continue
+            job = self.get(job_id)
+            if job and time.time() - job.get('heartbeat', 0) < self.lease_seconds:
+                continue
+            # Only the worker that removes the id requeues it
+            if self.redis.lrem(PROCESSING_KEY, 1, job_id) and job:
+                logger.warning(f"⚠️ Requeueing stalled escalation job {job_id}")
+                self.redis.lpush(QUEUE_KEY, job_id)
+
+    # --- Steps ---
+
+    def _run_step(self, job: Dict, step: str) -> bool:
+        state = job['steps'][step]
+        while state['attempts'] < self.max_attempts:
+            state['attempts'] += 1
+            state['status'] = 'running'
+            self._save(job)
+            self._notify(job, {'step': step, 'status': 'running', 'attempt': state['attempts']})
+            try:
+                job['results'].update(getattr(self, f"_step_{step}")(job) or {})
+                state['status'] = 'done'
+                state.pop('error', None)
+                self._save(job)
+                self._notify(job, {'step': step, 'status': 'done'})
+                return True
+            except Exception as e:
+                state['error'] = str(e)
+                logger.warning(f"Escalation {job['job_id']} step '{step}' attempt {state['attempts']} failed: {e}")
+                if state['attempts'] < self.max_attempts:
+                    self._save(job)
+                    self._notify(job, {'step': step, 'status': 'retrying', 'attempt': state['attempts'], 'error': str(e)})
+                    self._sleep(self.retry_base_seconds * 2 ** (state['attempts'] - 1))
+
+        state['status'] = 'failed'
+        if step == 'summary':
+            job['results']['summary'] = "Summary unavailable; see the recent chat history."
+        self._save(job)
+        self._notify(job, {'step': step, 'status': 'failed', 'error': state.get('error')})
+        return False
+
+    def _step_summary(self, job):
+        # Use the rolling summary kept by the background worker; summarize inline if none exists yet
+        # or it cannot be brought up to date
+        identifier = job['session_identifier']
+        rolling = session_manager.get_rolling_summary(identifier, job['channel']) if identifier else None
+        if rolling and rolling.get('summary'):
+            # Messages the worker has not folded in yet are added on top of its summary. The
+            # session history carries the timestamps summarized_until refers to; the web client's
+            # copy in the job may not.
+            session_data = session_manager.get_session(identifier, job['channel']) or {}
+            history = session_data.get('conversation_history') or job['chat_history']
+            summarized_until = rolling.get('summarized_until') or ""
+            tail = [m for m in history if m.get('timestamp', "") > summarized_until]
+            if not tail:
+                return {'summary': rolling['summary']}
+            try:
+                return {'summary': update_chat_summary(rolling['summary'], tail)}
+            except Exception as e:
+                logger.warning(f"⚠️ Could not update rolling summary for escalation {job['job_id']}: {e}")
+        return {'summary': get_chat_summary(job['chat_history'])}
+
+    def _step_conversation(self, job):
+        conversation_sid = conversation_directory.get_or_create(job['customer_id'])
+        if not conversation_sid:
+            raise EscalationStepError("Could not create Twilio Conversation")
+        return {'conversation_sid': conversation_sid}
+
+    def _step_context(self, job):
+        results = job['results']
+        messages = [(msg.get('sender', 'Unknown').capitalize(), msg.get('message', '(empty message)'))
+                    for msg in job['chat_history'][-5:]]
+        # Parts that went through on an earlier attempt are not posted again
+        posted = set(results.get('context_parts_posted', []))
+        header = f"Handoff from {job['channel']} for user {job['customer_id']}."
+        try:
+            sids = post_handoff_context(results['conversation_sid'], header, results['summary'], messages,
+                                        skip_parts=posted)
+        except ConversationNotFoundError:
+            # The stored conversation was deleted in Twilio: forget it and post everything to a fresh one
+            logger.warning(f"⚠️ Conversation {results['conversation_sid']} for {job['customer_id']} no longer exists, recreating it")
+            conversation_directory.invalidate(job['customer_id'])
+            results['conversation_sid'] = self._step_conversation(job)['conversation_sid']
+            posted = set()
+            sids = post_handoff_context(results['conversation_sid'], header, results['summary'], messages)
+        posted.update(part for part, sid in sids.items() if sid)
+        results['context_parts_posted'] = sorted(posted)
+        self._save(job)
+        failed = [part for part, sid in sids.items() if not sid]
+        if failed:
+            raise EscalationStepError(f"Could not post context parts {failed}")
+
+    def _step_task(self, job):
+        task_sid = create_task_for_handoff(
+            customer_id=job['customer_id'],
+            phone_number=job['phone_number'],
+            summary=job['results']['summary'],
+            recent_messages=job['chat_history'][-5:],
+            conversation_sid=job['results']['conversation_sid']
+        )
+        if not task_sid:
+            raise EscalationStepError("Could not create TaskRouter task")
+        return {'task_sid': task_sid}
+
+    def _step_record(self, job):
+        summary_embedding = embedding_service.embed(job['results']['summary'])
+        if not summary_embedding:
+            raise EscalationStepError("Could not embed summary")
+        if not save_unresolved_chat(
+            customer_id=job['customer_id'],
+            summary=job['results']['summary'],
+            embedding=summary_embedding,
+            task_id=job['results']['task_sid'],
+            source=job['channel']
+        ):
+            raise EscalationStepError("Could not save unresolved chat")
+
+    # --- State ---
+
+    def _finish(self, job: Dict, status: str) -> Dict:
+        job['status'] = status
+        if status == 'completed' and job['session_identifier']:
+            session_manager.escalate_session(job['session_identifier'], job['reason'], job['channel'])
+        self._save(job)
+        self.redis.delete(f"escalation:active:{job['channel']}:{job['customer_id']}")
+        self._notify(job, {'step': None, 'status': status})
+        if status == 'completed':
+            logger.info(f"Successfully escalated chat for {job['customer_id']}. Task SID: {job['results'].get('task_sid')}")
+        else:
+            logger.error(f"Escalation failed for {job['customer_id']} (job {job['job_id']})")
+        return job
+
+    def _save(self, job: Dict):
+        job['updated_at'] = datetime.now().isoformat()
+        job['heartbeat'] = time.time()
+        self.redis.setex(f"escalation:job:{job['job_id']}", self.job_ttl, json.dumps(job, default=str))
+
+    def _notify(self, job: Dict, event: Dict):
+        event = {'job_id': job['job_id'], 'customer_id': job['customer_id'], 'channel': job['channel'], **event}
+        for callback in self._listeners:
+            try:
+                callback(job, event)
+            except Exception as e:
+                logger.error(f"❌ Escalation progress listener failed: {e}")
+
+
+# Initialize global escalation queue (workers are started by app.py)
+escalation_queue = EscalationQueue()
@@ -1,20 +1,28 @@
 import os
 import json
 import uuid
-import boto3
 from functools import wraps
 from flask import Flask, request, jsonify, render_template, send_from_directory, redirect
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from datetime import datetime
 from dotenv import load_dotenv
-from twilio.rest import Client
+from twilio_chat import make_twilio_client
 from flask_cors import CORS
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import psycopg2
 from twilio.twiml.messaging_response import MessagingResponse
-import os
 import re
+import time
+import threading
+from voice_prompts import voice_prompts, LANG_CONFIG
+from call_flow import call_flow
+from call_task_store import call_task_store
+from campaign_dialer import campaign_dialer, CampaignAlreadyActive
+from predictive_pacer import ANSWERED_NO_OUTCOME
+from outbox import outbox
+from database import transition_tasks
+from config import CAMPAIGN_MAX_CONCURRENT_CALLS, CAMPAIGN_CALLS_PER_SECOND, CAMPAIGN_PACING, PACING_AGENTS
 
 # --- Basic Setup ---
 load_dotenv()
@@ -29,12 +37,16 @@ TWILIO_TASK_ROUTER_WORKSPACE_SID = os.getenv('TWILIO_TASK_ROUTER_WORKSPACE_SID')
 TWILIO_TASK_ROUTER_WORKFLOW_SID = os.getenv('TWILIO_TASK_ROUTER_WORKFLOW_SID')
 TWILIO_CONVERSATIONS_SERVICE_SID = os.getenv('TWILIO_CONVERSATIONS_SERVICE_SID')
 NGROK_URL = os.getenv('NGROK_URL')
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Points at twilio_stub_server.py when TWILIO_API_BASE_URL is set
+client = make_twilio_client()
+
+# --- Voice Prompt Configuration ---
+# Prompts come pre-translated from the translation memory; missing ones are filled in the background
+threading.Thread(target=voice_prompts.warm, daemon=True).start()
 
-# --- AWS Bedrock Configuration ---
-AWS_REGION = os.getenv('AWS_REGION', 'eu-north-1')
-CLAUDE_MODEL_ID = os.getenv('CLAUDE_MODEL_ID', 'arn:aws:bedrock:eu-north-1:844605843483:inference-profile/eu.anthropic.claude-3-7-sonnet-20250219-v1:0')
-bedrock_client = boto3.client(service_name='bedrock-runtime', region_name=AWS_REGION)
+# --- Outbox Configuration ---
+# Outbound WhatsApp messages are sent by the outbox workers, off the webhook threads
+outbox.start()
 
 # --- Database Configuration ---
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -44,16 +56,6 @@ Session = sessionmaker(bind=engine)
 # --- Agent Configuration ---
 AGENT_PHONE_NUMBER = "+917983394461"
 
-# --- In-Memory Call Tasks Storage ---
-# This will now store task information fetched from the database
-call_tasks = {}
-
-LANG_CONFIG = {
-    '1': {'code': 'en-IN', 'name': 'English', 'voice': 'Polly.Raveena'},
-    '2': {'code': 'hi-IN', 'name': 'Hindi', 'voice': 'Polly.Raveena'},
-    '3': {'code': 'te-IN', 'name': 'Telugu', 'voice': 'Polly.Raveena'}
-}
-
 # --- Database Helper Functions ---
 def fetch_high_risk_customers():
     """
@@ -93,7 +95,8 @@ def fetch_high_risk_customers():
                 e.amount_due AS emi_amount,
                 TO_CHAR(e.due_date, 'DD Month') AS due_date,
                 ct.status,
-                ct.priority_level
+                ct.priority_level,
+                rs.risk_segment
             FROM 
                 collectiontask ct
             JOIN 
@@ -126,6 +129,7 @@ def fetch_high_risk_customers():
                 'loan_last4': row.loan_last4,
                 'emi_amount': f'₹{row.emi_amount:,.0f}' if row.emi_amount else '₹0',
                 'due_date': row.due_date,
+                'risk_segment': row.risk_segment,
                 'status': row.status,
                 'current_language': '1'
             })
@@ -148,63 +152,6 @@ def fetch_high_risk_customers():
         print("Please verify your database connection and schema structure.")
         return []
 
-def update_task_status_in_db(task_id, status):
-    """
-    Updates a task's status in the database.
-    """
-    try:
-        session = Session()
-        update_query = text("""
-            UPDATE CollectionTask 
-            SET status = :status
-            WHERE task_id = :task_id
-            RETURNING task_id
-        """)
-        
-        result = session.execute(update_query, {
-            'task_id': task_id,
-            'status': status
-        })
-        
-        updated = result.rowcount > 0
-        session.commit()
-        session.close()
-        
-        if updated:
-            print(f"✅ Task {task_id} status updated to '{status}' in database")
-        else:
-            print(f"⚠️ Task {task_id} not found for status update")
-        
-        return updated
-    except Exception as e:
-        print(f"❌ Error updating task status: {e}")
-        return False
-def record_call_outcome(task_id, outcome_type, notes=None, ptp=False, ptp_date=None):
-    """
-    Records the outcome of a collection call in the CallOutcome table.
-    """
-    try:
-        session = Session()
-        query = text("""
-            INSERT INTO CallOutcome 
-            (task_id, outcome_type, ptp, ptp_date, notes) 
-            VALUES 
-            (:task_id, :outcome_type, :ptp, :ptp_date, :notes)
-        """)
-        
-        session.execute(query, {
-            'task_id': task_id, 
-            'outcome_type': outcome_type, 
-            'ptp': ptp, 
-            'ptp_date': ptp_date,
-            'notes': notes
-        })
-        session.commit()
-        session.close()
-        print(f"✅ Call outcome recorded for task {task_id}: {outcome_type}")
-    except Exception as e:
-        print(f"❌ Database error recording call outcome: {e}")
-
 # --- TwiML Decorator for Task Validation ---
 def require_task(f):
     @wraps(f)
@@ -212,7 +159,8 @@ def require_task(f):
         task_id = request.values.get('task_id')
         print(f"-> Executing {f.__name__} for Task ID: {task_id}")
 
-        if not task_id or task_id not in call_tasks:
+        task_details = call_task_store.get(task_id) if task_id else None
+        if not task_details:
             response = VoiceResponse()
             # Enhanced error message with more specific information and guidance
             response.say(
@@ -226,66 +174,40 @@ def require_task(f):
             response.hangup()
             return str(response)
         
-        task_details = call_tasks[task_id]
         lang_code_key = task_details.get('current_language', '1')
         lang_info = LANG_CONFIG.get(lang_code_key, LANG_CONFIG['1'])
         
-        return f(task_id, task_details, lang_info, *args, **kwargs)
+        started = time.perf_counter()
+        result = f(task_id, task_details, lang_info, *args, **kwargs)
+        call_flow.record_webhook(request.values.get('CallSid'), task_id, f.__name__, started)
+        return result
     return decorated_function
 
 # --- Helper Functions ---
-def translate_text(text, target_lang_key, target_lang_name):
-    try:
-        if target_lang_key == '1': return text
-        prompt_map = {
-            '2': f"Translate the following English text to Hindi. Only provide the translated text. Do not include any conversational filler. Text: '{text}'",
-            '3': f"Translate the following English text to Telugu. Only provide the translated text. Do not include any conversational filler. Text: '{text}'"
-        }
-        prompt_text = prompt_map.get(target_lang_key)
-        if not prompt_text: return text
-
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{"role": "user", "content": prompt_text}],
-            "max_tokens": 500, "temperature": 0.1,
-        })
-        response = bedrock_client.invoke_model(body=body, modelId=CLAUDE_MODEL_ID, accept="application/json", contentType="application/json")
-        response_body = json.loads(response.get('body').read())
-        translated_text = response_body.get('content', [{'text': ''}])[0].get('text', '').strip()
-        print(f"Translated to {target_lang_name}: {translated_text}")
-        return translated_text
-    except Exception as e:
-        print(f"❌ Error during translation to {target_lang_name}: {e}")
-        # Return a safe, user-facing error in English as a fallback
-        return "I am currently unable to provide service in the selected language."
-
 def update_call_status_and_outcome(task_id, status, outcome_notes):
-    if task_id in call_tasks:
-        call_tasks[task_id].update({
-            'status': status,
-            'call_outcome_notes': outcome_notes,
-            'timestamp': datetime.now().isoformat()
-        })
+    if call_task_store.set_status(task_id, status, call_outcome_notes=outcome_notes):
         print(f"✅ Task {task_id} updated to '{status}' with outcome: {outcome_notes}.")
         
-        # Update the status in the database as well
-        update_task_status_in_db(task_id, status)
-        
-        # Record the call outcome in the database
-        record_call_outcome(task_id, outcome_notes)
+        # Status and CallOutcome are written in one statement
+        try:
+            transition_tasks([task_id], status, outcome_type=outcome_notes)
+        except Exception as e:
+            print(f"❌ Database error recording call outcome for task {task_id}: {e}")
     else:
         print(f"⚠️ Task ID {task_id} not found for status update.")
 
 def send_whatsapp_summary(task_id, to_number, customer_name, loan_id, emi_amount, outcome):
     """
-    Sends a summary of the call outcome to the customer via WhatsApp.
+    Queues a summary of the call outcome to the customer on WhatsApp. The outbox sends it,
+    so the voice webhook doesn't wait on Twilio.
     """
     if not to_number:
         print("⚠️ Customer phone number not available. Skipping WhatsApp summary.")
         return
-    
+
+    formatted_number = to_number.replace(" ", "")
     summary_message = (
-        f"📱 Sounth India Finvest Bank Payment Reminder 📱\n\n"
+        f"📱 South India Finvest Bank Payment Reminder 📱\n\n"
         f"Hello {customer_name},\n\n"
         f"This is a follow-up to our recent call about your loan {loan_id}.\n"
         f"EMI Amount Due: {emi_amount}\n\n"
@@ -294,14 +216,10 @@ def send_whatsapp_summary(task_id, to_number, customer_name, loan_id, emi_amount
         f"Thank you for banking with us."
     )
     try:
-        message = client.messages.create(
-            from_=f'whatsapp:{TWILIO_PHONE_NUMBER}',
-            body=summary_message,
-            to=f'whatsapp:{to_number}'
-        )
-        print(f"✅ WhatsApp summary sent to customer at {to_number}. SID: {message.sid}")
+        message_id = outbox.enqueue('whatsapp', formatted_number, summary_message, purpose='call_summary')
+        print(f"✅ WhatsApp summary for task {task_id} queued for {formatted_number}. Outbox ID: {message_id}")
     except Exception as e:
-        print(f"❌ Failed to send WhatsApp summary to customer: {e}")
+        print(f"❌ Failed to queue WhatsApp summary to customer: {e}")
 
 def create_task_router_task(task_id, task_details, outcome, call_sid):
     """
@@ -350,9 +268,10 @@ def voice_language_select_handler(task_id, task_details, lang_info):
     digit_pressed = request.form.get('Digits')
     response = VoiceResponse()
     if digit_pressed in LANG_CONFIG:
-        call_tasks[task_id]['current_language'] = digit_pressed
+        call_task_store.update(task_id, current_language=digit_pressed)
+        task_details['current_language'] = digit_pressed
         print(f"Language for Task {task_id} set to: {LANG_CONFIG[digit_pressed]['name']}")
-        response.redirect(f'{NGROK_URL}/voice-confirm-identity?task_id={task_id}')
+        call_flow.go('confirm_identity', task_id, task_details, response)
     else:
         response.say("Invalid selection. Goodbye.", voice="Polly.Raveena", language="en-IN")
         response.hangup()
@@ -361,135 +280,80 @@ def voice_language_select_handler(task_id, task_details, lang_info):
 @app.route("/voice-confirm-identity", methods=['POST', 'GET'])
 @require_task
 def voice_confirm_identity(task_id, task_details, lang_info):
-    response = VoiceResponse()
-    customer_name = task_details.get("customer_name", "Valued Customer")
-    prompt_english = f"Hello, this is south india finvest Bank AI Assistant calling. Am I speaking with {customer_name}?"
-    prompt_translated = translate_text(prompt_english, task_details['current_language'], lang_info['name'])
-    
-    action_url = f"{NGROK_URL}/voice-handle-identity-confirmation?task_id={task_id}"
-    gather = Gather(input="speech", timeout="5", action=action_url, method="POST")
-    gather.say(prompt_translated, voice=lang_info['voice'], language=lang_info['code'])
-    response.append(gather)
-    
-    # Enhanced fallback message
-    fallback_prompt = translate_text(
-        "I'm sorry, I didn't hear your response. This call is regarding your loan account. "
-        "If this is a convenient time to talk, please say 'yes'. Otherwise, we'll try to reach you later.", 
-        task_details['current_language'], lang_info['name']
-    )
-    response.say(fallback_prompt, voice=lang_info['voice'], language=lang_info['code'])
-    response.hangup()
-    return str(response)
+    return str(call_flow.respond('confirm_identity', task_id, task_details))
 
 @app.route("/voice-handle-identity-confirmation", methods=['POST'])
 @require_task
 def voice_handle_identity_confirmation(task_id, task_details, lang_info):
     speech_result = request.form.get('SpeechResult', '').lower()
-    response = VoiceResponse()
     
     affirmative = ["yes", "yeah", "ok", "haan", "ha", "sari", "avunu", "hūdu"]
     negative = ["no", "nope", "nahi", "nahee", "ledu", "illa"]
 
     if any(keyword in speech_result for keyword in affirmative):
-        response.redirect(f'{NGROK_URL}/voice-emi-details?task_id={task_id}')
+        # EMI details, impact and the support offer go out in this one response
+        response = call_flow.go('emi_details', task_id, task_details)
     elif any(keyword in speech_result for keyword in negative):
-        prompt = translate_text("I understand. For security, I cannot proceed. Goodbye.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
         update_call_status_and_outcome(task_id, 'completed', 'Identity_Not_Confirmed')
-        response.hangup()
+        response = call_flow.respond('identity_not_confirmed', task_id, task_details)
     else:
-        prompt = translate_text("I didn't understand. Please say 'yes' or 'no'.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
-        response.redirect(f'{NGROK_URL}/voice-confirm-identity?task_id={task_id}')
+        response = call_flow.respond('identity_unclear', task_id, task_details)
     return str(response)
 
 @app.route("/voice-emi-details", methods=['POST', 'GET'])
 @require_task
 def voice_emi_details(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = f"Thank you. I'm calling about your loan ending in {task_details.get('loan_last4', 'XXXX')}, which has an outstanding EMI of {task_details.get('emi_amount', 'a certain amount')} due on {task_details.get('due_date', 'a recent date')}."
-    prompt2_english = "I understand payments can be delayed — I'm here to help you avoid any further impact."
-
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.pause(length=1)
-    response.say(translate_text(prompt2_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.redirect(f'{NGROK_URL}/voice-explain-impact?task_id={task_id}')
-    return str(response)
+    return str(call_flow.respond('emi_details', task_id, task_details))
 
 @app.route("/voice-explain-impact", methods=['POST', 'GET'])
 @require_task
 def voice_explain_impact(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = "Please note: if this EMI remains unpaid, it may be reported to the credit bureau, which can affect your credit score."
-    prompt2_english = "Continued delay may also classify your account as delinquent, leading to penalty charges or collection notices."
-
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.pause(length=2)
-    response.say(translate_text(prompt2_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    response.redirect(f'{NGROK_URL}/voice-offer-support?task_id={task_id}')
-    return str(response)
+    return str(call_flow.respond('explain_impact', task_id, task_details))
 
 @app.route("/voice-offer-support", methods=['POST', 'GET'])
 @require_task
 def voice_offer_support(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    prompt1_english = "If you're facing difficulties, we have options like part payments or revised EMI plans. Would you like me to connect to one of our agent,to assist you better ?"
-    
-    response.say(translate_text(prompt1_english, task_details['current_language'], lang_info['name']), voice=lang_info['voice'], language=lang_info['code'])
-    #if user is responding with negative feedback then this 
-    confirm_assistance_english = ""
-    confirm_assistance_translated = translate_text(confirm_assistance_english, task_details['current_language'], lang_info['name'])
-
-    action_url = f"{NGROK_URL}/voice-handle-support-choice?task_id={task_id}"
-    gather = Gather(input="speech", timeout="7", action=action_url, method="POST")
-    gather.say(confirm_assistance_translated, voice=lang_info['voice'], language=lang_info['code'])
-    response.append(gather)
-    
-    fallback_prompt = translate_text("We did not receive a clear response. Goodbye.", task_details['current_language'], lang_info['name'])
-    response.say(fallback_prompt, voice=lang_info['voice'], language=lang_info['code'])
-    response.hangup()
-    return str(response)
+    return str(call_flow.respond('offer_support', task_id, task_details))
 
 @app.route("/voice-handle-support-choice", methods=['POST'])
 @require_task
 def voice_handle_support_choice(task_id, task_details, lang_info):
     speech_result = request.form.get('SpeechResult', '').lower()
-    response = VoiceResponse()
 
     affirmative_keywords = ["yes", "yeah", "ok", "yep", "haan", "ha", "sari", "sare", "avunu", "hūdu", "pay", "payment", "help", "agent", "support"]
     
     if any(keyword in speech_result for keyword in affirmative_keywords):
-        response.redirect(f'{NGROK_URL}/voice-connect-to-agent?task_id={task_id}&outcome=Customer_Agreed_Assistance')
+        response = call_flow.go('connect_to_agent', task_id, task_details, outcome='Customer_Agreed_Assistance')
     else:
-        prompt = translate_text("I understand. If you change your mind, please call us back. Thank you. Goodbye.", task_details['current_language'], lang_info['name'])
-        response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
         update_call_status_and_outcome(task_id, 'completed', 'No_Agreement_For_Assistance')
-        response.hangup()
+        response = call_flow.respond('support_declined', task_id, task_details)
     return str(response)
 
-@app.route("/voice-connect-to-agent", methods=['POST', 'GET'])
-@require_task
-def voice_connect_to_agent(task_id, task_details, lang_info):
-    response = VoiceResponse()
-
-    call_outcome_notes = request.args.get('outcome', 'Agent_Requested')
-    update_call_status_and_outcome(task_id, 'agent_handoff', call_outcome_notes)
+@call_flow.stage('connect_to_agent', path='/voice-connect-to-agent')
+def connect_to_agent(task_id, task_details, lang_info, response, outcome='Agent_Requested'):
+    """
+    Hands the call to an agent: records the outcome, sends the WhatsApp summary, creates
+    the TaskRouter task and dials the agent.
+    """
+    update_call_status_and_outcome(task_id, 'agent_handoff', outcome)
+    campaign_dialer.record_handoff(task_details.get('campaign_id'), task_id)
     
     send_whatsapp_summary(
         task_id, task_details['customer_phone_number'], task_details['customer_name'],
-        task_details['loan_id_full'], task_details['emi_amount'], call_outcome_notes
+        task_details['loan_id_full'], task_details['emi_amount'], outcome
     )
 
-    create_task_router_task(task_id, task_details, call_outcome_notes, request.values.get('CallSid'))
+    create_task_router_task(task_id, task_details, outcome, request.values.get('CallSid'))
 
-    prompt = translate_text("Please wait while I connect you to an agent.", task_details['current_language'], lang_info['name'])
+    prompt = voice_prompts.render('connecting_agent', task_details['current_language'])
     response.say(prompt, voice=lang_info['voice'], language=lang_info['code'])
     response.dial(AGENT_PHONE_NUMBER)
-    
-    return str(response)
+
+@app.route("/voice-connect-to-agent", methods=['POST', 'GET'])
+@require_task
+def voice_connect_to_agent(task_id, task_details, lang_info):
+    call_outcome_notes = request.args.get('outcome', 'Agent_Requested')
+    return str(call_flow.respond('connect_to_agent', task_id, task_details, outcome=call_outcome_notes))
 
 # --- Manual Trigger Endpoint (Updated to use database) ---
 @app.route("/trigger-call", methods=['POST'])
@@ -524,7 +388,7 @@ def trigger_call():
         task_id = str(result.fetchone()[0])
         session.commit()
         
-        # Fetch complete customer details to populate call_tasks
+        # Fetch complete customer details for the call task store
         details_query = text("""
             SELECT 
                 c.full_name AS customer_name, 
@@ -553,7 +417,7 @@ def trigger_call():
         session.close()
         
         if customer_details:
-            call_tasks[task_id] = {
+            call_task_store.put(task_id, {
                 'status': 'pending',
                 'customer_id': customer_id,
                 'customer_name': customer_details.customer_name,
@@ -563,10 +427,10 @@ def trigger_call():
                 'emi_amount': f'₹{customer_details.emi_amount:,.0f}' if customer_details.emi_amount else '₹0',
                 'due_date': customer_details.due_date,
                 'current_language': '1'
-            }
+            })
         else:
             # Fall back to manually provided data if database doesn't return details
-            call_tasks[task_id] = {
+            call_task_store.put(task_id, {
                 'status': 'pending',
                 'customer_id': customer_id,
                 'customer_name': data.get('customer_name', 'Valued Customer'),
@@ -576,7 +440,7 @@ def trigger_call():
                 'emi_amount': data.get('emi_amount', '₹0'),
                 'due_date': data.get('due_date', 'upcoming'),
                 'current_language': '1'
-            }
+            })
         
         return jsonify({
             "message": "Task created in database. Use /start-campaign to initiate calls.", 
@@ -587,16 +451,41 @@ def trigger_call():
         print(f"❌ Error creating task: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/start-campaign", methods=['GET'])
+def _dial_campaign_call(task_id, task_details):
+    """
+    Places one campaign call. Run by the campaign dialer on a background thread.
+    """
+    call_task_store.set_status(task_id, 'dialing')
+    call = client.calls.create(
+        url=f'{NGROK_URL}/voice-language-select?task_id={task_id}',
+        to=task_details['customer_phone_number'],
+        from_=TWILIO_PHONE_NUMBER,
+        status_callback=f"{NGROK_URL}/voice-call-status?task_id={task_id}&campaign_id={task_details['campaign_id']}",
+        status_callback_event=['answered', 'completed']
+    )
+    call_task_store.update(task_id, call_sid=call.sid)
+    return call.sid
+
+def _release_campaign_tasks(task_ids):
+    """Returns the tasks of a cancelled campaign that were never dialed to 'pending'."""
+    released = transition_tasks(task_ids, 'pending', from_statuses=('in-progress',))
+    print(f"🔄 Returned {len(released)} undialed campaign tasks to 'pending'")
+
+# Campaign calls are placed by the dialer's background thread, within the campaign's limits
+campaign_dialer.start(_dial_campaign_call, release=_release_campaign_tasks)
+
+@app.route("/start-campaign", methods=['GET', 'POST'])
 def start_campaign():
     """
-    Initiates outbound calls for high-risk customers.
-    Now fetches tasks from the database and can also reset in-progress tasks to pending.
+    Queues outbound calls for high-risk customers on the campaign dialer and returns at once.
+    Can also reset in-progress tasks to pending first.
+    Query parameters: reset, max_concurrent, calls_per_second, pacing (predictive|fixed), agents.
     """
     try:
-        # Clear the existing call_tasks to start fresh
-        call_tasks.clear()
-        
+        active = campaign_dialer.active()
+        if active:
+            return jsonify({"error": "A campaign is already active", "campaign": active}), 409
+
         # Check if we should reset tasks (defaults to False)
         reset_tasks = request.args.get('reset', 'false').lower() == 'true'
         
@@ -618,44 +507,77 @@ def start_campaign():
         # Fetch high-risk customers from the database
         customers_to_call = fetch_high_risk_customers()
         
-        # Populate the call_tasks dictionary for easy lookup
-        for customer in customers_to_call:
-            task_id = customer['task_id']
-            call_tasks[task_id] = customer
+        # Claim the tasks in bulk; any that another worker already took are left out
+        claimed = set(transition_tasks([customer['task_id'] for customer in customers_to_call],
+                                       'in-progress', from_statuses=('pending',)))
+        customers_to_call = [customer for customer in customers_to_call if customer['task_id'] in claimed]
+
+        # Store the tasks in Redis so whichever worker receives a call's webhooks can serve it
+        call_task_store.put_many(customers_to_call)
         
         print(f"📞 Found {len(customers_to_call)} customers to call.")
 
-        calls_initiated_details = []
-        for customer in customers_to_call:
-            task_id = customer['task_id']
-            customer_phone_number = customer['customer_phone_number']
-            call_tasks[task_id]['status'] = 'dialing'
-            
-            # Update the task status in the database
-            update_task_status_in_db(task_id, 'in-progress')
-
-            call = client.calls.create(
-                url=f'{NGROK_URL}/voice-language-select?task_id={task_id}',
-                to=customer_phone_number,
-                from_=TWILIO_PHONE_NUMBER
-            )
-            calls_initiated_details.append({
-                'task_id': task_id,
-                'customer_name': customer['customer_name'],
-                'phone_number': customer_phone_number,
-                'call_sid': call.sid
-            })
-            print(f"✅ Call initiated to {customer_phone_number} for Task ID {task_id}. Call SID: {call.sid}")
+        campaign_id = campaign_dialer.create(
+            customers_to_call,
+            max_concurrent=request.args.get('max_concurrent', CAMPAIGN_MAX_CONCURRENT_CALLS, type=int),
+            calls_per_second=request.args.get('calls_per_second', CAMPAIGN_CALLS_PER_SECOND, type=float),
+            pacing=request.args.get('pacing', CAMPAIGN_PACING),
+            agents=request.args.get('agents', PACING_AGENTS, type=int)
+        )
 
         return jsonify({
-            "message": f"Campaign started. Calls initiated for {len(customers_to_call)} customers.",
-            "calls_initiated": calls_initiated_details,
+            "message": f"Campaign started. {len(customers_to_call)} calls will be placed in the background.",
+            "campaign": campaign_dialer.status(campaign_id),
             "tasks_reset": reset_tasks if reset_tasks else []
-        }), 200
+        }), 202
+    except CampaignAlreadyActive as e:
+        return jsonify({"error": str(e), "campaign": campaign_dialer.status(e.campaign_id)}), 409
     except Exception as e:
         print(f"Error starting campaign: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/campaign/active", methods=['GET'])
+def active_campaign():
+    return jsonify({"campaign": campaign_dialer.active()})
+
+@app.route("/campaign/<campaign_id>", methods=['GET'])
+def campaign_status(campaign_id):
+    status = campaign_dialer.status(campaign_id)
+    if not status:
+        return jsonify({"error": "Campaign not found"}), 404
+    return jsonify(status)
+
+@app.route("/campaign/<campaign_id>/<action>", methods=['POST'])
+def control_campaign(campaign_id, action):
+    """Pauses, resumes or cancels a campaign. Calls already in progress are not affected."""
+    controls = {'pause': campaign_dialer.pause, 'resume': campaign_dialer.resume, 'cancel': campaign_dialer.cancel}
+    status = campaign_dialer.status(campaign_id)
+    if action not in controls or not status:
+        return jsonify({"error": "Campaign or action not found"}), 404
+    if not controls[action](campaign_id):
+        return jsonify({"error": f"Cannot {action} a {status['status']} campaign", "campaign": status}), 409
+    return jsonify(campaign_dialer.status(campaign_id))
+
+@app.route("/voice-call-status", methods=['POST'])
+def voice_call_status():
+    """
+    Twilio status callback for campaign calls. An ended call frees its dialer slot; calls
+    that were never answered are marked failed so /reset-tasks can requeue them, and their
+    CallOutcome (Call_no-answer, Call_busy, ...) feeds the predictive pacer's answer rates.
+    Answered calls that hung up before the flow recorded an outcome get ANSWERED_NO_OUTCOME,
+    so every ended call has exactly one CallOutcome.
+    """
+    task_id = request.values.get('task_id')
+    call_status = request.values.get('CallStatus')
+    ended = campaign_dialer.record_call_status(request.values.get('campaign_id'), task_id, call_status)
+    if ended and call_status != 'completed':
+        update_call_status_and_outcome(task_id, 'failed', f"Call_{call_status}")
+    elif ended:
+        task_details = call_task_store.get(task_id)
+        if task_details and not task_details.get('call_outcome_notes'):
+            update_call_status_and_outcome(task_id, 'completed', ANSWERED_NO_OUTCOME)
+    return '', 204
+
 @app.route("/api/customers", methods=['GET'])
 def get_customers():
     """
@@ -1006,33 +928,6 @@ def whatsapp_webhook():
         )
         return str(resp)
 
-# Keep your existing send_whatsapp_summary function exactly as it is
-def send_whatsapp_summary(task_id, to_number, customer_name, loan_id, emi_amount, outcome):
-    """
-    Sends a summary of the call outcome to the customer via WhatsApp.
-    """
-    if not to_number:
-        print("⚠️ Customer phone number not available. Skipping WhatsApp summary.")
-        return
-    
-    summary_message = (
-        f"📱 Sounth India Finvest Bank Payment Reminder 📱\n\n"
-        f"Hello {customer_name},\n\n"
-        f"This is a follow-up to our recent call about your loan {loan_id}.\n"
-        f"EMI Amount Due: {emi_amount}\n\n"
-        f"To make your payment online, please visit: https://southindiafinvest.com/payment/\n"
-        f"For assistance, call our support at 1800-123-4567\n\n"
-        f"Thank you for banking with us."
-    )
-    try:
-        message = client.messages.create(
-            from_=f'whatsapp:{TWILIO_PHONE_NUMBER}',
-            body=summary_message,
-            to=f'whatsapp:{to_number}'
-        )
-        print(f"✅ WhatsApp summary sent to customer at {to_number}. SID: {message.sid}")
-    except Exception as e:
-        print(f"❌ Failed to send WhatsApp summary to customer: {e}")
 @app.route("/api/debug", methods=['GET'])
 def debug_info():
     """
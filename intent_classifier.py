@@ -1,47 +1,32 @@
 import re
+from datetime import date, datetime
+from typing import Dict, List, Tuple
 
-def classify_intent(message):
-    """
-    A simple rule-based classifier that extracts intent from a message.
-    
-    Args:
-        message (str): The user's message
-        
-    Returns:
-        str: 'emi', 'balance', 'loan', or 'unclear'
-    """
-    if not message:
-        return "unclear"
-    
-    # Convert to lowercase for case-insensitive matching
-    message = message.lower()
-    
-    # Check for agent request patterns
-    agent_request_patterns = [
+from config import ACCOUNT_ID_PATTERN
+
+# Rule patterns per intent. They use a small regex subset: literal text, \b word
+# boundaries and .* ("followed later on the same line by"), so the whole set can be
+# compiled into one keyword scanner instead of ~35 separate re.search calls.
+INTENT_PATTERNS = {
+    # Agent requests are handled in the app.py chat endpoint
+    'agent': [
         r'speak.*agent', r'talk.*agent', r'human', r'real person',
         r'customer service', r'representative', r'speak.*person', r'talk.*person',
         r'not.*understand', r'confused', r'complicated', r'complex', r'difficult'
-    ]
-    
-    for pattern in agent_request_patterns:
-        if re.search(pattern, message):
-            # This will be handled in the app.py chat endpoint
-            return "unclear"
-    
+    ],
     # EMI related keywords
-    emi_patterns = [
-        r'\bemi\b', 
-        r'installment', 
+    'emi': [
+        r'\bemi\b',
+        r'installment',
         r'monthly payment',
         r'next payment',
         r'payment date',
         r'when.*due',
         r'payment.*history',
         r'recent payment'
-    ]
-    
+    ],
     # Balance related keywords
-    balance_patterns = [
+    'balance': [
         r'\bbalance\b',
         r'how much.*account',
         r'how much.*money',
@@ -49,10 +34,9 @@ def classify_intent(message):
         r'credit.*available',
         r'account.*status',
         r'account.*amount'
-    ]
-    
+    ],
     # Loan related keywords
-    loan_patterns = [
+    'loan': [
         r'\bloan\b',
         r'principal',
         r'interest rate',
@@ -63,30 +47,273 @@ def classify_intent(message):
         r'loan.*amount',
         r'loan.*status',
         r'loan.*type'
-    ]
-    
-    # Check for EMI patterns
-    for pattern in emi_patterns:
-        if re.search(pattern, message):
-            return "emi"
-    
-    # Check for Balance patterns
-    for pattern in balance_patterns:
-        if re.search(pattern, message):
-            return "balance"
-    
-    # Check for Loan patterns
-    for pattern in loan_patterns:
-        if re.search(pattern, message):
-            return "loan"
-    
-    # Button text matches
-    if "my emi" in message:
-        return "emi"
-    elif "my account balance" in message:
-        return "balance"
-    elif "my loan amount" in message or "my loan" in message:
-        return "loan"
-    
-    # If no patterns match, intent is unclear
-    return "unclear"
+    ],
+}
+
+# Button texts, matched as plain substrings when no rule above fires ("show my loans")
+BUTTON_PHRASES = [
+    ('my emi', 'emi'),
+    ('my account balance', 'balance'),
+    ('my loan', 'loan'),
+]
+
+_MONTHS = 'jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec'
+
+# Entities extracted alongside the intent (the text is lowercased first). Earlier patterns
+# win at a position; an amount or date pattern with a group yields only that group.
+ENTITY_PATTERNS = [
+    ('account_id', rf'(?<![a-z0-9])(?i:{ACCOUNT_ID_PATTERN})(?![a-z0-9])'),
+    ('date', r'(?<![\d/-])(?:\d{4}-\d{2}-\d{2}|\d{1,2}[/-]\d{1,2}[/-](?:\d{4}|\d{2}))(?![\d/-])'),
+    ('date', rf'(?<!\d)\d{{1,2}}(?:st|nd|rd|th)?\s+(?:{_MONTHS})[a-z]*\.?(?:,?\s+\d{{4}})?(?![a-z0-9])'),
+    ('amount', r'(?:(?<![a-z])(?:rs\.?|inr)|₹)\s*(\d[\d,]*(?:\.\d+)?)'),
+    ('amount', r'(?<![\d.,])(\d[\d,]*(?:\.\d+)?)\s*(?:rupees|rs\b|inr\b)'),
+    ('otp', r'(?<!\d)\d{6}(?!\d)'),
+]
+
+# Ties are broken in this order (the order the rules used to be checked in)
+INTENT_PRIORITY = ('agent', 'emi', 'balance', 'loan')
+_PRIORITY_ORDER = {intent: i for i, intent in enumerate(INTENT_PRIORITY)}
+
+_DIGIT = re.compile(r'\d')
+_REGEX_METACHARS = set('\\.*+?[](){}|^$')
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class _Rule:
+    def __init__(self, intent, pattern):
+        self.intent = intent
+        self.pattern = pattern
+        self.parts = []
+        for piece in pattern.split('.*'):
+            left, right = piece.startswith(r'\b'), piece.endswith(r'\b')
+            literal = piece[2 if left else 0:len(piece) - 2 if right else len(piece)]
+            if not literal or _REGEX_METACHARS & set(literal):
+                raise ValueError(f"Unsupported intent pattern {pattern!r}: only literals, \\b and .* are allowed")
+            self.parts.append((literal, left, right))
+        # Multi-part and multi-word patterns are more specific than a single keyword
+        self.weight = 1.5 if len(self.parts) > 1 or ' ' in self.parts[0][0] else 1.0
+        # A plain keyword matches whenever it occurs
+        self.plain = len(self.parts) == 1 and not (self.parts[0][1] or self.parts[0][2])
+
+    @staticmethod
+    def _valid(text, start, end, left, right):
+        if left and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if right and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def _match_from(self, text, occurrences, index, position):
+        if index == len(self.parts):
+            return True
+        literal, left, right = self.parts[index]
+        for start, end in occurrences.get(literal, ()):
+            if start < position or not self._valid(text, start, end, left, right):
+                continue
+            # '.*' does not cross line breaks
+            if index and '\n' in text[position:start]:
+                break
+            if self._match_from(text, occurrences, index + 1, end):
+                return True
+        return False
+
+    def matches(self, text, occurrences):
+        return self._match_from(text, occurrences, 0, 0)
+
+
+def _trie_regex(words):
+    """Builds a prefix-factored alternation that prefers the longest word at each position."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def _parse_date(value):
+    """Normalises a matched date to ISO format; day-first, as customers write them. None if invalid."""
+    value = re.sub(r'(?<=\d)(?:st|nd|rd|th)\b|[.,]', '', value)
+    value = re.sub(r'([a-z]{3})[a-z]*', r'\1', value)
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d %b %Y'):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    try:
+        # "15th jan" means the next 15 January
+        parsed = datetime.strptime(f"{value} {date.today().year}", '%d %b %Y').date()
+    except ValueError:
+        return None
+    if parsed < date.today():
+        parsed = parsed.replace(year=parsed.year + 1)
+    return parsed.isoformat()
+
+
+class IntentMatcher:
+    """
+    Scores every intent in one scan of the message and pulls out entities in another.
+
+    All literal keywords are compiled into a single lookahead regex, so one finditer
+    pass yields every keyword occurrence (including overlapping ones); the rules are
+    then evaluated against those occurrences. The entity patterns are one alternation.
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]] = INTENT_PATTERNS, entity_patterns=ENTITY_PATTERNS,
+                 button_phrases=BUTTON_PHRASES):
+        self.button_phrases = button_phrases
+        self.rules = [_Rule(intent, pattern) for intent, intent_patterns in patterns.items()
+                      for pattern in intent_patterns]
+        literals = {literal for rule in self.rules for literal, _, _ in rule.parts}
+        # A rule can only match if its first keyword occurs, so only those rules are evaluated
+        self._rules_by_literal = {}
+        for rule in self.rules:
+            self._rules_by_literal.setdefault(rule.parts[0][0], []).append(rule)
+        # The scanner reports the longest keyword at each position; shorter keywords
+        # starting at the same position are its prefixes
+        self._prefixes = {literal: [other for other in literals if literal.startswith(other)] for literal in literals}
+
+        self._scanner = re.compile(f"(?=({_trie_regex(literals)}))")
+
+        # Every entity contains a digit, so messages without one skip the entity scan
+        self._entities = {f"e{i}": (kind, re.compile(pattern)) for i, (kind, pattern) in enumerate(entity_patterns)}
+        self._entity_scanner = re.compile("|".join(f"(?P<{name}>{regex.pattern})"
+                                                   for name, (_, regex) in self._entities.items()))
+
+    def _occurrences(self, text):
+        occurrences = {}
+        for match in self._scanner.finditer(text):
+            start = match.start()
+            for literal in self._prefixes[match.group(1)]:
+                occurrences.setdefault(literal, []).append((start, start + len(literal)))
+        return occurrences
+
+    def _entity_values(self, text):
+        """(kind, value) pairs in order; an entity consumes its span, so no OTP is read out of an amount."""
+        if not _DIGIT.search(text):
+            return []
+        values = []
+        for match in self._entity_scanner.finditer(text):
+            kind, regex = self._entities[match.lastgroup]
+            value = regex.match(text, match.start()) if regex.groups else match
+            values.append((kind, value.group(1) if regex.groups else value.group(0)))
+        return values
+
+    def _score(self, text, occurrences) -> Dict[str, float]:
+        scores = {}
+        for literal in occurrences:
+            for rule in self._rules_by_literal.get(literal, ()):
+                if rule.plain or rule.matches(text, occurrences):
+                    scores[rule.intent] = scores.get(rule.intent, 0.0) + rule.weight
+        if not scores:
+            for phrase, intent in self.button_phrases:
+                if phrase in text:
+                    return {intent: 1.0}
+        return scores
+
+    @staticmethod
+    def _ranked(scores) -> List[Tuple[str, float]]:
+        total = sum(scores.values())
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], _PRIORITY_ORDER.get(item[0], len(_PRIORITY_ORDER))))
+        # More matching evidence pushes confidence toward 1; competing intents pull it down
+        return [(intent, round(score / (total + 0.5), 3)) for intent, score in ranked]
+
+    def scores(self, message: str) -> Dict[str, float]:
+        text = message.lower()
+        return self._score(text, self._occurrences(text))
+
+    def rank(self, message: str) -> List[Tuple[str, float]]:
+        """
+        Returns:
+            list: (intent, confidence) pairs, best first; empty when nothing matched
+        """
+        return self._ranked(self.scores(message)) if message else []
+
+    def extract(self, message: str) -> Dict:
+        """
+        Returns:
+            dict: ranked intents plus the account_id, otp, amounts and dates found in the message
+        """
+        result = {"intents": [], "account_id": None, "otp": None, "amounts": [], "dates": []}
+        if not message:
+            return result
+        text = message.lower()
+        result["intents"] = self._ranked(self._score(text, self._occurrences(text)))
+        for kind, value in self._entity_values(text):
+            if kind == 'account_id':
+                result["account_id"] = result["account_id"] or value.upper()
+            elif kind == 'otp':
+                result["otp"] = result["otp"] or value
+            elif kind == 'amount':
+                result["amounts"].append(float(value.replace(',', '')))
+            elif kind == 'date':
+                parsed = _parse_date(value)
+                if parsed:
+                    result["dates"].append(parsed)
+        return result
+
+
+# Initialize global intent matcher (patterns are compiled once)
+intent_matcher = IntentMatcher()
+
+
+def rank_intents(message):
+    """
+    Ranks every intent the rules find in a message.
+
+    Args:
+        message (str): The user's message
+
+    Returns:
+        list: (intent, confidence) pairs, best first; 'agent' marks a request for a human
+    """
+    return intent_matcher.rank(message)
+
+
+def _top_intent(ranked):
+    if not ranked or any(intent == 'agent' for intent, _ in ranked):
+        # Agent requests will be handled in the app.py chat endpoint
+        return "unclear"
+    return ranked[0][0]
+
+
+def classify_intent(message):
+    """
+    A simple rule-based classifier that extracts intent from a message.
+
+    Args:
+        message (str): The user's message
+
+    Returns:
+        str: 'emi', 'balance', 'loan', or 'unclear'
+    """
+    return _top_intent(rank_intents(message))
+
+
+def extract_entities(message):
+    """
+    Classifies the intent and extracts entities in a single scan, so a message like
+    "what's my EMI for CC11261684" can skip the Account ID prompt.
+
+    Args:
+        message (str): The user's message
+
+    Returns:
+        dict: {'intent': as classify_intent, 'intents': ranked (intent, confidence) pairs,
+               'account_id': str or None, 'otp': str or None, 'amounts': [float], 'dates': [ISO date str]}
+    """
+    result = intent_matcher.extract(message)
+    result['intent'] = _top_intent(result['intents'])
+    return result
@@ -0,0 +1,94 @@
+import os
+import logging
+from typing import List, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import FeatureUnion, make_pipeline
+
+from config import INTENT_MODEL_PATH, INTENT_MODEL_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+INTENT_LABELS = ['emi', 'balance', 'loan', 'unclear']
+
+
+def _build_pipeline():
+    # Hashed features keep the model small and need no fitted vocabulary:
+    # word uni/bi-grams for phrasing, char n-grams for typos and Hinglish spellings.
+    features = FeatureUnion([
+        ("words", HashingVectorizer(analyzer="word", ngram_range=(1, 2), n_features=2 ** 18,
+                                    alternate_sign=False, lowercase=True)),
+        ("chars", HashingVectorizer(analyzer="char_wb", ngram_range=(2, 4), n_features=2 ** 18,
+                                    alternate_sign=False, lowercase=True)),
+    ])
+    return make_pipeline(features, LogisticRegression(max_iter=1000, C=4.0))
+
+
+class IntentModel:
+    """
+    CPU-only intent classifier (hashed n-grams + logistic regression) used in place of the
+    Bedrock intent call when the rule-based classifier returns 'unclear'.
+    """
+
+    def __init__(self, pipeline=None, threshold=INTENT_MODEL_THRESHOLD):
+        self.pipeline = pipeline
+        self.threshold = threshold
+
+    @property
+    def is_trained(self) -> bool:
+        return self.pipeline is not None
+
+    def train(self, texts: List[str], labels: List[str]) -> "IntentModel":
+        self.pipeline = _build_pipeline()
+        self.pipeline.fit(texts, labels)
+        return self
+
+    def predict_batch(self, texts: List[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Vectorized inference over a batch of messages.
+
+        Returns:
+            tuple: (labels, confidences) where confidence is the top class probability
+        """
+        if not self.is_trained or not texts:
+            return ['unclear'] * len(texts), np.zeros(len(texts))
+        probabilities = self.pipeline.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        classes = self.pipeline.classes_
+        return [classes[i] for i in best], probabilities[np.arange(len(texts)), best]
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        labels, confidences = self.predict_batch([text])
+        return labels[0], float(confidences[0])
+
+    def confident_intent(self, text: str) -> Optional[str]:
+        """Returns the predicted intent, or None when confidence is below the threshold."""
+        if not self.is_trained:
+            return None
+        label, confidence = self.predict(text)
+        logger.info(f"Local intent model: {label} ({confidence:.2f}) for '{text[:30]}...'")
+        return label if confidence >= self.threshold else None
+
+    def save(self, path: str = INTENT_MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({"pipeline": self.pipeline, "labels": INTENT_LABELS}, path)
+        logger.info(f"Intent model saved to {path}")
+
+    @classmethod
+    def load(cls, path: str = INTENT_MODEL_PATH) -> "IntentModel":
+        """Loads the trained model; an untrained instance is returned if the file is missing."""
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ No intent model at {path}; unclear intents will go to Bedrock.")
+            return cls()
+        try:
+            return cls(pipeline=joblib.load(path)["pipeline"])
+        except Exception as e:
+            logger.error(f"❌ Failed to load intent model from {path}: {e}")
+            return cls()
+
+
+# Loaded once at import (application startup)
+intent_model = IntentModel.load()
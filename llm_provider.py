@@ -0,0 +1,143 @@
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+from bedrock_gateway import bedrock_gateway, BedrockUnavailableError
+from bedrock_async import async_bedrock
+from model_router import model_router
+from prompt_builder import max_tokens_for, log_usage
+from config import LLM_PROVIDER, BEDROCK_HEDGE_ENABLED, BEDROCK_HEDGE_CALL_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponse:
+    def __init__(self, text: str, usage: Dict = None, model_id: str = None):
+        self.text = text
+        self.usage = usage or {}
+        self.model_id = model_id
+
+
+class LLMProvider(ABC):
+    """
+    Interface for LLM backends. Call sites pass a call type ('chat', 'summary', 'intent',
+    'translate', ...) and messages in the Messages API shape; the provider decides which
+    model serves that call type and how to reach it.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def complete(self, call_type: str, messages: List[Dict], system: str = None,
+                 temperature: float = None, max_tokens: int = None) -> LLMResponse:
+        ...
+
+    @abstractmethod
+    def stream(self, call_type: str, messages: List[Dict], system: str = None,
+               temperature: float = None, max_tokens: int = None, usage: Optional[Dict] = None) -> Iterator[str]:
+        """Yields text deltas; token usage is written into `usage` once the stream ends."""
+
+    @abstractmethod
+    def embed(self, text: str) -> List[float]:
+        ...
+
+
+class BedrockProvider(LLMProvider):
+    """
+    Anthropic models and Titan embeddings on Bedrock, through bedrock_gateway (and the
+    hedged async client for the short call types). model_router picks the model for each
+    call type. Set BEDROCK_ENDPOINT_URL to run against llm_stub_server.py instead of AWS.
+    """
+
+    name = "bedrock"
+
+    def __init__(self, router=model_router):
+        self.router = router
+
+    def _body(self, call_type, messages, system, temperature, max_tokens) -> Dict:
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens or max_tokens_for(call_type),
+            "messages": messages,
+        }
+        if system:
+            body["system"] = system
+        if temperature is not None:
+            body["temperature"] = temperature
+        return body
+
+    def complete(self, call_type, messages, system=None, temperature=None, max_tokens=None) -> LLMResponse:
+        tier, model = self.router.route(call_type)
+        body = self._body(call_type, messages, system, temperature, max_tokens)
+        started = time.monotonic()
+        try:
+            if BEDROCK_HEDGE_ENABLED and call_type in BEDROCK_HEDGE_CALL_TYPES:
+                response_body = async_bedrock.invoke_sync(call_type, body, model["model_id"], region=model["region"])
+            else:
+                response_body = bedrock_gateway.invoke(call_type, body, model["model_id"], region=model["region"])
+        except BedrockUnavailableError:
+            self.router.record(call_type, tier, (time.monotonic() - started) * 1000, failed=True)
+            raise
+
+        usage = response_body.get('usage', {})
+        self.router.record(call_type, tier, (time.monotonic() - started) * 1000, usage)
+        log_usage(call_type, messages, usage)
+        # Claude 3 models return content as a list of content blocks
+        text = "".join(block['text'] for block in response_body.get('content', []) if block.get('type') == 'text')
+        return LLMResponse(text, usage, model["model_id"])
+
+    def stream(self, call_type, messages, system=None, temperature=None, max_tokens=None, usage=None):
+        tier, model = self.router.route(call_type)
+        body = self._body(call_type, messages, system, temperature, max_tokens)
+        usage = {} if usage is None else usage
+
+        started = time.monotonic()
+        first_token_ms = None
+        try:
+            for event in bedrock_gateway.invoke_stream(call_type, body, model["model_id"], region=model["region"]):
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                payload = json.loads(chunk['bytes'])
+                if payload.get('type') == 'message_start':
+                    usage.update(payload.get('message', {}).get('usage', {}))
+                elif payload.get('type') == 'message_delta':
+                    usage.update(payload.get('usage', {}))
+                if payload.get('type') == 'content_block_delta' and payload['delta'].get('type') == 'text_delta':
+                    if first_token_ms is None:
+                        first_token_ms = (time.monotonic() - started) * 1000
+                        logger.info(f"Bedrock stream time-to-first-token: {first_token_ms:.0f} ms")
+                    yield payload['delta']['text']
+        except BedrockUnavailableError:
+            self.router.record(call_type, tier, (time.monotonic() - started) * 1000, failed=True)
+            raise
+
+        logger.info(f"Bedrock stream completed in {(time.monotonic() - started) * 1000:.0f} ms")
+        # Streams are routed on time to first token
+        self.router.record(call_type, tier, first_token_ms or (time.monotonic() - started) * 1000, usage)
+        log_usage(call_type, messages, usage)
+
+    def embed(self, text: str) -> List[float]:
+        tier, model = self.router.route("embedding")
+        started = time.monotonic()
+        result = bedrock_gateway.invoke("embedding", {"inputText": text}, model["model_id"], region=model["region"])
+        self.router.record("embedding", tier, (time.monotonic() - started) * 1000,
+                           {"input_tokens": result.get("inputTextTokenCount", 0)})
+        return result.get("embedding")
+
+
+PROVIDERS = {
+    "bedrock": BedrockProvider,
+}
+
+
+def get_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}'. Available: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+# Initialize global LLM provider
+llm = get_provider()
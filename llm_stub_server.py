@@ -0,0 +1,230 @@
+import re
+import json
+import math
+import time
+import zlib
+import base64
+import random
+import struct
+import logging
+import argparse
+import threading
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bedrock_stub import prompt_class, canned_text, stub_embedding
+
+# Local HTTP server speaking the bedrock-runtime InvokeModel / InvokeModelWithResponseStream
+# wire protocol, so boto3 clients pointed at it (BEDROCK_ENDPOINT_URL) run the chat,
+# WhatsApp and voice flows offline. Latency, error rates and canned responses are set
+# per prompt class (intent, summary, translate, chat, embedding).
+
+logger = logging.getLogger(__name__)
+
+ROUTE = re.compile(r"^/model/(?P<model_id>[^/]+)/(?P<operation>invoke|invoke-with-response-stream)$")
+
+# Latency is log-normal, fitted to the median and p99; for streams it is the time to first token
+DEFAULT_PROFILES = {
+    "intent": {"median_ms": 350, "p99_ms": 1500, "error_rate": 0.0, "throttle_rate": 0.0},
+    "translate": {"median_ms": 600, "p99_ms": 2500, "error_rate": 0.0, "throttle_rate": 0.0},
+    "summary": {"median_ms": 2500, "p99_ms": 8000, "error_rate": 0.0, "throttle_rate": 0.0},
+    "chat": {"median_ms": 1800, "p99_ms": 6000, "error_rate": 0.0, "throttle_rate": 0.0, "delta_ms": 40},
+    "embedding": {"median_ms": 120, "p99_ms": 600, "error_rate": 0.0, "throttle_rate": 0.0},
+}
+
+Z_99 = 2.326
+
+
+def encode_event(payload: bytes, event_type: str = "chunk") -> bytes:
+    """Encodes one AWS event-stream message (prelude, string headers, payload, CRCs)."""
+    headers = b""
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"), (":message-type", "event")):
+        name_bytes, value_bytes = name.encode(), value.encode()
+        headers += struct.pack("!B", len(name_bytes)) + name_bytes + b"\x07" + struct.pack("!H", len(value_bytes)) + value_bytes
+    prelude = struct.pack("!II", 16 + len(headers) + len(payload), len(headers))
+    message = prelude + struct.pack("!I", zlib.crc32(prelude)) + headers + payload
+    return message + struct.pack("!I", zlib.crc32(message))
+
+
+def chunk_event(event: dict) -> bytes:
+    """A ResponseStream 'chunk' carrying one Anthropic streaming event."""
+    data = base64.b64encode(json.dumps(event).encode("utf-8")).decode("ascii")
+    return encode_event(json.dumps({"bytes": data}).encode("utf-8"))
+
+
+class StubBedrockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profiles=None, responses=None, latency_scale=1.0, seed=None):
+        super().__init__(address, StubBedrockHandler)
+        self.profiles = {kind: dict(profile) for kind, profile in DEFAULT_PROFILES.items()}
+        for kind, overrides in (profiles or {}).items():
+            self.profiles.setdefault(kind, dict(DEFAULT_PROFILES["chat"])).update(overrides)
+        self.responses = responses or {}
+        self.latency_scale = latency_scale
+        self.counters = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, kind: str, counter: str):
+        with self._lock:
+            stats = self.counters.setdefault(kind, {"requests": 0, "streams": 0, "throttled": 0, "errors": 0})
+            stats[counter] += 1
+
+    def sample_latency(self, profile: dict) -> float:
+        """Seconds, drawn from a log-normal with the profile's median and p99."""
+        median = max(1.0, profile["median_ms"])
+        sigma = max(0.0, math.log(max(profile["p99_ms"], median) / median) / Z_99)
+        with self._lock:
+            value = self._random.lognormvariate(math.log(median), sigma)
+        return value * self.latency_scale / 1000.0
+
+    def sample_failure(self, profile: dict):
+        with self._lock:
+            roll = self._random.random()
+        if roll < profile.get("throttle_rate", 0.0):
+            return 429, "ThrottlingException", "Too many requests, please wait before trying again."
+        if roll < profile.get("throttle_rate", 0.0) + profile.get("error_rate", 0.0):
+            return 503, "ServiceUnavailableException", "Service unavailable (stub)."
+        return None
+
+    def response_text(self, kind: str, body: dict) -> str:
+        configured = self.responses.get(kind)
+        if isinstance(configured, list) and configured:
+            with self._lock:
+                return self._random.choice(configured)
+        return configured or canned_text(body)
+
+
+class StubBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server._lock:
+                return self._send_json(200, {"counters": self.server.counters, "profiles": self.server.profiles})
+        self._send_json(404, {"message": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        match = ROUTE.match(self.path)
+        if not match:
+            return self._send_json(404, {"message": f"Unknown path {self.path}"},
+                                   {"x-amzn-ErrorType": "ResourceNotFoundException"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"message": "Malformed input request"}, {"x-amzn-ErrorType": "ValidationException"})
+
+        model_id = unquote(match.group("model_id"))
+        kind = prompt_class(body, model_id)
+        profile = self.server.profiles.get(kind, self.server.profiles["chat"])
+        streaming = match.group("operation") == "invoke-with-response-stream"
+        self.server.count(kind, "streams" if streaming else "requests")
+
+        failure = self.server.sample_failure(profile)
+        if failure:
+            status, code, message = failure
+            self.server.count(kind, "throttled" if status == 429 else "errors")
+            # Failures come back quickly, like real throttling
+            time.sleep(min(self.server.sample_latency(profile), 0.05))
+            return self._send_json(status, {"message": message}, {"x-amzn-ErrorType": code})
+
+        time.sleep(self.server.sample_latency(profile))
+        if kind == "embedding":
+            text = body.get("inputText", "")
+            return self._send_json(200, {"embedding": stub_embedding(text), "inputTextTokenCount": len(text.split())})
+
+        text = self.server.response_text(kind, body)
+        usage = {"input_tokens": length // 4, "output_tokens": max(1, len(text) // 4)}
+        if not streaming:
+            return self._send_json(200, {
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": model_id,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn", "usage": usage,
+            })
+        self._stream(text, usage, profile)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, text: str, usage: dict, profile: dict, words_per_delta: int = 3):
+        started = time.time()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("X-Amzn-Bedrock-Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self._write_chunk(chunk_event({"type": "message_start", "message": {
+            "id": "msg_stub", "role": "assistant", "content": [], "usage": {"input_tokens": usage["input_tokens"]}}}))
+        self._write_chunk(chunk_event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}))
+        words = text.split(" ")
+        delta_delay = profile.get("delta_ms", 40) * self.server.latency_scale / 1000.0
+        for i in range(0, len(words), words_per_delta):
+            if i:
+                time.sleep(delta_delay)
+            piece = " ".join(words[i:i + words_per_delta])
+            if i + words_per_delta < len(words):
+                piece += " "
+            self._write_chunk(chunk_event({"type": "content_block_delta", "index": 0,
+                                           "delta": {"type": "text_delta", "text": piece}}))
+        self._write_chunk(chunk_event({"type": "content_block_stop", "index": 0}))
+        self._write_chunk(chunk_event({"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                                       "usage": {"output_tokens": usage["output_tokens"]}}))
+        self._write_chunk(chunk_event({"type": "message_stop", "amazon-bedrock-invocationMetrics": {
+            "invocationLatency": int((time.time() - started) * 1000)}}))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def load_config(path):
+    """
+    Reads a JSON file of the form
+    {"profiles": {"intent": {"median_ms": 200, "p99_ms": 900, "throttle_rate": 0.02}, ...},
+     "responses": {"chat": ["...", "..."], "translate": "..."}}
+    """
+    if not path:
+        return {}, {}
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return config.get("profiles", {}), config.get("responses", {})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local bedrock-runtime stub with latency and error injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--config", help="JSON file with per-prompt-class profiles and canned responses")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply all sampled latencies (0 = no delay)")
+    parser.add_argument("--throttle-rate", type=float, help="Override throttle_rate for every prompt class")
+    parser.add_argument("--error-rate", type=float, help="Override error_rate for every prompt class")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    profiles, responses = load_config(args.config)
+    server = StubBedrockServer((args.host, args.port), profiles, responses, args.latency_scale, args.seed)
+    for profile in server.profiles.values():
+        if args.throttle_rate is not None:
+            profile["throttle_rate"] = args.throttle_rate
+        if args.error_rate is not None:
+            profile["error_rate"] = args.error_rate
+
+    print(f"🧪 Stub Bedrock listening on http://{args.host}:{args.port} (set BEDROCK_ENDPOINT_URL to this URL)")
+    server.serve_forever()
@@ -0,0 +1,182 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Tuple
+
+from config import (
+    AWS_REGION, MODEL_TIERS, MODEL_ROUTES, MODEL_ROUTING_WINDOW, MODEL_ROUTING_MIN_SAMPLES,
+    MODEL_ROUTING_RECOVERY_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class Histogram:
+    """Fixed-bucket histogram; snapshot buckets are cumulative (count of values <= bound)."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict:
+        buckets, running = {}, 0
+        for bound, count in zip(list(self.bounds) + ["inf"], self.counts):
+            running += count
+            buckets[f"le_{bound}"] = running
+        return {"count": self.count, "sum": round(self.total, 1), "buckets": buckets}
+
+
+class _TierStats:
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.input_tokens = Histogram(TOKEN_BUCKETS)
+        self.output_tokens = Histogram(TOKEN_BUCKETS)
+        self.errors = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "latency_ms": self.latency_ms.snapshot(),
+            "input_tokens": self.input_tokens.snapshot(),
+            "output_tokens": self.output_tokens.snapshot(),
+            "errors": self.errors,
+        }
+
+
+class _RouteState:
+    def __init__(self, route: Dict, window: int):
+        self.tiers = route["tiers"]
+        self.slo_p95_ms = route.get("slo_p95_ms")
+        self.index = 0
+        self.window = deque(maxlen=window)
+        self.changed_at = time.monotonic()
+        self.downgrades = 0
+        self.upgrades = 0
+        self.tier_stats: Dict[str, _TierStats] = {}
+
+    @property
+    def tier(self) -> str:
+        return self.tiers[self.index]
+
+    def p95(self) -> float:
+        samples = sorted(self.window)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+
+
+class ModelRouter:
+    """
+    Maps each call type to a model tier. When a route's p95 latency over the last
+    MODEL_ROUTING_WINDOW calls misses its SLO, the route moves one tier down; after
+    MODEL_ROUTING_RECOVERY_SECONDS it tries the tier above again. Latency and token
+    histograms are kept per route and tier so the table can be tuned from data.
+    """
+
+    def __init__(self, routes: Dict = MODEL_ROUTES, tiers: Dict = MODEL_TIERS, window=MODEL_ROUTING_WINDOW,
+                 min_samples=MODEL_ROUTING_MIN_SAMPLES, recovery_seconds=MODEL_ROUTING_RECOVERY_SECONDS,
+                 home_region: str = AWS_REGION):
+        self.tiers = tiers
+        self.home_region = home_region
+        self.routes = {call_type: self._in_region(call_type, route) for call_type, route in routes.items()}
+        self.window = window
+        self.min_samples = min_samples
+        self.recovery_seconds = recovery_seconds
+        self._states: Dict[str, _RouteState] = {}
+        self._lock = threading.Lock()
+
+    def _in_region(self, call_type: str, route: Dict) -> Dict:
+        """Drops tiers outside home_region that have not opted in with allow_cross_region."""
+        allowed = []
+        for tier in route["tiers"]:
+            spec = self.tiers[tier]
+            if spec["region"] == self.home_region or spec.get("allow_cross_region"):
+                allowed.append(tier)
+            else:
+                logger.warning(f"⚠️ Model route {call_type}: skipping tier '{tier}' in {spec['region']} "
+                               f"(outside {self.home_region} and not allowed to cross regions)")
+        if not allowed:
+            raise ValueError(f"Model route {call_type} has no tier it may use in {self.home_region}")
+        return {**route, "tiers": allowed}
+
+    def _state(self, call_type: str) -> _RouteState:
+        if call_type not in self._states:
+            self._states[call_type] = _RouteState(self.routes.get(call_type, self.routes["chat"]), self.window)
+        return self._states[call_type]
+
+    def route(self, call_type: str) -> Tuple[str, Dict]:
+        """
+        Returns:
+            (tier name, {"model_id", "region"}) currently serving the call type
+        """
+        with self._lock:
+            state = self._state(call_type)
+            if state.index > 0 and time.monotonic() - state.changed_at >= self.recovery_seconds:
+                state.index -= 1
+                state.window.clear()
+                state.changed_at = time.monotonic()
+                state.upgrades += 1
+                logger.info(f"Model route {call_type}: retrying tier '{state.tier}'")
+            tier = state.tier
+        return tier, self.tiers[tier]
+
+    def record(self, call_type: str, tier: str, latency_ms: float, usage: Dict = None, failed: bool = False):
+        """
+        Records one call. Failures (throttling, timeouts, open circuit) count as SLO misses.
+        """
+        with self._lock:
+            state = self._state(call_type)
+            stats = state.tier_stats.setdefault(tier, _TierStats())
+            if failed:
+                stats.errors += 1
+                # Recorded just over the SLO, so a burst of failures alone downgrades the route
+                latency_ms = max(latency_ms, (state.slo_p95_ms or 0) + 1)
+            else:
+                stats.latency_ms.observe(latency_ms)
+                if usage:
+                    stats.input_tokens.observe(usage.get("input_tokens", 0))
+                    stats.output_tokens.observe(usage.get("output_tokens", 0))
+
+            # Only samples from the tier currently serving the route drive the SLO check
+            if tier != state.tier or not state.slo_p95_ms:
+                return
+            state.window.append(latency_ms)
+            if len(state.window) < self.min_samples or state.index == len(state.tiers) - 1:
+                return
+            p95 = state.p95()
+            if p95 > state.slo_p95_ms:
+                state.index += 1
+                state.window.clear()
+                state.changed_at = time.monotonic()
+                state.downgrades += 1
+                logger.warning(f"⚠️ Model route {call_type}: p95 {p95:.0f}ms over SLO {state.slo_p95_ms}ms, "
+                               f"downgraded '{tier}' -> '{state.tier}'")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                call_type: {
+                    "tier": state.tier,
+                    "model_id": self.tiers[state.tier]["model_id"],
+                    "slo_p95_ms": state.slo_p95_ms,
+                    "window_p95_ms": round(state.p95(), 1),
+                    "window_samples": len(state.window),
+                    "downgrades": state.downgrades,
+                    "upgrades": state.upgrades,
+                    "tiers": {tier: stats.snapshot() for tier, stats in state.tier_stats.items()},
+                }
+                for call_type, state in self._states.items()
+            }
+
+
+# Initialize global model router
+model_router = ModelRouter()
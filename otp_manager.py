@@ -1,34 +1,40 @@
 import random
-from twilio.rest import Client
-from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE
+from outbox import outbox
 import logging
 
-# Initialize Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+def generate_otp():
+    """
+    Generates a random 6-digit OTP.
+
+    Returns:
+        str: The OTP
+    """
+    return str(random.randint(100000, 999999))
 
-def send_otp(phone_number):
+def send_otp(phone_number, otp):
     """
-    Generates a random 6-digit OTP and sends it to the provided phone number.
-    
+    Queues the OTP SMS for the provided phone number. The SMS itself is sent by the
+    outbox workers, so this does not wait on Twilio.
+
     Args:
         phone_number (str): The phone number to send the OTP to, in E.164 format
-        
+        otp (str): The OTP, already stored on the session
+
     Returns:
-        str: The generated OTP if successful, None otherwise
+        str: The outbox message id if the SMS was queued, None otherwise
     """
     try:
-        # Generate a 6-digit OTP
-        otp = str(random.randint(100000, 999999))
-        
-        # Send the OTP via Twilio
-        message = client.messages.create(
-            from_=TWILIO_PHONE,
-            to=phone_number,
-            body=f"Your OTP for Financial Chatbot is {otp}. This code expires in 5 minutes."
+        # The body is dropped from the outbox once it has been sent
+        message_id = outbox.enqueue(
+            'sms',
+            phone_number,
+            f"Your OTP for Financial Chatbot is {otp}. This code expires in 5 minutes.",
+            purpose='otp',
+            redact=True
         )
-        
-        logging.info(f"OTP sent to {phone_number}: {message.sid}")
-        return otp
+
+        logging.info(f"OTP queued for {phone_number}: {message_id}")
+        return message_id
     except Exception as e:
-        logging.error(f"Error sending OTP: {e}")
+        logging.error(f"Error queueing OTP: {e}")
         return None
@@ -0,0 +1,320 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+from session_manager import session_manager
+from twilio_chat import client, create_conversation_message
+from config import (
+    TWILIO_PHONE, OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE_SECONDS,
+    OUTBOX_DESTINATION_INTERVAL_SECONDS, OUTBOX_POLL_SECONDS, OUTBOX_LEASE_SECONDS,
+    OUTBOX_MESSAGE_TTL, OUTBOX_STATUS_CALLBACK_URL
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "outbox:queue"
+PROCESSING_KEY = "outbox:processing"
+DELAYED_KEY = "outbox:delayed"  # sorted set of message ids scored by when they may be sent
+
+CHANNELS = ('sms', 'whatsapp', 'conversation')
+TERMINAL_STATUSES = ('sent', 'failed')
+
+
+def _start_thread(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Twilio 4xx errors (bad number, opted out, ...) won't succeed on retry; 429 and 5xx might."""
+    status = getattr(error, 'status', None) if isinstance(error, TwilioRestException) else None
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+class Outbox:
+    """
+    Durable queue for outbound Twilio messages so request threads never wait on Twilio.
+
+    Callers enqueue() a message and get an id back; it is stored in Redis
+    (outbox:msg:{id}) and sent by a pool of workers. Ids move from QUEUE_KEY to
+    PROCESSING_KEY while a worker owns them, so queued and interrupted sends survive a
+    restart (delivery is at-least-once). Each recipient is sent to at most once per
+    OUTBOX_DESTINATION_INTERVAL_SECONDS; messages over that rate, and failed sends
+    waiting for their backoff, wait in DELAYED_KEY. Once sent, the Twilio SID maps back
+    to the message so delivery callbacks can update its status.
+    """
+
+    def __init__(self, redis_client=None, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 retry_base_seconds=OUTBOX_RETRY_BASE_SECONDS,
+                 destination_interval=OUTBOX_DESTINATION_INTERVAL_SECONDS,
+                 poll_seconds=OUTBOX_POLL_SECONDS, lease_seconds=OUTBOX_LEASE_SECONDS,
+                 message_ttl=OUTBOX_MESSAGE_TTL, status_callback=OUTBOX_STATUS_CALLBACK_URL):
+        self.redis = redis_client or session_manager.redis_client
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.destination_interval = destination_interval
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.message_ttl = message_ttl
+        self.status_callback = status_callback
+        self.senders = {
+            'sms': self._send_sms,
+            'whatsapp': self._send_whatsapp,
+            'conversation': self._send_conversation,
+        }
+        self._counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+        self._sleep = time.sleep
+        self._started = False
+        self._workers = 0
+
+    # --- Public API ---
+
+    def start(self, spawn=_start_thread, sleep=time.sleep, workers=OUTBOX_WORKERS):
+        """
+        Starts the sender workers. Throughput grows with `workers` since each one spends
+        most of its time waiting on Twilio's REST API.
+        """
+        if self._started:
+            return
+        self._started = True
+        self._sleep = sleep
+        self._workers = workers
+        for _ in range(workers):
+            spawn(self._run)
+        logger.info(f"✅ Outbox started with {workers} sender workers")
+
+    def enqueue(self, channel: str, to: str, body: str, purpose: str = None, author: str = None,
+                attributes: Dict = None, redact: bool = False) -> str:
+        """
+        Queues a message for sending.
+
+        Args:
+            channel (str): 'sms', 'whatsapp' or 'conversation'
+            to (str): Phone number in E.164 format, or the Conversation SID for 'conversation'
+            body (str): Message text
+            purpose (str): Free-form label for logs and status (e.g. 'otp', 'call_summary')
+            author (str): Message author, for 'conversation' only
+            attributes (dict): Message attributes, for 'conversation' only
+            redact (bool): Drop the body once the message reaches a final status (OTPs)
+
+        Returns:
+            str: The outbox message id
+        """
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown outbox channel: {channel}")
+        message_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        message = {
+            'message_id': message_id,
+            'channel': channel,
+            'to': to,
+            'body': body,
+            'purpose': purpose,
+            'author': author,
+            'attributes': attributes,
+            'redact': redact,
+            'status': 'queued',
+            'attempts': 0,
+            'sid': None,
+            'delivery_status': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._save(message)
+        self.redis.lpush(QUEUE_KEY, message_id)
+        self._counters["enqueued"] += 1
+        logger.info(f"📤 Outbox message {message_id} queued ({channel}, {purpose or 'message'})")
+        return message_id
+
+    def get(self, message_id: str) -> Optional[Dict]:
+        data = self.redis.get(f"outbox:msg:{message_id}")
+        return json.loads(data) if data else None
+
+    def get_by_sid(self, sid: str) -> Optional[Dict]:
+        message_id = self.redis.get(f"outbox:sid:{sid}")
+        return self.get(message_id) if message_id else None
+
+    def status(self, message_id: str) -> Optional[Dict]:
+        """Message state without the body, for status endpoints."""
+        message = self.get(message_id)
+        if not message:
+            return None
+        message.pop('body', None)
+        return message
+
+    def record_delivery_status(self, sid: str, delivery_status: str, error_code: str = None) -> bool:
+        """
+        Applies a Twilio status callback (queued, sent, delivered, undelivered, failed, read)
+        to the message that was sent with this SID.
+
+        Returns:
+            bool: False if the SID is not one of ours (or has expired)
+        """
+        message = self.get_by_sid(sid)
+        if not message:
+            return False
+        message['delivery_status'] = delivery_status
+        if error_code:
+            message['error'] = f"Twilio error {error_code}"
+        self._save(message)
+        if delivery_status in ('undelivered', 'failed'):
+            logger.warning(f"⚠️ Outbox message {message['message_id']} ({sid}) {delivery_status}: {error_code}")
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self._workers,
+            "queued": self.redis.llen(QUEUE_KEY),
+            "in_flight": self.redis.llen(PROCESSING_KEY),
+            "delayed": self.redis.zcard(DELAYED_KEY),
+            **self._counters,
+        }
+
+    # --- Worker loop ---
+
+    def _run(self):
+        while True:
+            try:
+                self._promote_due()
+                message_id = self._claim_next()
+                if not message_id:
+                    self._requeue_stalled()
+                    self._sleep(self.poll_seconds)
+                    continue
+                try:
+                    self._deliver(message_id)
+                finally:
+                    self.redis.lrem(PROCESSING_KEY, 1, message_id)
+                    self.redis.delete(f"outbox:claim:{message_id}")
+            except Exception as e:
+                logger.error(f"❌ Outbox worker error: {e}")
+                self._sleep(self.poll_seconds)
+
+    def _claim_next(self) -> Optional[str]:
+        """
+        Moves the oldest queued message to PROCESSING_KEY and claims it in one transaction,
+        so _requeue_stalled never sees an id this worker owns without its claim.
+        """
+        def claim(pipe):
+            message_id = pipe.lindex(QUEUE_KEY, -1)
+            if message_id:
+                pipe.multi()
+                pipe.rpoplpush(QUEUE_KEY, PROCESSING_KEY)
+                pipe.setex(f"outbox:claim:{message_id}", self.lease_seconds, 1)
+            return message_id
+
+        return self.redis.transaction(claim, QUEUE_KEY, value_from_callable=True)
+
+    def _promote_due(self):
+        """Moves delayed messages whose time has come to the front of the queue."""
+        for message_id in self.redis.zrangebyscore(DELAYED_KEY, 0, time.time(), start=0, num=100):
+            # Only the worker that removes the id promotes it
+            if self.redis.zrem(DELAYED_KEY, message_id):
+                self.redis.rpush(QUEUE_KEY, message_id)
+
+    def _requeue_stalled(self):
+        """Puts back messages whose worker died mid-send (e.g. the process was restarted)."""
+        for message_id in self.redis.lrange(PROCESSING_KEY, 0, -1):
+            if self.redis.exists(f"outbox:claim:{message_id}"):
+                continue
+            if self.redis.lrem(PROCESSING_KEY, 1, message_id) and self.get(message_id):
+                logger.warning(f"⚠️ Requeueing stalled outbox message {message_id}")
+                self.redis.lpush(QUEUE_KEY, message_id)
+
+    def _defer(self, message_id: str, delay: float):
+        self.redis.zadd(DELAYED_KEY, {message_id: time.time() + delay})
+
+    def _acquire_destination(self, to: str) -> float:
+        """Claims the recipient's send slot; returns 0 on success, else seconds until it frees up."""
+        key = f"outbox:rate:{to}"
+        if self.redis.set(key, 1, nx=True, px=max(1, int(self.destination_interval * 1000))):
+            return 0
+        return max(self.redis.pttl(key), 1) / 1000
+
+    # --- Sending ---
+
+    def _deliver(self, message_id: str):
+        # The claim set by _claim_next is held while this worker owns the message
+        message = self.get(message_id)
+        if not message or message['status'] in TERMINAL_STATUSES:
+            return
+
+        wait = self._acquire_destination(message['to'])
+        if wait:
+            self._counters["rate_limited"] += 1
+            self._defer(message_id, wait)
+            return
+
+        message['attempts'] += 1
+        message['status'] = 'sending'
+        self._save(message)
+        try:
+            sid = self.senders[message['channel']](message)
+        except Exception as e:
+            message['error'] = str(e)
+            if _is_permanent(e) or message['attempts'] >= self.max_attempts:
+                self._counters["failed"] += 1
+                logger.error(f"❌ Outbox message {message_id} to {message['to']} failed after "
+                             f"{message['attempts']} attempt(s): {e}")
+                self._finish(message, 'failed')
+            else:
+                self._counters["retried"] += 1
+                delay = self.retry_base_seconds * 2 ** (message['attempts'] - 1)
+                logger.warning(f"Outbox message {message_id} attempt {message['attempts']} failed, "
+                               f"retrying in {delay:.1f}s: {e}")
+                message['status'] = 'retrying'
+                self._save(message)
+                self._defer(message_id, delay)
+            return
+
+        self._counters["sent"] += 1
+        message['sid'] = sid
+        message['error'] = None
+        self.redis.setex(f"outbox:sid:{sid}", self.message_ttl, message_id)
+        self._finish(message, 'sent')
+        logger.info(f"✅ Outbox message {message_id} sent to {message['to']}. SID: {sid}")
+
+    def _callback_kwargs(self) -> Dict:
+        return {"status_callback": self.status_callback} if self.status_callback else {}
+
+    def _send_sms(self, message: Dict) -> str:
+        return client.messages.create(
+            from_=TWILIO_PHONE,
+            to=message['to'],
+            body=message['body'],
+            **self._callback_kwargs()
+        ).sid
+
+    def _send_whatsapp(self, message: Dict) -> str:
+        return client.messages.create(
+            from_=f"whatsapp:{TWILIO_PHONE}",
+            to=f"whatsapp:{message['to']}",
+            body=message['body'],
+            **self._callback_kwargs()
+        ).sid
+
+    def _send_conversation(self, message: Dict) -> str:
+        return create_conversation_message(message['to'], message['author'] or "System",
+                                           message['body'], message['attributes'])
+
+    # --- State ---
+
+    def _finish(self, message: Dict, status: str):
+        message['status'] = status
+        if message.get('redact'):
+            message['body'] = None
+        self._save(message)
+
+    def _save(self, message: Dict):
+        message['updated_at'] = datetime.now().isoformat()
+        self.redis.setex(f"outbox:msg:{message['message_id']}", self.message_ttl, json.dumps(message, default=str))
+
+
+# Initialize global outbox (workers are started by app.py)
+outbox = Outbox()
@@ -0,0 +1,187 @@
+"""
+Offline simulator for campaign pacing. Generates synthetic call outcome history, fits the
+predictive pacer's rates to it, then replays a campaign against simulated customers and
+agents to compare fixed pacing with predictive pacing at different abandon targets.
+
+    python pacing_simulator.py --customers 300 --agents 2 --target-abandon 0.03 0.1
+"""
+import heapq
+import random
+import argparse
+from typing import Dict, List
+
+from predictive_pacer import OutcomeRates, PredictivePacer
+from config import (
+    CAMPAIGN_MAX_CONCURRENT_CALLS, CAMPAIGN_CALLS_PER_SECOND, CAMPAIGN_POLL_SECONDS,
+    PACING_HANDLE_SECONDS, PACING_TIME_TO_HANDOFF_SECONDS, PACING_TIMING_ALPHA
+)
+
+# "True" behaviour of the simulated customers: answer rate by hour bucket, handoff rate per answered call
+SEGMENTS = {
+    "Critical": {"share": 0.4, "answer": {"morning": 0.35, "afternoon": 0.45, "evening": 0.6}, "handoff": 0.45},
+    "High": {"share": 0.6, "answer": {"morning": 0.4, "afternoon": 0.5, "evening": 0.65}, "handoff": 0.3},
+}
+RING_SECONDS = (8, 25)          # until answered
+NO_ANSWER_SECONDS = 30          # until an unanswered call ends
+FLOW_SECONDS = (45, 90)         # answered call until handoff (or hangup, if none)
+
+
+def _hour_bucket(hour: int) -> str:
+    return "morning" if hour < 12 else "afternoon" if hour < 17 else "evening"
+
+
+def true_rates(segment: str, hour: int):
+    spec = SEGMENTS[segment]
+    return spec["answer"][_hour_bucket(hour)], spec["handoff"]
+
+
+def synthetic_history(calls: int, rng: random.Random) -> List[Dict]:
+    """CallOutcome summary rows (as database.fetch_call_outcome_stats returns) drawn from the true rates."""
+    cells = {}
+    for _ in range(calls):
+        segment = rng.choices(list(SEGMENTS), [spec["share"] for spec in SEGMENTS.values()])[0]
+        hour = rng.randint(9, 19)
+        p_answer, p_handoff = true_rates(segment, hour)
+        answered = rng.random() < p_answer
+        row = cells.setdefault((segment, hour), {"risk_segment": segment, "hour": hour,
+                                                 "calls": 0, "answered": 0, "handoffs": 0})
+        row["calls"] += 1
+        row["answered"] += answered
+        row["handoffs"] += answered and rng.random() < p_handoff
+    return list(cells.values())
+
+
+def simulate(customers: List[str], hour: int, agents: int, max_concurrent: int, calls_per_second: float,
+             handle_seconds: float, pacer: PredictivePacer = None, seed: int = 0) -> Dict:
+    """
+    Replays one campaign. Calls follow the dialer's rules: at most max_concurrent in flight,
+    at most calls_per_second started, and with a pacer only while it allows the next call.
+
+    Args:
+        customers (list): Risk segment of each customer, in dialing order
+        hour (int): Hour of day the campaign runs at
+        agents (int): Agents taking handoffs
+        max_concurrent (int): Most calls in progress at once
+        calls_per_second (float): Most calls started per second
+        handle_seconds (float): True mean agent handle time (exponentially distributed)
+        pacer (PredictivePacer): None for fixed pacing
+
+    Returns:
+        dict: Campaign length, throughput, agent utilization and abandoned handoffs
+    """
+    rng = random.Random(seed)
+    events = []  # (time, seq, kind, call id)
+    seq = 0
+
+    def schedule(at, kind, call):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (at, seq, kind, call))
+
+    now = next_dial_at = 0.0
+    pending = list(enumerate(customers))
+    in_flight = {}          # call -> handoff probability while not yet handed off (None after)
+    dialed_at = {}
+    segments = {}
+    busy_until = []         # heap of times agents become free
+    busy_seconds = handoffs = abandoned = 0
+    learned = {"handle_seconds": PACING_HANDLE_SECONDS, "time_to_handoff": PACING_TIME_TO_HANDOFF_SECONDS}
+
+    def learn(field, seconds):
+        learned[field] += PACING_TIMING_ALPHA * (seconds - learned[field])
+
+    schedule(0.0, "tick", None)
+    while events:
+        now, _, kind, call = heapq.heappop(events)
+        while busy_until and busy_until[0] <= now:
+            heapq.heappop(busy_until)
+
+        if kind == "tick":
+            if pending and len(in_flight) < max_concurrent and now >= next_dial_at:
+                segment = pending[0][1]
+                p_next = pacer.handoff_probability(segment, hour) if pacer else None
+                waiting = [(p, now - dialed_at[c]) for c, p in in_flight.items() if p is not None]
+                if pacer is None or pacer.assess(waiting, p_next, len(busy_until), agents=agents, **learned)["may_dial"]:
+                    call, segment = pending.pop(0)
+                    in_flight[call] = p_next if pacer else 0.0
+                    dialed_at[call] = now
+                    next_dial_at = now + 1.0 / calls_per_second
+                    segments[call] = segment
+                    if rng.random() >= true_rates(segment, hour)[0]:
+                        schedule(now + NO_ANSWER_SECONDS, "end", call)
+                    else:
+                        schedule(now + rng.uniform(*RING_SECONDS), "answer", call)
+            if pending or in_flight:
+                schedule(now + CAMPAIGN_POLL_SECONDS, "tick", None)
+
+        elif kind == "answer":
+            # The "answered" status callback: the dialer re-estimates the call's handoff chance
+            if pacer:
+                in_flight[call] = pacer.handoff_probability(segments[call], hour, answered=True)
+            ended_by = "handoff" if rng.random() < true_rates(segments[call], hour)[1] else "end"
+            schedule(now + rng.uniform(*FLOW_SECONDS), ended_by, call)
+
+        elif kind == "handoff":
+            handoffs += 1
+            in_flight[call] = None
+            learn("time_to_handoff", now - dialed_at[call])
+            if len(busy_until) >= agents:
+                abandoned += 1
+                schedule(now, "end", call)
+            else:
+                handled = rng.expovariate(1.0 / handle_seconds)
+                busy_seconds += handled
+                learn("handle_seconds", handled)
+                heapq.heappush(busy_until, now + handled)
+                schedule(now + handled, "end", call)
+
+        elif kind == "end":
+            in_flight.pop(call, None)
+
+    duration = max(now, 1.0)
+    return {
+        "minutes": round(duration / 60, 1),
+        "calls_per_hour": round(len(customers) / duration * 3600),
+        "handoffs": handoffs,
+        "abandoned": abandoned,
+        "abandon_rate": round(abandoned / handoffs, 3) if handoffs else 0.0,
+        "agent_utilization": round(min(1.0, busy_seconds / (duration * agents)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and predictive campaign pacing on synthetic calls.")
+    parser.add_argument("--customers", type=int, default=300)
+    parser.add_argument("--agents", type=int, default=2)
+    parser.add_argument("--max-concurrent", type=int, default=CAMPAIGN_MAX_CONCURRENT_CALLS)
+    parser.add_argument("--cps", type=float, default=CAMPAIGN_CALLS_PER_SECOND, help="calls started per second")
+    parser.add_argument("--handle-seconds", type=float, default=PACING_HANDLE_SECONDS, help="true mean agent handle time")
+    parser.add_argument("--target-abandon", type=float, nargs="+", default=[0.03, 0.1],
+                        help="predictive pacing abandon targets to try")
+    parser.add_argument("--history-calls", type=int, default=5000, help="synthetic CallOutcome rows to fit the rates on")
+    parser.add_argument("--hour", type=int, default=11)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rates = OutcomeRates(synthetic_history(args.history_calls, rng))
+    customers = rng.choices(list(SEGMENTS), [spec["share"] for spec in SEGMENTS.values()], k=args.customers)
+    print(f"Fitted rates from {args.history_calls} synthetic calls: {rates.summary()}")
+
+    runs = [("fixed", None)] + [
+        (f"predictive @ {target:.0%}", PredictivePacer(agents=args.agents, max_abandon_rate=target, rates=rates))
+        for target in args.target_abandon
+    ]
+    print(f"\n{'pacing':<20}{'minutes':>9}{'calls/h':>9}{'handoffs':>10}{'abandon':>9}{'util':>7}")
+    for name, pacer in runs:
+        result = simulate(customers, args.hour, args.agents, args.max_concurrent, args.cps,
+                          args.handle_seconds, pacer, seed=args.seed)
+        print(f"{name:<20}{result['minutes']:>9}{result['calls_per_hour']:>9}{result['handoffs']:>10}"
+              f"{result['abandon_rate']:>9.1%}{result['agent_utilization']:>7.0%}")
+        if pacer:
+            assert result['abandon_rate'] <= pacer.max_abandon_rate, (
+                f"{name} abandoned {result['abandon_rate']:.1%} of handoffs, over its target")
+
+
+if __name__ == "__main__":
+    main()
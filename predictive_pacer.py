@@ -0,0 +1,214 @@
+import math
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    PACING_AGENTS, PACING_MAX_ABANDON_RATE, PACING_HISTORY_DAYS, PACING_PRIOR_WEIGHT,
+    PACING_REFRESH_SECONDS, PACING_DEFAULT_ANSWER_RATE, PACING_DEFAULT_HANDOFF_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+# CallOutcome.outcome_type values written when the customer asked for an agent
+HANDOFF_OUTCOMES = ('Customer_Agreed_Assistance', 'Agent_Requested')
+# Prefix of the outcome written for calls that were never answered (Call_no-answer, Call_busy, ...)
+UNANSWERED_OUTCOME_PREFIX = 'Call_'
+# Outcome written for answered calls that ended before the call flow recorded one
+ANSWERED_NO_OUTCOME = 'Answered_No_Outcome'
+
+
+def _segment(risk_segment: Optional[str]) -> str:
+    return (risk_segment or 'Unknown').strip().capitalize()
+
+
+def _smoothed(successes: float, trials: float, prior_rate: float, prior_weight: float) -> float:
+    """Beta-smoothed rate: behaves like prior_weight extra trials at prior_rate."""
+    return (successes + prior_rate * prior_weight) / (trials + prior_weight)
+
+
+class OutcomeRates:
+    """
+    Answer and handoff probabilities per (risk segment, hour of day), estimated from
+    CallOutcome history. Sparse cells borrow strength from their segment, and segments
+    from the overall rate (each level is a Beta prior worth `prior_weight` calls), so a
+    segment/hour with little history stays close to the broader estimate.
+    """
+
+    def __init__(self, rows: Iterable[Dict] = (), prior_weight: float = PACING_PRIOR_WEIGHT,
+                 default_answer_rate: float = PACING_DEFAULT_ANSWER_RATE,
+                 default_handoff_rate: float = PACING_DEFAULT_HANDOFF_RATE):
+        """
+        Args:
+            rows: dicts with risk_segment, hour, calls, answered, handoffs
+            prior_weight: Strength of each level's prior, in calls
+            default_answer_rate: Answer rate assumed before any history
+            default_handoff_rate: Handoff rate per answered call assumed before any history
+        """
+        self.prior_weight = prior_weight
+        self.cells: Dict[Tuple[str, int], List[int]] = {}
+        self.segments: Dict[str, List[int]] = {}
+        self.total = [0, 0, 0]  # calls, answered, handoffs
+        for row in rows:
+            counts = (int(row['calls']), int(row['answered']), int(row['handoffs']))
+            cell = self.cells.setdefault((_segment(row['risk_segment']), int(row['hour'])), [0, 0, 0])
+            segment = self.segments.setdefault(_segment(row['risk_segment']), [0, 0, 0])
+            for bucket in (cell, segment, self.total):
+                for i, value in enumerate(counts):
+                    bucket[i] += value
+
+        calls, answered, handoffs = self.total
+        self.overall_answer = _smoothed(answered, calls, default_answer_rate, prior_weight)
+        self.overall_handoff = _smoothed(handoffs, answered, default_handoff_rate, prior_weight)
+
+    def p_answer(self, risk_segment: str, hour: int) -> float:
+        segment = self.segments.get(_segment(risk_segment), [0, 0, 0])
+        segment_rate = _smoothed(segment[1], segment[0], self.overall_answer, self.prior_weight)
+        cell = self.cells.get((_segment(risk_segment), hour), [0, 0, 0])
+        return _smoothed(cell[1], cell[0], segment_rate, self.prior_weight)
+
+    def p_handoff(self, risk_segment: str, hour: int) -> float:
+        """Probability that an answered call ends in an agent handoff."""
+        segment = self.segments.get(_segment(risk_segment), [0, 0, 0])
+        segment_rate = _smoothed(segment[2], segment[1], self.overall_handoff, self.prior_weight)
+        cell = self.cells.get((_segment(risk_segment), hour), [0, 0, 0])
+        return _smoothed(cell[2], cell[1], segment_rate, self.prior_weight)
+
+    def p_handoff_per_dial(self, risk_segment: str, hour: int) -> float:
+        return self.p_answer(risk_segment, hour) * self.p_handoff(risk_segment, hour)
+
+    def summary(self) -> Dict:
+        return {
+            "calls": self.total[0],
+            "overall_answer_rate": round(self.overall_answer, 3),
+            "overall_handoff_rate": round(self.overall_handoff, 3),
+            "segments": {
+                name: {
+                    "calls": counts[0],
+                    "answer_rate": round(_smoothed(counts[1], counts[0], self.overall_answer, self.prior_weight), 3),
+                    "handoff_rate": round(_smoothed(counts[2], counts[1], self.overall_handoff, self.prior_weight), 3),
+                }
+                for name, counts in sorted(self.segments.items())
+            },
+        }
+
+
+def expected_abandons(handoffs: List[Tuple[float, float]], agents: int, busy_agents: int,
+                      handle_seconds: float) -> Tuple[float, float]:
+    """
+    Expected handoffs from the given calls, and how many of them are expected to find
+    every agent busy.
+
+    Follows the number of busy agents through the handoffs in time order: each busy agent
+    finishes between two handoffs with probability 1 - exp(-gap / handle_seconds), and a
+    handoff that happens while all agents are busy is abandoned.
+
+    Args:
+        handoffs: (probability, seconds from now) of each call's handoff
+        agents: Agents taking handoffs
+        busy_agents: Agents on a call now
+        handle_seconds: Average time an agent spends on a handoff
+
+    Returns:
+        tuple: (expected handoffs, expected abandoned handoffs)
+    """
+    busy = [0.0] * (agents + 1)  # busy[b]: probability that b agents are busy
+    busy[min(busy_agents, agents)] = 1.0
+    now = expected = abandoned = 0.0
+    for probability, at in sorted(handoffs, key=lambda handoff: handoff[1]):
+        stay_busy = math.exp(-max(0.0, at - now) / max(handle_seconds, 1.0))
+        now = max(now, at)
+        freed = [0.0] * (agents + 1)
+        for b, mass in enumerate(busy):
+            if mass:
+                for still_busy in range(b + 1):
+                    freed[still_busy] += mass * math.comb(b, still_busy) * stay_busy ** still_busy * (1 - stay_busy) ** (b - still_busy)
+        busy = [mass * (1 - probability) for mass in freed]
+        for b, mass in enumerate(freed):
+            if b < agents:
+                busy[b + 1] += mass * probability
+            else:
+                busy[b] += mass * probability
+                abandoned += mass * probability
+        expected += probability
+    return expected, abandoned
+
+
+class PredictivePacer:
+    """
+    Decides whether a campaign may start another call, so agents are kept busy without
+    handing customers to an agent line that is already taken.
+
+    Each call in flight (not yet handed off) will reach an agent with its estimated
+    answer x handoff probability, about time_to_handoff seconds after it was dialed. The
+    next call is allowed while its own handoff, should it happen, is no more likely than
+    max_abandon_rate to find every agent busy. Judging the share of all in-flight handoffs
+    instead let each new call take up whatever room the earlier, safer calls left, and
+    campaigns ended well above the target.
+    """
+
+    def __init__(self, agents: int = PACING_AGENTS, max_abandon_rate: float = PACING_MAX_ABANDON_RATE,
+                 rates: OutcomeRates = None, history_days: int = PACING_HISTORY_DAYS,
+                 refresh_seconds: float = PACING_REFRESH_SECONDS):
+        self.agents = agents
+        self.max_abandon_rate = max_abandon_rate
+        self.rates = rates or OutcomeRates()
+        self.history_days = history_days
+        self.refresh_seconds = refresh_seconds
+        self._loaded_at = 0.0 if rates is None else time.time()
+
+    def refresh(self, force: bool = False) -> OutcomeRates:
+        """Reloads the rates from CallOutcome history every refresh_seconds."""
+        if not force and time.time() - self._loaded_at < self.refresh_seconds:
+            return self.rates
+        self._loaded_at = time.time()
+        try:
+            # Imported here so the simulator can use the pacer without a database
+            from database import fetch_call_outcome_stats
+            self.rates = OutcomeRates(fetch_call_outcome_stats(self.history_days))
+            logger.info(f"📈 Pacing rates reloaded from {self.rates.total[0]} call outcomes")
+        except Exception as e:
+            logger.error(f"❌ Could not load call outcome history for pacing, keeping the previous rates: {e}")
+        return self.rates
+
+    def handoff_probability(self, risk_segment: str, hour: int = None, answered: bool = False) -> float:
+        """Chance that a call reaches an agent: per dial, or once the customer has answered."""
+        hour = datetime.now().hour if hour is None else hour
+        rates = self.refresh()
+        return rates.p_handoff(risk_segment, hour) if answered else rates.p_handoff_per_dial(risk_segment, hour)
+
+    def assess(self, in_flight: List[Tuple[float, float]], next_call: float, busy_agents: int,
+               handle_seconds: float, time_to_handoff: float, agents: int = None) -> Dict:
+        """
+        Estimates how likely the next call's handoff is to be abandoned if it is started now.
+
+        Args:
+            in_flight: (handoff probability, seconds since dialed) of the calls in progress that
+                have not reached an agent
+            next_call: Handoff probability of the call that would be started
+            busy_agents: Agents currently on a handed-off call
+            handle_seconds: Average time an agent spends on a handoff
+            time_to_handoff: Average time from dialing to the handoff
+            agents: Agents available to the campaign (defaults to the pacer's)
+
+        Returns:
+            dict: may_dial, abandon_rate (of the next call's handoff) and expected_handoffs
+                (in flight, the next call included)
+        """
+        agents = self.agents if agents is None else agents
+        handoffs = [(p, max(0.0, time_to_handoff - age)) for p, age in in_flight]
+        _, abandoned_before = expected_abandons(handoffs, agents, busy_agents, handle_seconds)
+        handoffs.append((next_call, time_to_handoff))
+        expected, abandoned = expected_abandons(handoffs, agents, busy_agents, handle_seconds)
+        # Later handoffs don't change earlier ones, so the difference is the next call's own share
+        abandon_rate = (abandoned - abandoned_before) / next_call if next_call > 0 else 0.0
+        return {
+            "may_dial": abandon_rate <= self.max_abandon_rate,
+            "abandon_rate": round(abandon_rate, 4),
+            "expected_handoffs": round(expected, 3),
+        }
+
+
+# Initialize global predictive pacer (rates load from CallOutcome on first use)
+predictive_pacer = PredictivePacer()
@@ -0,0 +1,97 @@
+import json
+import math
+import logging
+from typing import Dict, List
+from config import PROMPT_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+# Oldest turns kept beyond the verbatim window are cut down to this many characters
+COMPRESSED_TURN_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate Claude token count without a tokenizer: ~4 characters per token for
+    ASCII text, roughly one token per character for Devanagari/Telugu and other scripts.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def message_tokens(message: Dict) -> int:
+    content = message.get("content")
+    if isinstance(content, str):
+        return estimate_tokens(content) + 4
+    return sum(estimate_tokens(block.get("text", "")) for block in content) + 4
+
+
+def messages_tokens(messages: List[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def budget_for(call_type: str) -> Dict:
+    return PROMPT_BUDGETS.get(call_type, PROMPT_BUDGETS["default"])
+
+
+def max_tokens_for(call_type: str) -> int:
+    """Output token cap for a call type (replaces the blanket max_tokens=4096)."""
+    return budget_for(call_type)["max_tokens"]
+
+
+def compact_json(data) -> str:
+    """Compact JSON for embedding account data in prompts (no indentation, no spaces)."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _compress(message: Dict) -> Dict:
+    text = "".join(block.get("text", "") for block in message["content"])
+    if len(text) > COMPRESSED_TURN_CHARS:
+        text = text[:COMPRESSED_TURN_CHARS].rstrip() + " …"
+    return {"role": message["role"], "content": [{"type": "text", "text": text}]}
+
+
+def fit_history(messages: List[Dict], call_type: str) -> List[Dict]:
+    """
+    Fits parsed chat history into the call type's history budget.
+
+    Newest turns are kept verbatim; once they use up most of the budget, older turns are
+    compressed to a short snippet, and whatever still doesn't fit is dropped.
+    The result always starts with a user turn, as the Messages API requires.
+    """
+    budget = budget_for(call_type)["history"]
+    verbatim_budget = int(budget * 0.75)
+    kept, used = [], 0
+
+    for message in reversed(messages):
+        cost = message_tokens(message)
+        if used + cost <= verbatim_budget:
+            kept.append(message)
+            used += cost
+            continue
+        compressed = _compress(message)
+        cost = message_tokens(compressed)
+        if used + cost > budget:
+            break
+        kept.append(compressed)
+        used += cost
+
+    kept.reverse()
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+
+    if len(kept) < len(messages):
+        logger.info(f"Prompt history for {call_type}: kept {len(kept)}/{len(messages)} turns, "
+                    f"~{messages_tokens(kept)}/{messages_tokens(messages)} tokens")
+    return kept
+
+
+def log_usage(call_type: str, messages: List[Dict], usage: Dict):
+    """Logs estimated vs. reported input tokens and output tokens for one Bedrock call."""
+    logger.info(
+        f"Bedrock {call_type} tokens: input={usage.get('input_tokens', '?')} "
+        f"(estimated {messages_tokens(messages)}), output={usage.get('output_tokens', '?')}, "
+        f"max_tokens={max_tokens_for(call_type)}"
+    )
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import argparse
+import logging
+from collections import Counter
+
+from sqlalchemy import text
+
+from config import RELABEL_BATCH_SIZE, RELABEL_CHECKPOINT_PATH, INTENT_MODEL_THRESHOLD
+from database import engine
+from intent_classifier import classify_intent
+from intent_model import intent_model, INTENT_LABELS
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+# Offline job that fills in client_interaction.intent for user messages. Rows are streamed
+# with a server-side cursor in interaction_id order, labelled in batches (rules first, then
+# one vectorized local-model call for the rest) and written back with one UPDATE per batch.
+# The last committed interaction_id is checkpointed, so an interrupted run resumes there.
+# interaction_id is a random UUID, so new rows can sort before the checkpoint: the checkpoint
+# is therefore removed once a run reaches the end, and the next run starts from the first row.
+
+SELECT_ROWS = """
+    SELECT interaction_id::text AS interaction_id, message_text, intent
+    FROM client_interaction
+    WHERE sender = 'user'
+      AND message_text IS NOT NULL AND message_text <> ''
+      AND interaction_id > CAST(:after AS uuid)
+      {only_unlabelled}
+    ORDER BY interaction_id
+"""
+
+# Rows that already carry one of the labels exactly are left alone unless --all is given
+ONLY_UNLABELLED = "AND (intent IS NULL OR intent <> ALL(:labels))"
+
+BULK_UPDATE = """
+    UPDATE client_interaction AS ci
+    SET intent = v.intent
+    FROM (SELECT unnest(CAST(:ids AS uuid[])) AS interaction_id, unnest(CAST(:intents AS text[])) AS intent) AS v
+    WHERE ci.interaction_id = v.interaction_id
+      AND ci.intent IS DISTINCT FROM v.intent
+"""
+
+FIRST_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return FIRST_UUID
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_interaction_id", FIRST_UUID)
+
+
+def save_checkpoint(path, last_interaction_id, stats):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_interaction_id": last_interaction_id, "updated_at": time.time(), **stats}, f)
+    os.replace(tmp_path, path)
+
+
+def label_batch(rows, relabel_all=False, min_confidence=INTENT_MODEL_THRESHOLD):
+    """
+    Labels one batch of rows.
+
+    Args:
+        rows (list): (interaction_id, message_text, intent) rows
+        relabel_all (bool): Ignore existing labels and classify every row
+        min_confidence (float): Local model predictions below this become 'unclear'
+
+    Returns:
+        list: the intent for each row, in order
+    """
+    labels, pending = [None] * len(rows), []
+    for i, row in enumerate(rows):
+        existing = (row.intent or "").strip().lower()
+        if not relabel_all and existing in INTENT_LABELS:
+            # Only the spelling was off ("EMI ", "Balance")
+            labels[i] = existing
+            continue
+        intent = classify_intent(row.message_text)
+        if intent != "unclear":
+            labels[i] = intent
+        else:
+            pending.append(i)
+
+    if pending:
+        predicted, confidences = intent_model.predict_batch([rows[i].message_text for i in pending])
+        for i, label, confidence in zip(pending, predicted, confidences):
+            labels[i] = label if confidence >= min_confidence else "unclear"
+    return labels
+
+
+def relabel(batch_size=RELABEL_BATCH_SIZE, checkpoint_path=RELABEL_CHECKPOINT_PATH, relabel_all=False,
+            min_confidence=INTENT_MODEL_THRESHOLD, dry_run=False, limit=None):
+    after = load_checkpoint(checkpoint_path)
+    if after != FIRST_UUID:
+        logging.info(f"Resuming after interaction_id={after}")
+    if not intent_model.is_trained:
+        logging.warning("⚠️ Local intent model not trained; rows the rules can't place will be labelled 'unclear'.")
+
+    query = SELECT_ROWS.format(only_unlabelled="" if relabel_all else ONLY_UNLABELLED)
+    params = {"after": after, "labels": INTENT_LABELS}
+    seen, written, label_counts = 0, 0, Counter()
+    exhausted = False
+    started = time.perf_counter()
+
+    # The read side holds one transaction open for the cursor; updates commit on their own connection
+    with engine.connect() as read_conn, engine.connect() as write_conn:
+        result = read_conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(query), params)
+        for rows in result.partitions(batch_size):
+            if limit and seen >= limit:
+                break
+            rows = rows[:limit - seen] if limit else rows
+            batch_started = time.perf_counter()
+            labels = label_batch(rows, relabel_all, min_confidence)
+            label_counts.update(labels)
+            seen += len(rows)
+
+            if not dry_run:
+                updated = write_conn.execute(text(BULK_UPDATE), {
+                    "ids": [row.interaction_id for row in rows],
+                    "intents": labels,
+                }).rowcount
+                write_conn.commit()
+                written += updated
+                save_checkpoint(checkpoint_path, rows[-1].interaction_id,
+                                {"rows_seen": seen, "rows_updated": written})
+
+            elapsed = time.perf_counter() - started
+            logging.info(f"Batch of {len(rows)} in {(time.perf_counter() - batch_started) * 1000:.0f} ms; "
+                         f"{seen} rows, {written} updated, {seen / elapsed:,.0f} rows/s overall")
+        else:
+            exhausted = not (limit and seen >= limit)
+
+    if exhausted and not dry_run and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+        logging.info("Reached the last row; checkpoint cleared")
+
+    elapsed = time.perf_counter() - started
+    print(f"Relabelled {seen} rows in {elapsed:.1f}s ({seen / elapsed if elapsed else 0:,.0f} rows/s), "
+          f"{written} updated{' (dry run)' if dry_run else ''}")
+    print(f"Labels: {dict(label_counts)}")
+    return {"rows_seen": seen, "rows_updated": written, "labels": dict(label_counts), "seconds": round(elapsed, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill in client_interaction.intent with the rule classifier and local model.")
+    parser.add_argument("--batch-size", type=int, default=RELABEL_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=RELABEL_CHECKPOINT_PATH)
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start from the first row")
+    parser.add_argument("--all", action="store_true", help="Relabel every user row, not just missing or malformed labels")
+    parser.add_argument("--min-confidence", type=float, default=INTENT_MODEL_THRESHOLD,
+                        help="Local model predictions below this are labelled 'unclear'")
+    parser.add_argument("--dry-run", action="store_true", help="Classify and report, but write nothing")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    relabel(args.batch_size, args.checkpoint, args.all, args.min_confidence, args.dry_run, args.limit)
@@ -0,0 +1,147 @@
+import logging
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from config import TEMPLATE_RESPONSES_ENABLED, RESPONSE_LANGUAGE
+
+# Deterministic answers for the structured intents (emi, balance, loan).
+# These reproduce the formats the LLM was asked to fill in, without the Bedrock round trip.
+
+TEMPLATE_BUNDLES = {
+    'en': {
+        'balance': "Your current account balance is **₹{balance}**.",
+        'loan': "Your **{loan_type}** has a principal amount of **₹{principal_amount}** with an interest rate of **{interest_rate}%**.",
+        'emi_header': "Thanks for verifying! Here's a breakdown of your **EMI details**:",
+        'emi_monthly': "* Your **monthly EMI amount** is **₹{monthly_emi}**.",
+        'emi_next_due': "* Your **next EMI** of **₹{next_due_amount}** is due on **{next_due_date}**.",
+        'emi_no_upcoming': "* No upcoming EMI scheduled.",
+        'emi_payments_header': "* Recent payments:",
+        'emi_payment': "    * On **{date}**, you paid **₹{amount}**.",
+        'emi_no_payments': "    * No recent payment details available.",
+        'emi_footer': "Do you have any other questions about your EMI or loan?",
+        'date_format': "%B %d, %Y",
+    },
+    'hi': {
+        'balance': "आपके खाते में वर्तमान शेष राशि **₹{balance}** है।",
+        'loan': "आपके **{loan_type}** की मूल राशि **₹{principal_amount}** है और ब्याज दर **{interest_rate}%** है।",
+        'emi_header': "सत्यापन के लिए धन्यवाद! आपकी **EMI जानकारी** इस प्रकार है:",
+        'emi_monthly': "* आपकी **मासिक EMI राशि** **₹{monthly_emi}** है।",
+        'emi_next_due': "* आपकी **अगली EMI** **₹{next_due_amount}** की है, जिसकी देय तिथि **{next_due_date}** है।",
+        'emi_no_upcoming': "* कोई आगामी EMI निर्धारित नहीं है।",
+        'emi_payments_header': "* हाल के भुगतान:",
+        'emi_payment': "    * **{date}** को आपने **₹{amount}** का भुगतान किया।",
+        'emi_no_payments': "    * हाल के भुगतान की कोई जानकारी उपलब्ध नहीं है।",
+        'emi_footer': "क्या आपके पास अपनी EMI या लोन के बारे में कोई और प्रश्न है?",
+        'date_format': "%d-%m-%Y",
+    },
+    'te': {
+        'balance': "మీ ఖాతాలో ప్రస్తుత బ్యాలెన్స్ **₹{balance}**.",
+        'loan': "మీ **{loan_type}** అసలు మొత్తం **₹{principal_amount}**, వడ్డీ రేటు **{interest_rate}%**.",
+        'emi_header': "ధృవీకరించినందుకు ధన్యవాదాలు! మీ **EMI వివరాలు** ఇవి:",
+        'emi_monthly': "* మీ **నెలవారీ EMI మొత్తం** **₹{monthly_emi}**.",
+        'emi_next_due': "* మీ **తదుపరి EMI** **₹{next_due_amount}**, గడువు తేదీ **{next_due_date}**.",
+        'emi_no_upcoming': "* రాబోయే EMI ఏదీ షెడ్యూల్ చేయబడలేదు.",
+        'emi_payments_header': "* ఇటీవలి చెల్లింపులు:",
+        'emi_payment': "    * **{date}** న మీరు **₹{amount}** చెల్లించారు.",
+        'emi_no_payments': "    * ఇటీవలి చెల్లింపు వివరాలు అందుబాటులో లేవు.",
+        'emi_footer': "మీ EMI లేదా లోన్ గురించి ఇంకా ఏవైనా ప్రశ్నలు ఉన్నాయా?",
+        'date_format': "%d-%m-%Y",
+    },
+}
+
+TEMPLATED_INTENTS = ('emi', 'balance', 'loan')
+
+
+def format_inr(amount, decimals=2):
+    """
+    Formats an amount with Indian digit grouping, e.g. 1234567.5 -> '12,34,567.50'.
+    Values that are not numeric are returned unchanged.
+    """
+    try:
+        value = Decimal(str(amount))
+    except (InvalidOperation, ValueError, TypeError):
+        return str(amount)
+
+    sign = "-" if value < 0 else ""
+    quantized = f"{abs(value):.{decimals}f}"
+    whole, _, fraction = quantized.partition(".")
+
+    # Last three digits form the first group, then groups of two
+    if len(whole) > 3:
+        head, tail = whole[:-3], whole[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        whole = ",".join(groups + [tail])
+
+    return f"{sign}{whole}.{fraction}" if fraction else f"{sign}{whole}"
+
+
+def _format_date(value, date_format):
+    if isinstance(value, (date, datetime)):
+        return value.strftime(date_format)
+    if isinstance(value, str) and value and value != "N/A":
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").strftime(date_format)
+        except ValueError:
+            return value
+    return None
+
+
+def _render_emi(data, bundle):
+    lines = [bundle['emi_header'], ""]
+    lines.append(bundle['emi_monthly'].format(monthly_emi=format_inr(data.get("monthly_emi", "N/A"))))
+
+    next_due_date = _format_date(data.get("next_due_date"), bundle['date_format'])
+    if next_due_date:
+        lines.append(bundle['emi_next_due'].format(
+            next_due_amount=format_inr(data.get("next_due_amount", "N/A")),
+            next_due_date=next_due_date
+        ))
+    else:
+        lines.append(bundle['emi_no_upcoming'])
+
+    lines.append(bundle['emi_payments_header'])
+    recent_payments = data.get("recent_payments") or []
+    for payment in recent_payments:
+        lines.append(bundle['emi_payment'].format(
+            date=_format_date(payment.get('date'), bundle['date_format']) or payment.get('date'),
+            amount=format_inr(payment.get('amount', '0'))
+        ))
+    if not recent_payments:
+        lines.append(bundle['emi_no_payments'])
+
+    lines.extend(["", bundle['emi_footer']])
+    return "\n".join(lines)
+
+
+def render_response(query_type, data, language=None, force=False):
+    """
+    Renders the answer for a structured intent locally.
+
+    Args:
+        force: Render even when TEMPLATE_RESPONSES_ENABLED is off (used as the Bedrock fallback)
+
+    Returns:
+        str: The formatted answer, or None when templating is disabled or the
+             query/data can't be answered from a template (caller falls back to the LLM).
+    """
+    if not (TEMPLATE_RESPONSES_ENABLED or force) or query_type not in TEMPLATED_INTENTS or not data:
+        return None
+
+    bundle = TEMPLATE_BUNDLES.get(language or RESPONSE_LANGUAGE, TEMPLATE_BUNDLES['en'])
+    try:
+        if query_type == "balance":
+            return bundle['balance'].format(balance=format_inr(data["balance"]))
+        if query_type == "loan":
+            return bundle['loan'].format(
+                loan_type=data.get("loan_type") or "loan",
+                principal_amount=format_inr(data.get("principal_amount", "N/A")),
+                interest_rate=data.get("interest_rate", "N/A")
+            )
+        return _render_emi(data, bundle)
+    except (KeyError, AttributeError) as e:
+        logging.warning(f"Template render failed for {query_type}, falling back to LLM: {e}")
+        return None
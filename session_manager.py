@@ -4,8 +4,8 @@ import time
 import uuid
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Any
-from config import REDIS_HOST, REDIS_PORT, REDIS_DB
+from typing import Dict, Optional, Any, Tuple
+from config import REDIS_HOST, REDIS_PORT, REDIS_DB, OTP_THROTTLE_WINDOW_SECONDS, OTP_THROTTLE_LIMITS
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -33,6 +33,7 @@ class SessionManager:
             
         self.session_timeout = 1200  # 20 minutes in seconds
         self.otp_timeout = 300       # 5 minutes for OTP validation
+        self._bot_turn_listeners = []
         
     def create_session(self, user_identifier: str, channel: str = 'web') -> str:
         """
@@ -188,6 +189,57 @@ class SessionManager:
         }
         return self.update_session(user_identifier, updates, channel)
     
+    def throttle_otp_request(self, request_id: str, *targets: Tuple[str, str]) -> float:
+        """
+        Records an OTP request against a sliding window of recent requests (a sorted set
+        of request timestamps) for each account or phone number it targets. The request is
+        allowed only if every target is within its limit; otherwise it is removed from all
+        of them, so a refusal on one scope does not use up another.
+
+        Calling again with the same request_id and more targets extends the same request:
+        targets it was already counted against are not counted twice, and a refusal takes
+        it back out of those too.
+
+        Args:
+            request_id: Identifies this OTP request across calls
+            targets: (scope, value) pairs, scope being 'account' or 'phone' (limits come
+                from OTP_THROTTLE_LIMITS) and value the account ID or phone number
+
+        Returns:
+            float: 0 if the request is allowed, otherwise seconds until it would be
+        """
+        keys = [(f"otp_throttle:{scope}:{value}", OTP_THROTTLE_LIMITS[scope]) for scope, value in targets]
+        window = OTP_THROTTLE_WINDOW_SECONDS
+        now = time.time()
+        try:
+            pipe = self.redis_client.pipeline()
+            for key, _ in keys:
+                pipe.zremrangebyscore(key, 0, now - window)
+                pipe.zadd(key, {request_id: now})
+                pipe.zcard(key)
+                pipe.expire(key, window)
+            counts = pipe.execute()[2::4]
+            refused = [(target, key) for target, (key, limit), count in zip(targets, keys, counts) if count > limit]
+            if not refused:
+                return 0
+
+            # Refused requests don't count anywhere, so the windows keep sliding open
+            pipe = self.redis_client.pipeline()
+            for key, _ in keys:
+                pipe.zrem(key, request_id)
+            pipe.execute()
+            retry_after = 0
+            for _, key in refused:
+                oldest = self.redis_client.zrange(key, 0, 0, withscores=True)
+                retry_after = max(retry_after, oldest[0][1] + window - now if oldest else window)
+            names = ', '.join(f"{scope} {value}" for (scope, value), _ in refused)
+            logger.warning(f"⚠️ OTP request throttled for {names}; retry in {retry_after:.0f}s")
+            return max(retry_after, 1)
+        except Exception as e:
+            # Fail open: a Redis hiccup shouldn't lock customers out
+            logger.error(f"❌ Failed to check OTP throttle: {e}")
+            return 0
+
     def validate_otp(self, user_identifier: str, user_otp: str, channel: str = 'web') -> tuple:
         """
         Validate OTP for a session
@@ -278,9 +330,64 @@ class SessionManager:
         if len(conversation_history) > 50:
             conversation_history = conversation_history[-50:]
         
-        return self.update_session(user_identifier, {
+        updated = self.update_session(user_identifier, {
             'conversation_history': conversation_history
         }, channel)
+
+        if updated and message.get('sender') == 'bot':
+            for listener in self._bot_turn_listeners:
+                try:
+                    listener(user_identifier, channel)
+                except Exception as e:
+                    logger.error(f"❌ Bot turn listener failed: {e}")
+        return updated
+
+    def add_bot_turn_listener(self, callback) -> None:
+        """
+        Register a callback(user_identifier, channel) invoked after each bot message is stored.
+        Callbacks run on the request thread and must return quickly.
+        """
+        self._bot_turn_listeners.append(callback)
+
+    def set_rolling_summary(self, user_identifier: str, summary: str, summarized_until: str, channel: str = 'web') -> bool:
+        """
+        Store the rolling conversation summary next to the session (same TTL)
+        
+        Args:
+            user_identifier: Phone number for WhatsApp, session_id for web
+            summary: Latest summary text
+            summarized_until: Timestamp of the last history message the summary covers
+            channel: 'web' or 'whatsapp'
+            
+        Returns:
+            bool: Success status
+        """
+        summary_key = f"session_summary:{channel}:{user_identifier}"
+        try:
+            self.redis_client.setex(summary_key, self.session_timeout, json.dumps({
+                'summary': summary,
+                'summarized_until': summarized_until,
+                'updated_at': datetime.now().isoformat()
+            }))
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to store rolling summary: {e}")
+            return False
+
+    def get_rolling_summary(self, user_identifier: str, channel: str = 'web') -> Optional[Dict]:
+        """
+        Retrieve the rolling conversation summary
+        
+        Returns:
+            Dict with 'summary', 'summarized_until' and 'updated_at', or None
+        """
+        summary_key = f"session_summary:{channel}:{user_identifier}"
+        try:
+            data = self.redis_client.get(summary_key)
+            return json.loads(data) if data else None
+        except Exception as e:
+            logger.error(f"❌ Failed to get rolling summary: {e}")
+            return None
     
     def escalate_session(self, user_identifier: str, reason: str, channel: str = 'web') -> bool:
         """
@@ -314,6 +421,7 @@ class SessionManager:
         session_key = f"session:{channel}:{user_identifier}"
         try:
             result = self.redis_client.delete(session_key)
+            self.redis_client.delete(f"session_summary:{channel}:{user_identifier}")
             logger.info(f"Deleted session for {user_identifier} on {channel}")
             return result > 0
         except Exception as e:
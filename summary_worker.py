@@ -0,0 +1,68 @@
+import queue
+import logging
+import threading
+from bedrock_client import update_chat_summary
+from bedrock_gateway import BedrockUnavailableError
+from session_manager import session_manager
+from config import ROLLING_SUMMARY_ENABLED, ROLLING_SUMMARY_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class RollingSummaryWorker:
+    """
+    Keeps a rolling conversation summary per session, updated in the background after
+    each bot turn. Escalation reads the stored summary instead of summarizing the whole
+    chat inside the handoff request.
+    """
+
+    def __init__(self, workers=ROLLING_SUMMARY_WORKERS):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"rolling-summary-{i}", daemon=True).start()
+
+    def schedule(self, user_identifier: str, channel: str = 'web'):
+        """Queue a summary refresh; repeated turns for a session already queued are coalesced."""
+        key = (user_identifier, channel)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            with self._lock:
+                self._pending.discard(key)
+            try:
+                self.refresh(*key)
+            except BedrockUnavailableError as e:
+                logger.warning(f"Rolling summary skipped for {key[0]}: {e}")
+            except Exception as e:
+                logger.error(f"❌ Rolling summary failed for {key[0]}: {e}")
+
+    def refresh(self, user_identifier: str, channel: str = 'web'):
+        session_data = session_manager.get_session(user_identifier, channel)
+        # Only verified customers can be escalated, so only their chats need a summary
+        if not session_data or not session_data.get('customer_id'):
+            return
+
+        history = session_data.get('conversation_history', [])
+        previous = session_manager.get_rolling_summary(user_identifier, channel) or {}
+        summarized_until = previous.get('summarized_until') or ""
+        new_messages = [m for m in history if m.get('timestamp', "") > summarized_until]
+        if not new_messages:
+            return
+
+        summary = update_chat_summary(previous.get('summary'), new_messages)
+        session_manager.set_rolling_summary(user_identifier, summary, new_messages[-1].get('timestamp', ""), channel)
+        logger.info(f"Rolling summary updated for {user_identifier} ({len(new_messages)} new messages)")
+
+
+# Initialize global worker and hook it to bot turns
+rolling_summary_worker = RollingSummaryWorker()
+if ROLLING_SUMMARY_ENABLED:
+    session_manager.add_bot_turn_listener(rolling_summary_worker.schedule)
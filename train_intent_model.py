@@ -0,0 +1,63 @@
+import argparse
+import logging
+from collections import Counter
+
+from sqlalchemy import text
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+
+from config import INTENT_MODEL_PATH
+from database import engine
+from intent_model import IntentModel, INTENT_LABELS
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+def load_labelled_interactions(limit=None):
+    """
+    Reads user messages with a known intent from client_interaction.
+    """
+    query = """
+        SELECT message_text, LOWER(TRIM(intent)) AS intent
+        FROM client_interaction
+        WHERE sender = 'user'
+          AND message_text IS NOT NULL AND message_text <> ''
+          AND LOWER(TRIM(intent)) = ANY(:labels)
+        ORDER BY created_at DESC
+    """
+    params = {"labels": INTENT_LABELS}
+    if limit:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(query), params).fetchall()
+    return [row.message_text for row in rows], [row.intent for row in rows]
+
+
+def train(output_path=INTENT_MODEL_PATH, limit=None, test_size=0.2):
+    texts, labels = load_labelled_interactions(limit)
+    if len(set(labels)) < 2:
+        logging.error(f"Need at least two intent classes to train, found: {Counter(labels)}")
+        return None
+
+    logging.info(f"Training intent model on {len(texts)} rows: {dict(Counter(labels))}")
+    train_texts, test_texts, train_labels, test_labels = train_test_split(
+        texts, labels, test_size=test_size, random_state=42, stratify=labels
+    )
+
+    model = IntentModel().train(train_texts, train_labels)
+    predicted, _ = model.predict_batch(test_texts)
+    print(classification_report(test_labels, predicted, zero_division=0))
+
+    # Refit on everything before shipping
+    model.train(texts, labels).save(output_path)
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local intent model from labelled client_interaction rows.")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    train(args.output, args.limit)
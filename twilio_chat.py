@@ -1,17 +1,46 @@
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.base.exceptions import TwilioRestException
 import logging
 import json # Import json for attributes
 import uuid
 import datetime # Import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from config import (
     TWILIO_ACCOUNT_SID, 
     TWILIO_AUTH_TOKEN, 
     TWILIO_CONVERSATIONS_SERVICE_SID,
     TWILIO_TASK_ROUTER_WORKFLOW_SID,
-    TWILIO_TASK_ROUTER_WORKSPACE_SID
+    TWILIO_TASK_ROUTER_WORKSPACE_SID,
+    HANDOFF_CONTEXT_MAX_CHARS,
+    HANDOFF_CONTEXT_CONCURRENCY,
+    TWILIO_API_BASE_URL
 )
 
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+class StubRoutingHttpClient(TwilioHttpClient):
+    """
+    Sends every Twilio API request to a local stand-in (twilio_stub_server.py) instead of
+    *.twilio.com: https://conversations.twilio.com/v1/... becomes {base_url}/conversations/v1/...
+    """
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        product = parts.netloc.split(".")[0]
+        return super().request(method, f"{self.base_url}/{product}{parts.path}", *args, **kwargs)
+
+def make_twilio_client():
+    """Twilio REST client, pointed at the local stub when TWILIO_API_BASE_URL is set."""
+    http_client = StubRoutingHttpClient(TWILIO_API_BASE_URL) if TWILIO_API_BASE_URL else None
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+
+client = make_twilio_client()
+
+class ConversationNotFoundError(Exception):
+    """Twilio answered 404 for a conversation, so a stored SID for it is stale."""
 
 # Custom JSON encoder to handle UUID and datetime objects
 class CustomJsonEncoder(json.JSONEncoder):
@@ -55,22 +84,100 @@ def create_conversation(user_id):
             logging.error(f"❌ Error fetching conversation: {e}")
             return None
 
-def send_message_to_conversation(conversation_sid, author, message_body):
+def create_conversation_message(conversation_sid, author, message_body, attributes=None):
+    """
+    Posts a message into a Twilio Conversation within the configured service and returns
+    its SID. Twilio errors are raised so callers (e.g. the outbox) can decide whether to retry.
+    """
+    extra = {"attributes": json.dumps(attributes, cls=CustomJsonEncoder)} if attributes else {}
+    message = client.conversations.v1.services(TWILIO_CONVERSATIONS_SERVICE_SID) \
+        .conversations(conversation_sid) \
+        .messages.create(
+            author=author,
+            body=message_body,
+            **extra
+        )
+    return message.sid
+
+def send_message_to_conversation(conversation_sid, author, message_body, attributes=None):
     """
     Sends a message into a Twilio Conversation within the configured service.
+    Returns the message SID, or None if it could not be sent.
     """
     try:
-        client.conversations.v1.services(TWILIO_CONVERSATIONS_SERVICE_SID) \
-            .conversations(conversation_sid) \
-            .messages.create(
-                author=author,
-                body=message_body
-            )
+        message_sid = create_conversation_message(conversation_sid, author, message_body, attributes)
         logging.info(f"✅ Message sent to conversation {conversation_sid} by {author}")
+        return message_sid
     except Exception as e:
         logging.error(f"❌ Error sending message to conversation {conversation_sid}: {e}")
         return None # Explicitly return None on error for consistency
 
+def _split_into_parts(lines, max_chars):
+    """Packs lines into as few bodies of at most max_chars as possible."""
+    parts, current = [], ""
+    for line in lines:
+        while len(line) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > max_chars:
+            parts.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def post_handoff_context(conversation_sid, header, summary, messages, skip_parts=(),
+                         max_chars=HANDOFF_CONTEXT_MAX_CHARS):
+    """
+    Posts the handoff context (header, summary and recent messages) to a Conversation
+    as one readable message instead of one REST call per chat message. Transcripts longer
+    than max_chars are split into parts that are posted concurrently; every part carries
+    {"type": "handoff_context", "part", "parts"} attributes so clients can order them, and
+    part 0 also carries the summary and the messages as structured data.
+
+    Args:
+        messages (list): (author, text) pairs, oldest first
+        skip_parts (iterable): Part indexes already posted by an earlier attempt
+
+    Returns:
+        dict: part index -> message SID (None for parts that failed)
+
+    Raises:
+        ConversationNotFoundError: Twilio no longer has the conversation
+    """
+    lines = [header, "", "Summary:", summary or "", "", "--- Recent Chat History ---"]
+    lines += [f"{author}: {text}" for author, text in messages]
+    lines.append("--- End of History ---")
+    bodies = _split_into_parts(lines, max_chars)
+
+    def post(index):
+        attributes = {"type": "handoff_context", "part": index, "parts": len(bodies)}
+        if index == 0:
+            attributes["summary"] = summary
+            attributes["messages"] = [{"index": i, "author": author, "body": text[:1000]}
+                                      for i, (author, text) in enumerate(messages)]
+        try:
+            return create_conversation_message(conversation_sid, "System", bodies[index], attributes)
+        except TwilioRestException as e:
+            if e.status == 404:
+                raise ConversationNotFoundError(conversation_sid) from e
+            logging.error(f"❌ Error posting handoff context part {index} to {conversation_sid}: {e}")
+        except Exception as e:
+            logging.error(f"❌ Error posting handoff context part {index} to {conversation_sid}: {e}")
+        return None
+
+    pending = [index for index in range(len(bodies)) if index not in set(skip_parts)]
+    if len(pending) <= 1:
+        return {index: post(index) for index in pending}
+    with ThreadPoolExecutor(max_workers=min(HANDOFF_CONTEXT_CONCURRENCY, len(pending))) as pool:
+        return dict(zip(pending, pool.map(post, pending)))
+
 def create_task_for_handoff(customer_id, phone_number, summary, recent_messages, conversation_sid):
     """
     Creates a Twilio Task Router Task for agent handoff.
@@ -111,31 +218,28 @@ def create_and_send_to_agent(customer_id, phone_number, summary, recent_messages
     The actual 'sending to agent' (i.e., agent participant addition)
     is now handled by Task Router.
     """
-    conversation_sid = create_conversation(customer_id)
+    # Imported here: conversation_directory builds on create_conversation above
+    from conversation_directory import conversation_directory
+    conversation_sid = conversation_directory.get_or_create(customer_id)
     
     if not conversation_sid:
         logging.error(f"Failed to create conversation for customer {customer_id}")
         return None
     
-    # Send the summary
-    send_message_to_conversation(
-        conversation_sid,
-        "System",
-        f"Customer {customer_id} (Phone: {phone_number}) has requested assistance:\n\nSummary:\n{summary}"
-    )
-    
-    # Send recent messages
-    send_message_to_conversation(conversation_sid, "System", "--- Recent Messages ---")
-    for msg in recent_messages:
-        author = msg.get('sender', 'Unknown')
-        content = msg.get('content', '(No content)')
-        send_message_to_conversation(conversation_sid, author, content)
-    
-    send_message_to_conversation(
-        conversation_sid,
-        "System",
-        "--- End of Context ---\nPlease assist this customer with their inquiry."
-    )
+    # Send the summary and recent messages in one packed message
+    header = f"Customer {customer_id} (Phone: {phone_number}) has requested assistance. Please assist this customer with their inquiry."
+    messages = [(msg.get('sender', 'Unknown'), msg.get('content', '(No content)')) for msg in recent_messages]
+    try:
+        post_handoff_context(conversation_sid, header, summary, messages)
+    except ConversationNotFoundError:
+        # The stored conversation was deleted in Twilio: forget it and post to a fresh one
+        logging.warning(f"⚠️ Conversation {conversation_sid} for customer {customer_id} no longer exists, recreating it")
+        conversation_directory.invalidate(customer_id)
+        conversation_sid = conversation_directory.get_or_create(customer_id)
+        if not conversation_sid:
+            logging.error(f"Failed to recreate conversation for customer {customer_id}")
+            return None
+        post_handoff_context(conversation_sid, header, summary, messages)
     
     # This function now simply sets up the conversation and sends initial context.
     # The actual task creation for agent routing happens in app.py's
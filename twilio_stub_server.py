@@ -0,0 +1,535 @@
+import re
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from uuid import uuid4
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
+from urllib.request import Request, urlopen
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import xml.etree.ElementTree as ET
+
+# Local stand-in for the subset of the Twilio REST API this project uses (Messages, Calls,
+# Conversations, Conversation Messages, TaskRouter Tasks). Point the app at it with
+# TWILIO_API_BASE_URL (see twilio_chat.make_twilio_client). Latency and error rates are set
+# per resource, every request is kept in a log that tests can read back from /requests, and
+# created calls can be driven through the app's TwiML webhooks with scripted DTMF/speech input.
+
+logger = logging.getLogger(__name__)
+
+# Latency is log-normal, fitted to the median and p99
+DEFAULT_PROFILES = {
+    "messages": {"median_ms": 180, "p99_ms": 900, "error_rate": 0.0, "throttle_rate": 0.0,
+                 "delivery_ms": 1500, "undelivered_rate": 0.0},
+    "calls": {"median_ms": 250, "p99_ms": 1200, "error_rate": 0.0, "throttle_rate": 0.0, "answer_ms": 2000},
+    "conversations": {"median_ms": 150, "p99_ms": 700, "error_rate": 0.0, "throttle_rate": 0.0},
+    "conversation_messages": {"median_ms": 150, "p99_ms": 700, "error_rate": 0.0, "throttle_rate": 0.0},
+    "tasks": {"median_ms": 200, "p99_ms": 900, "error_rate": 0.0, "throttle_rate": 0.0},
+}
+
+Z_99 = 2.326
+
+ACCOUNT = r"/api/2010-04-01/Accounts/(?P<account_sid>[^/]+)"
+ROUTES = [
+    ("POST", re.compile(rf"^{ACCOUNT}/Messages\.json$"), "create_message", "messages"),
+    ("GET", re.compile(rf"^{ACCOUNT}/Messages/(?P<sid>[^/]+)\.json$"), "fetch_message", "messages"),
+    ("POST", re.compile(rf"^{ACCOUNT}/Calls\.json$"), "create_call", "calls"),
+    ("GET", re.compile(rf"^{ACCOUNT}/Calls/(?P<sid>[^/]+)\.json$"), "fetch_call", "calls"),
+    ("POST", re.compile(r"^/conversations/v1/Conversations$"), "create_conversation", "conversations"),
+    ("GET", re.compile(r"^/conversations/v1/Conversations/(?P<sid>[^/]+)$"), "fetch_conversation", "conversations"),
+    ("POST", re.compile(r"^/conversations/v1(?:/Services/(?P<service_sid>[^/]+))?/Conversations/(?P<conversation>[^/]+)/Messages$"),
+     "create_conversation_message", "conversation_messages"),
+    ("POST", re.compile(r"^/taskrouter/v1/Workspaces/(?P<workspace_sid>[^/]+)/Tasks$"), "create_task", "tasks"),
+]
+
+MAX_WEBHOOKS_PER_CALL = 50
+
+
+def new_sid(prefix: str) -> str:
+    return prefix + uuid4().hex
+
+
+def rfc2822_now() -> str:
+    return format_datetime(datetime.now(timezone.utc))
+
+
+def iso_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class StubError(Exception):
+    """A Twilio-style error response: HTTP status, Twilio error code and message."""
+
+    def __init__(self, status: int, code: int, message: str):
+        super().__init__(message)
+        self.status, self.code, self.message = status, code, message
+
+
+def post_form(url: str, params: dict, method: str = "POST", timeout: float = 15.0):
+    """Calls a webhook the way Twilio does (form-encoded POST, or GET with a query string)."""
+    data = urlencode(params).encode("utf-8")
+    if method.upper() == "GET":
+        url, data = url + ("&" if "?" in url else "?") + data.decode("ascii"), None
+    request = Request(url, data=data, method=method.upper(),
+                      headers={"Content-Type": "application/x-www-form-urlencoded", "User-Agent": "TwilioProxy/1.1 (stub)"})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return response.status, response.read().decode("utf-8")
+    except HTTPError as e:
+        return e.code, e.read().decode("utf-8", "replace")
+    except URLError as e:
+        return None, str(e.reason)
+
+
+def drive_call(url: str, inputs=(), call_params: dict = None, method: str = "POST", timeout: float = 15.0) -> dict:
+    """
+    Plays the caller's side of a call against the app's TwiML webhooks.
+
+    Each <Gather> consumes the next entry of `inputs`, sent as SpeechResult when the gather
+    accepts speech and the entry isn't all digits, otherwise as Digits. With no inputs left a
+    gather times out and the document continues, as on a real call. <Redirect> and gather
+    actions are followed until <Hangup>, <Dial> or the end of a document.
+
+    Args:
+        url (str): The first webhook (the Url given to calls.create)
+        inputs (iterable): Caller responses, e.g. ["2", "yes", "yes"]
+        call_params (dict): CallSid/From/To/AccountSid sent with every webhook
+        method (str): HTTP method for the first webhook
+        timeout (float): Per-webhook timeout in seconds
+
+    Returns:
+        dict: trace with one entry per webhook (url, status, ms), the prompts spoken,
+        the number dialed and how the call ended
+    """
+    inputs = list(inputs)
+    params = {"CallSid": new_sid("CA"), "AccountSid": "ACstub", "From": "+10000000000", "To": "+10000000001",
+              "Direction": "outbound-api", "CallStatus": "in-progress", **(call_params or {})}
+    trace = {"call_sid": params["CallSid"], "webhooks": [], "said": [], "dialed": None, "ended_by": None}
+    started = time.perf_counter()
+    extra = {}
+
+    while url:
+        if len(trace["webhooks"]) >= MAX_WEBHOOKS_PER_CALL:
+            trace["ended_by"] = "webhook_limit"
+            break
+        webhook_started = time.perf_counter()
+        status, body = post_form(url, {**params, **extra}, method, timeout)
+        trace["webhooks"].append({"url": url, "method": method, "params": extra, "status": status,
+                                  "ms": round((time.perf_counter() - webhook_started) * 1000, 1)})
+        if status != 200:
+            trace["ended_by"] = "webhook_error"
+            break
+        try:
+            document = ET.fromstring(body)
+        except ET.ParseError:
+            trace["ended_by"] = "invalid_twiml"
+            break
+        next_url, method, extra, ended_by = _run_twiml(document, url, inputs, trace)
+        url = next_url
+        trace["ended_by"] = ended_by
+
+    trace["webhook_count"] = len(trace["webhooks"])
+    trace["server_ms"] = round(sum(hook["ms"] for hook in trace["webhooks"]), 1)
+    trace["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    trace["unused_inputs"] = inputs
+    return trace
+
+
+def _say(element, trace):
+    if element.tag == "Say":
+        trace["said"].append({"text": (element.text or "").strip(), "language": element.get("language")})
+    elif element.tag == "Play":
+        trace["said"].append({"play": (element.text or "").strip()})
+
+
+def _run_twiml(document, url, inputs, trace):
+    """Runs one TwiML document; returns (next_url, method, params, ended_by)."""
+    for verb in document:
+        if verb.tag in ("Say", "Play"):
+            _say(verb, trace)
+        elif verb.tag == "Gather":
+            for nested in verb:
+                _say(nested, trace)
+            if not inputs:
+                continue  # Gather timed out; fall through to the next verb
+            value = str(inputs.pop(0))
+            accepts_speech = "speech" in verb.get("input", "dtmf")
+            answer = ({"SpeechResult": value, "Confidence": "0.92"} if accepts_speech and not value.isdigit()
+                      else {"Digits": value})
+            action = urljoin(url, verb.get("action") or url)
+            return action, verb.get("method", "POST"), answer, "gather"
+        elif verb.tag == "Redirect":
+            return urljoin(url, (verb.text or "").strip()), verb.get("method", "POST"), {}, "redirect"
+        elif verb.tag == "Dial":
+            number = verb.find("Number")
+            trace["dialed"] = ((number.text if number is not None else verb.text) or "").strip()
+            return None, None, {}, "dial"
+        elif verb.tag in ("Hangup", "Reject"):
+            return None, None, {}, verb.tag.lower()
+    return None, None, {}, "end_of_twiml"
+
+
+class StubTwilioServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profiles=None, latency_scale=1.0, seed=None, drive_calls=False,
+                 call_inputs=(), invalid_numbers=(), log_size=10000):
+        super().__init__(address, StubTwilioHandler)
+        self.profiles = {kind: dict(profile) for kind, profile in DEFAULT_PROFILES.items()}
+        for kind, overrides in (profiles or {}).items():
+            self.profiles.setdefault(kind, {"median_ms": 150, "p99_ms": 700}).update(overrides)
+        self.latency_scale = latency_scale
+        self.drive_calls = drive_calls
+        self.call_inputs = list(call_inputs)
+        self.invalid_numbers = set(invalid_numbers)
+        self.resources = {kind: {} for kind in DEFAULT_PROFILES}
+        self.unique_names = {}
+        self.request_log = deque(maxlen=log_size)
+        self.counters = {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+    # --- Latency and failures ---
+
+    def count(self, kind: str, counter: str):
+        with self._lock:
+            stats = self.counters.setdefault(kind, {"requests": 0, "throttled": 0, "errors": 0})
+            stats[counter] += 1
+
+    def sample_latency(self, profile: dict) -> float:
+        """Seconds, drawn from a log-normal with the profile's median and p99."""
+        median = max(1.0, profile["median_ms"])
+        sigma = max(0.0, math.log(max(profile["p99_ms"], median) / median) / Z_99)
+        with self._lock:
+            value = self._random.lognormvariate(math.log(median), sigma)
+        return value * self.latency_scale / 1000.0
+
+    def sample_failure(self, profile: dict):
+        with self._lock:
+            roll = self._random.random()
+        if roll < profile.get("throttle_rate", 0.0):
+            return StubError(429, 20429, "Too Many Requests")
+        if roll < profile.get("throttle_rate", 0.0) + profile.get("error_rate", 0.0):
+            return StubError(500, 20500, "Internal Server Error (stub)")
+        return None
+
+    def later(self, delay_ms: float, target, *args):
+        """Runs target(*args) on its own thread after the (scaled) delay."""
+        def run():
+            time.sleep(delay_ms * self.latency_scale / 1000.0)
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"❌ Stub background task failed: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    # --- Resources ---
+
+    def store(self, kind: str, resource: dict) -> dict:
+        with self._lock:
+            self.resources[kind][resource["sid"]] = resource
+        return resource
+
+    def find(self, kind: str, sid: str, path: str) -> dict:
+        with self._lock:
+            resource = self.resources[kind].get(self.unique_names.get(sid, sid))
+        if not resource:
+            raise StubError(404, 20404, f"The requested resource {path} was not found")
+        return resource
+
+    def check_number(self, number: str):
+        if number and number.replace("whatsapp:", "") in self.invalid_numbers:
+            raise StubError(400, 21211, f"The 'To' number {number} is not a valid phone number.")
+
+    def create_message(self, params, account_sid, path):
+        to = params.get("To")
+        if not to or not (params.get("Body") or params.get("MediaUrl") or params.get("ContentSid")):
+            raise StubError(400, 21602, "Message body is required.")
+        self.check_number(to)
+        message = self.store("messages", {
+            "sid": new_sid("SM"), "account_sid": account_sid, "to": to, "from": params.get("From"),
+            "body": params.get("Body"), "status": "queued", "direction": "outbound-api",
+            "num_segments": str(max(1, math.ceil(len(params.get("Body") or "") / 153))), "num_media": "0",
+            "date_created": rfc2822_now(), "date_updated": rfc2822_now(), "date_sent": None,
+            "error_code": None, "error_message": None, "price": None, "price_unit": "USD",
+            "api_version": "2010-04-01", "messaging_service_sid": params.get("MessagingServiceSid"),
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{{sid}}.json", "subresource_uris": {},
+        })
+        message["uri"] = message["uri"].format(sid=message["sid"])
+        self.later(self.profiles["messages"].get("delivery_ms", 0), self._deliver, message, params.get("StatusCallback"))
+        return 201, message
+
+    def _deliver(self, message, status_callback):
+        with self._lock:
+            undelivered = self._random.random() < self.profiles["messages"].get("undelivered_rate", 0.0)
+        message.update({"status": "undelivered" if undelivered else "delivered",
+                        "error_code": 30003 if undelivered else None,
+                        "date_sent": rfc2822_now(), "date_updated": rfc2822_now()})
+        if status_callback:
+            callback = {"MessageSid": message["sid"], "SmsSid": message["sid"], "AccountSid": message["account_sid"],
+                        "MessageStatus": message["status"], "SmsStatus": message["status"],
+                        "To": message["to"], "From": message["from"] or "", "ApiVersion": "2010-04-01"}
+            if undelivered:
+                callback["ErrorCode"] = "30003"
+            post_form(status_callback, callback)
+
+    def fetch_message(self, params, account_sid, sid, path):
+        return 200, self.find("messages", sid, path)
+
+    def create_call(self, params, account_sid, path):
+        to, url = params.get("To"), params.get("Url")
+        if not to or not (url or params.get("Twiml")):
+            raise StubError(400, 21205, "Url parameter is required.")
+        self.check_number(to)
+        call = self.store("calls", {
+            "sid": new_sid("CA"), "account_sid": account_sid, "to": to, "from": params.get("From"),
+            "status": "queued", "direction": "outbound-api", "answered_by": None, "duration": None,
+            "date_created": rfc2822_now(), "date_updated": rfc2822_now(), "start_time": None, "end_time": None,
+            "price": None, "api_version": "2010-04-01", "trace": None,
+            "uri": None, "subresource_uris": {},
+        })
+        call["uri"] = f"/2010-04-01/Accounts/{account_sid}/Calls/{call['sid']}.json"
+        if self.drive_calls and url:
+            self.later(self.profiles["calls"].get("answer_ms", 0), self._answer, call, url,
+                       params.get("Method", "POST"), params.get("StatusCallback"))
+        response = dict(call)
+        response.pop("trace")
+        return 201, response
+
+    def _answer(self, call, url, method, status_callback):
+        call.update({"status": "in-progress", "start_time": rfc2822_now()})
+        trace = drive_call(url, self.call_inputs, {"CallSid": call["sid"], "AccountSid": call["account_sid"],
+                                                   "From": call["from"] or "", "To": call["to"]}, method)
+        call.update({"status": "completed", "end_time": rfc2822_now(), "trace": trace,
+                     "duration": str(int(trace["total_ms"] // 1000))})
+        logger.info(f"📞 Drove call {call['sid']}: {trace['webhook_count']} webhooks, "
+                    f"{trace['server_ms']:.0f} ms server time, ended by {trace['ended_by']}")
+        if status_callback:
+            post_form(status_callback, {"CallSid": call["sid"], "AccountSid": call["account_sid"],
+                                        "CallStatus": "completed", "CallDuration": call["duration"],
+                                        "To": call["to"], "From": call["from"] or ""})
+
+    def fetch_call(self, params, account_sid, sid, path):
+        return 200, self.find("calls", sid, path)
+
+    def create_conversation(self, params, path):
+        unique_name = params.get("UniqueName")
+        with self._lock:
+            if unique_name and unique_name in self.unique_names:
+                raise StubError(409, 50353, "Conversation with provided unique name already exists")
+            conversation = self.store("conversations", {
+                "sid": new_sid("CH"), "account_sid": "ACstub", "chat_service_sid": "ISstub",
+                "unique_name": unique_name, "friendly_name": params.get("FriendlyName"),
+                "attributes": params.get("Attributes", "{}"), "state": "active",
+                "date_created": iso_now(), "date_updated": iso_now(), "messaging_service_sid": None,
+                "url": None, "links": {},
+            })
+            conversation["url"] = f"https://conversations.twilio.com/v1/Conversations/{conversation['sid']}"
+            if unique_name:
+                self.unique_names[unique_name] = conversation["sid"]
+        return 201, conversation
+
+    def fetch_conversation(self, params, sid, path):
+        return 200, self.find("conversations", sid, path.replace("/conversations/v1", ""))
+
+    def create_conversation_message(self, params, service_sid, conversation, path):
+        conversation = self.find("conversations", conversation, path.replace("/conversations/v1", ""))
+        with self._lock:
+            index = sum(1 for message in self.resources["conversation_messages"].values()
+                        if message["conversation_sid"] == conversation["sid"])
+        message = self.store("conversation_messages", {
+            "sid": new_sid("IM"), "account_sid": conversation["account_sid"], "conversation_sid": conversation["sid"],
+            "chat_service_sid": service_sid or conversation["chat_service_sid"], "index": index,
+            "author": params.get("Author", "system"), "body": params.get("Body"),
+            "attributes": params.get("Attributes", "{}"), "media": None, "participant_sid": None,
+            "date_created": iso_now(), "date_updated": iso_now(), "delivery": None, "links": {},
+            "url": f"{conversation['url']}/Messages",
+        })
+        return 201, message
+
+    def create_task(self, params, workspace_sid, path):
+        if not params.get("WorkflowSid"):
+            raise StubError(400, 20001, "WorkflowSid is required.")
+        task = self.store("tasks", {
+            "sid": new_sid("WT"), "account_sid": "ACstub", "workspace_sid": workspace_sid,
+            "workflow_sid": params.get("WorkflowSid"), "attributes": params.get("Attributes", "{}"),
+            "assignment_status": "pending", "priority": int(params.get("Priority", 0)),
+            "timeout": int(params.get("Timeout", 86400)), "task_channel_unique_name": params.get("TaskChannel", "default"),
+            "age": 0, "reason": None, "date_created": iso_now(), "date_updated": iso_now(), "links": {},
+            "url": None,
+        })
+        task["url"] = f"https://taskrouter.twilio.com/v1/Workspaces/{workspace_sid}/Tasks/{task['sid']}"
+        return 201, task
+
+    # --- Request log ---
+
+    def log_request(self, entry: dict):
+        with self._lock:
+            self.request_log.append(entry)
+
+    def requests_matching(self, resource=None, since=None):
+        with self._lock:
+            return [entry for entry in self.request_log
+                    if (not resource or entry["resource"] == resource) and (not since or entry["time"] > since)]
+
+
+class StubTwilioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, error: StubError):
+        self._send_json(error.status, {"code": error.code, "message": error.message, "status": error.status,
+                                       "more_info": f"https://www.twilio.com/docs/errors/{error.code}"})
+
+    def _params(self) -> dict:
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body or "{}"))
+            else:
+                params.update(parse_qsl(body, keep_blank_values=True))
+        return params
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        path = urlsplit(self.path).path
+        if path == "/requests":
+            with self.server._lock:
+                self.server.request_log.clear()
+            return self._send_json(200, {"cleared": True})
+        self._send_error(StubError(404, 20404, f"The requested resource {path} was not found"))
+
+    def _dispatch(self, method: str):
+        path = urlsplit(self.path).path
+        params = self._params()
+        if self._control(method, path, params):
+            return
+
+        for route_method, pattern, handler, kind in ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                break
+        else:
+            return self._send_error(StubError(404, 20404, f"The requested resource {path} was not found"))
+
+        started = time.time()
+        profile = self.server.profiles[kind]
+        self.server.count(kind, "requests")
+        try:
+            failure = self.server.sample_failure(profile)
+            if failure:
+                self.server.count(kind, "throttled" if failure.status == 429 else "errors")
+                # Failures come back quickly, like real rate limiting
+                time.sleep(min(self.server.sample_latency(profile), 0.05))
+                raise failure
+            time.sleep(self.server.sample_latency(profile))
+            status, payload = getattr(self.server, handler)(params, **match.groupdict(), path=path)
+            self._send_json(status, payload)
+        except StubError as e:
+            status, payload = e.status, None
+            self._send_error(e)
+        except Exception as e:
+            logger.error(f"❌ Stub handler {handler} failed: {e}")
+            status, payload = 500, None
+            self._send_error(StubError(500, 20500, str(e)))
+        self.server.log_request({
+            "time": started, "method": method, "path": path, "resource": kind, "params": params,
+            "status": status, "sid": (payload or {}).get("sid"), "latency_ms": round((time.time() - started) * 1000, 1),
+        })
+
+    def _control(self, method: str, path: str, params: dict) -> bool:
+        """Endpoints for tests: request log, counters, stored resources and ad-hoc call driving."""
+        if method == "GET" and path == "/requests":
+            since = float(params["since"]) if params.get("since") else None
+            self._send_json(200, {"requests": self.server.requests_matching(params.get("resource"), since)})
+        elif method == "GET" and path == "/stats":
+            with self.server._lock:
+                self._send_json(200, {
+                    "counters": self.server.counters, "profiles": self.server.profiles,
+                    "resources": {kind: len(items) for kind, items in self.server.resources.items()},
+                })
+        elif method == "GET" and path.startswith("/resources/"):
+            kind = path.split("/", 2)[2]
+            with self.server._lock:
+                self._send_json(200, {kind: list(self.server.resources.get(kind, {}).values())})
+        elif method == "POST" and path == "/drive":
+            # {"url": ..., "inputs": ["2", "yes"], "method": "POST"} -> the call trace
+            inputs = params.get("inputs", [])
+            if isinstance(inputs, str):
+                inputs = [value for value in inputs.split(",") if value]
+            self._send_json(200, drive_call(params["url"], inputs, method=params.get("method", "POST")))
+        else:
+            return False
+        return True
+
+
+def load_config(path):
+    """
+    Reads a JSON file of the form
+    {"profiles": {"messages": {"median_ms": 200, "p99_ms": 900, "error_rate": 0.01}, ...},
+     "invalid_numbers": ["+910000000000"], "call_inputs": ["2", "yes", "yes"]}
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Twilio REST API stand-in with latency/error injection and a TwiML call driver.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--config", help="JSON file with per-resource profiles, invalid numbers and call inputs")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply all sampled latencies (0 = no delay)")
+    parser.add_argument("--throttle-rate", type=float, help="Override throttle_rate for every resource")
+    parser.add_argument("--error-rate", type=float, help="Override error_rate for every resource")
+    parser.add_argument("--drive-calls", action="store_true", help="Answer created calls and walk their TwiML webhooks")
+    parser.add_argument("--call-inputs", help="Comma-separated caller responses for driven calls, e.g. 2,yes,yes")
+    parser.add_argument("--drive", metavar="URL", help="Drive one call from this webhook URL, print the trace and exit")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config(args.config)
+    call_inputs = args.call_inputs.split(",") if args.call_inputs else config.get("call_inputs", [])
+    if args.drive:
+        print(json.dumps(drive_call(args.drive, call_inputs), indent=2, ensure_ascii=False))
+        raise SystemExit(0)
+
+    server = StubTwilioServer((args.host, args.port), config.get("profiles"), args.latency_scale, args.seed,
+                              args.drive_calls, call_inputs, config.get("invalid_numbers", []))
+    for profile in server.profiles.values():
+        if args.throttle_rate is not None:
+            profile["throttle_rate"] = args.throttle_rate
+        if args.error_rate is not None:
+            profile["error_rate"] = args.error_rate
+
+    print(f"🧪 Stub Twilio listening on http://{args.host}:{args.port} (set TWILIO_API_BASE_URL to this URL)")
+    server.serve_forever()
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import string
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from llm_provider import llm
+from config import VOICE_PROMPT_MEMORY_PATH, VOICE_PROMPT_BUILD_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+LANG_CONFIG = {
+    '1': {'code': 'en-IN', 'name': 'English', 'voice': 'Polly.Raveena'},
+    '2': {'code': 'hi-IN', 'name': 'Hindi', 'voice': 'Polly.Raveena'},
+    '3': {'code': 'te-IN', 'name': 'Telugu', 'voice': 'Polly.Raveena'}
+}
+
+# Every prompt the outbound voice flow speaks. {slots} are filled per call; everything
+# else is translated once per language and kept in the translation memory.
+VOICE_PROMPTS = {
+    "confirm_identity": "Hello, this is south india finvest Bank AI Assistant calling. Am I speaking with {customer_name}?",
+    "confirm_identity_no_input": (
+        "I'm sorry, I didn't hear your response. This call is regarding your loan account. "
+        "If this is a convenient time to talk, please say 'yes'. Otherwise, we'll try to reach you later."
+    ),
+    "identity_not_confirmed": "I understand. For security, I cannot proceed. Goodbye.",
+    "identity_unclear": "I didn't understand. Please say 'yes' or 'no'.",
+    "emi_details": (
+        "Thank you. I'm calling about your loan ending in {loan_last4}, which has an outstanding EMI of "
+        "{emi_amount} due on {due_date}."
+    ),
+    "emi_reassurance": "I understand payments can be delayed — I'm here to help you avoid any further impact.",
+    "impact_credit_bureau": (
+        "Please note: if this EMI remains unpaid, it may be reported to the credit bureau, which can affect "
+        "your credit score."
+    ),
+    "impact_delinquency": (
+        "Continued delay may also classify your account as delinquent, leading to penalty charges or "
+        "collection notices."
+    ),
+    "offer_support": (
+        "If you're facing difficulties, we have options like part payments or revised EMI plans. Would you "
+        "like me to connect to one of our agent,to assist you better ?"
+    ),
+    "offer_support_no_input": "We did not receive a clear response. Goodbye.",
+    "support_declined": "I understand. If you change your mind, please call us back. Thank you. Goodbye.",
+    "connecting_agent": "Please wait while I connect you to an agent.",
+}
+
+TRANSLATION_PROMPT = (
+    "Translate the following English text to {language}. Keep every placeholder in curly braces, such as "
+    "{{customer_name}}, exactly as written and untranslated. Only provide the translated text. Do not include "
+    "any conversational filler. Text: '{text}'"
+)
+
+
+def _slots(template: str) -> set:
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+
+class VoicePromptMemory:
+    """
+    Translation memory for the voice flow. Each prompt template is translated once per
+    language (at build time or in the background at boot) and persisted to
+    VOICE_PROMPT_MEMORY_PATH, so a webhook only fills in the slots. Entries remember the
+    English they were made from and are ignored once that text changes. A prompt with no
+    usable entry yet is translated live, as before.
+    """
+
+    def __init__(self, path=VOICE_PROMPT_MEMORY_PATH, prompts=VOICE_PROMPTS, languages=LANG_CONFIG):
+        self.path = path
+        self.prompts = prompts
+        self.languages = languages
+        self.memory = self._load()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "live_translations": 0, "fallbacks": 0}
+
+    def _load(self) -> Dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read voice prompt memory {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            data = json.dumps(self.memory, ensure_ascii=False, indent=1, sort_keys=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def _translate(self, text: str, lang_key: str) -> str:
+        prompt = TRANSLATION_PROMPT.format(language=self.languages[lang_key]['name'], text=text)
+        response = llm.complete("translate", [{"role": "user", "content": prompt}], temperature=0.1)
+        return response.text.strip().strip("'")
+
+    def template(self, key: str, lang_key: str) -> Optional[str]:
+        """The stored translation of a prompt template, or None if it is missing or stale."""
+        entry = self.memory.get(lang_key, {}).get(key)
+        if entry and entry.get("source") == self.prompts[key]:
+            return entry["text"]
+        return None
+
+    def render(self, key: str, lang_key: str, **slots) -> str:
+        """
+        Returns the prompt in the caller's language with its slots filled.
+
+        Args:
+            key (str): Prompt name in VOICE_PROMPTS
+            lang_key (str): LANG_CONFIG key ('1' English, '2' Hindi, '3' Telugu)
+            **slots: Values for the template's placeholders
+
+        Returns:
+            str: The text to <Say>
+        """
+        english = self.prompts[key].format(**slots)
+        if lang_key not in self.languages or lang_key == '1':
+            return english
+
+        translated = self.template(key, lang_key)
+        if translated is not None:
+            try:
+                text = translated.format(**slots)
+                self._counters["hits"] += 1
+                return text
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning(f"⚠️ Stored translation of '{key}' could not be filled ({e}); translating live")
+
+        try:
+            self._counters["live_translations"] += 1
+            logger.info(f"Voice prompt '{key}' not in translation memory for {self.languages[lang_key]['name']}; translating live")
+            return self._translate(english, lang_key)
+        except Exception as e:
+            self._counters["fallbacks"] += 1
+            logger.error(f"❌ Error translating voice prompt '{key}' to {self.languages[lang_key]['name']}: {e}")
+            return english
+
+    def missing(self):
+        """(key, lang_key) pairs without a current translation."""
+        return [(key, lang_key) for lang_key in self.languages if lang_key != '1'
+                for key in self.prompts if self.template(key, lang_key) is None]
+
+    def _compile(self, key: str, lang_key: str) -> bool:
+        source = self.prompts[key]
+        try:
+            translated = self._translate(source, lang_key)
+        except Exception as e:
+            logger.error(f"❌ Could not translate voice prompt '{key}' to {self.languages[lang_key]['name']}: {e}")
+            return False
+        # A translation that lost or renamed a slot can't be filled in safely; keep translating live
+        try:
+            same_slots = _slots(translated) == _slots(source)
+        except ValueError:  # unbalanced braces
+            same_slots = False
+        if not same_slots:
+            logger.warning(f"⚠️ Translation of '{key}' to {self.languages[lang_key]['name']} changed its placeholders; skipped")
+            return False
+        with self._lock:
+            self.memory.setdefault(lang_key, {})[key] = {"source": source, "text": translated, "created_at": time.time()}
+        return True
+
+    def build(self, rebuild: bool = False, concurrency: int = VOICE_PROMPT_BUILD_CONCURRENCY) -> Dict:
+        """
+        Translates every missing (or, with rebuild, every) prompt for every language and
+        saves the memory.
+
+        Returns:
+            dict: counts of prompts compiled and failed
+        """
+        pairs = ([(key, lang_key) for lang_key in self.languages if lang_key != '1' for key in self.prompts]
+                 if rebuild else self.missing())
+        if not pairs:
+            return {"compiled": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda pair: self._compile(*pair), pairs))
+        self._save()
+        compiled = sum(results)
+        logger.info(f"✅ Voice prompt memory: {compiled} translations compiled, {len(results) - compiled} failed")
+        return {"compiled": compiled, "failed": len(results) - compiled}
+
+    def warm(self):
+        """Boot-time build of whatever is missing; safe to run as a background task."""
+        try:
+            self.build()
+        except Exception as e:
+            logger.error(f"❌ Voice prompt memory warm-up failed: {e}")
+
+    def stats(self) -> Dict:
+        return {**self._counters, "missing": len(self.missing())}
+
+
+# Initialize global voice prompt memory
+voice_prompts = VoicePromptMemory()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-translate the voice-call prompts for every language in LANG_CONFIG.")
+    parser.add_argument("--rebuild", action="store_true", help="Retranslate every prompt, not just missing or stale ones")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = voice_prompts.build(rebuild=args.rebuild)
+    print(f"Compiled {result['compiled']} prompt translations ({result['failed']} failed) into {voice_prompts.path}")
+    print(f"Still missing: {voice_prompts.missing()}")